@@ -0,0 +1,3 @@
+""" Benchmarks of the OneDrive client against a simulated server
+
+"""
@@ -0,0 +1,222 @@
+""" Run the client benchmarks against a local simulated server
+
+Usage: python -m benchmarks.run [--help]
+
+Each benchmark runs in its own interpreter, the server in this one, so that
+the reported peak memory is the client's alone.
+"""
+
+import argparse
+import gc
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from pyonedrive import DeltaSyncStore, RetryPolicy
+from benchmarks.server import (BIG_FOLDER_ID, LARGE_FILE_ID, ROOT_ID,
+                               SimulatedDrive, SimulatedServer, connect)
+
+MB = 1024.0 * 1024
+
+# directory holding the package and the benchmarks
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def peak_memory():
+    """ Peak resident memory of the process
+
+    @return: megabytes, `None` if unknown
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on OS X, kilobytes elsewhere
+    return peak / MB if sys.platform == 'darwin' else peak / 1024.0
+
+
+def list_folder(**options):
+    def benchmark(client, scratch):
+        items = client.get_folder_content_generator(BIG_FOLDER_ID, **options)
+        return sum(1 for _ in items), 0
+    return benchmark
+
+
+def walk_tree(client, scratch):
+    return sum(1 for _ in client.get_tree_generator(max_in_flight=8)), 0
+
+
+def delta_sync(client, scratch):
+    with DeltaSyncStore(':memory:') as store:
+        return store.sync(client, ROOT_ID), 0
+
+
+def mirror(client, scratch):
+    stats = client.mirror_drive(ROOT_ID, os.path.join(scratch, 'mirror'),
+                                max_in_flight=8)
+    return stats['downloaded'], stats['bytes']
+
+
+def download(max_in_flight):
+    def benchmark(client, scratch):
+        destination = os.path.join(scratch, 'large.bin')
+        transferred = client.download_file_to(
+            LARGE_FILE_ID, destination, segment_size=4 * 1024 * 1024,
+            max_in_flight=max_in_flight, resume=False)
+        return 0, transferred
+    return benchmark
+
+
+BENCHMARKS = [
+    ('list', list_folder(count=200)),
+    ('list-prefetch', list_folder(count=200, prefetch=2)),
+    ('list-concurrent', list_folder(count=200, max_in_flight=8)),
+    ('list-stream', list_folder(count=200, stream=True)),
+    ('tree-walk', walk_tree),
+    ('delta-sync', delta_sync),
+    ('mirror', mirror),
+    ('download', download(1)),
+    ('download-parallel', download(4)),
+]
+
+
+def work(url, name, client_options):
+    """ Run a benchmark with a new client, in the current process
+
+    @param url: the simulated server's URL
+    @param name: the benchmark's name, in `BENCHMARKS`
+    @return: number of items processed, seconds spent and the process' peak
+    memory
+    @rtype: dict
+    """
+    benchmark = dict(BENCHMARKS)[name]
+    client = connect(url, **client_options)
+    scratch = tempfile.mkdtemp()
+    gc.collect()
+    start = time.time()
+    try:
+        items, _ = benchmark(client, scratch)
+    finally:
+        elapsed = time.time() - start
+        client.transport.close()
+        shutil.rmtree(scratch)
+    return {'items': items, 'elapsed': elapsed, 'peak MB': peak_memory()}
+
+
+def run(server, name, throttle_every=None, python=sys.executable):
+    """ Run a benchmark in a new interpreter
+
+    @param server: the running `SimulatedServer`
+    @param name: the benchmark's name, in `BENCHMARKS`
+    @param throttle_every: whether the server throttles requests, the client
+    then retries them
+    @param python: interpreter to use
+    @return: the benchmark's report
+    @rtype: dict
+    """
+    command = [python, '-m', 'benchmarks.run', name, '--worker', server.url]
+    if throttle_every:
+        command += ['--throttle-every', str(throttle_every)]
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [ROOT] + [path for path in [env.get('PYTHONPATH')] if path])
+    server.reset_stats()
+    output = subprocess.check_output(command, env=env, cwd=ROOT)
+    result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+    elapsed = result['elapsed']
+    return {
+        'name': name,
+        'elapsed': elapsed,
+        'requests': server.requests,
+        'requests/s': server.requests / elapsed,
+        'items/s': result['items'] / elapsed,
+        'MB/s': server.bytes_sent / MB / elapsed,
+        'throttled': server.throttled,
+        'refreshes': server.refreshes,
+        'peak MB': result['peak MB']
+    }
+
+
+COLUMNS = ('name', 'elapsed', 'requests', 'requests/s', 'items/s', 'MB/s',
+           'throttled', 'refreshes', 'peak MB')
+
+
+def format_row(values):
+    cells = []
+    for column, value in zip(COLUMNS, values):
+        if isinstance(value, float):
+            value = '{0:.2f}'.format(value)
+        elif value is None:
+            value = '-'
+        cells.append(str(value).ljust(20 if column == 'name' else 11))
+    return ''.join(cells).rstrip()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('benchmarks', nargs='*',
+                        help='benchmarks to run, all by default: ' +
+                        ', '.join(name for name, _ in BENCHMARKS))
+    parser.add_argument('--items', type=int, default=10000,
+                        help='number of items of the listed folder')
+    parser.add_argument('--tree-folders', type=int, default=4,
+                        help='number of sub-folders per folder of the tree')
+    parser.add_argument('--tree-depth', type=int, default=3,
+                        help='depth of the tree')
+    parser.add_argument('--tree-files', type=int, default=50,
+                        help='number of files per folder of the tree')
+    parser.add_argument('--file-size', type=float, default=64,
+                        help='size of the downloaded file in MB')
+    parser.add_argument('--padding', type=int, default=0,
+                        help='extra characters per item, to inflate payloads')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='server latency in seconds')
+    parser.add_argument('--token-ttl', type=float, default=None,
+                        help='access tokens lifetime in seconds')
+    parser.add_argument('--compress', action='store_true',
+                        help='gzip JSON responses')
+    parser.add_argument('--throttle-every', type=int, default=None,
+                        help='throttle one request out of this number')
+    parser.add_argument('--worker', metavar='URL', default=None,
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    client_options = {}
+    if args.throttle_every:
+        client_options['retry_policy'] = RetryPolicy(max_attempts=10)
+    if args.worker:
+        for name in args.benchmarks:
+            print(json.dumps(work(args.worker, name, client_options)))
+        return
+
+    selected = [(name, benchmark) for name, benchmark in BENCHMARKS
+                if not args.benchmarks or name in args.benchmarks]
+    drive = SimulatedDrive(big_folder_items=args.items,
+                           tree_folders=args.tree_folders,
+                           tree_depth=args.tree_depth,
+                           tree_files=args.tree_files,
+                           large_file_size=int(args.file_size * MB),
+                           item_padding=args.padding)
+    server = SimulatedServer(drive, latency=args.latency,
+                             token_ttl=args.token_ttl,
+                             throttle_every=args.throttle_every,
+                             compress=args.compress).start()
+    try:
+        print(format_row(COLUMNS))
+        for name, _ in selected:
+            report = run(server, name, args.throttle_every)
+            print(format_row([report[column] for column in COLUMNS]))
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
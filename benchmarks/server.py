@@ -0,0 +1,417 @@
+""" Local stand-in for the OneDrive v5.0, v1.0 and token endpoints
+
+"""
+
+import gzip
+import io
+import json
+import logging
+import re
+import threading
+import time
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+except ImportError:  # Python 3
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+
+from pyonedrive import OneDrive
+
+LOGGER = logging.getLogger(__name__)
+
+ROOT_ID = 'folder.root'
+BIG_FOLDER_ID = 'folder.big'
+LARGE_FILE_ID = 'file.large'
+INITIAL_TOKEN = 'initial'
+
+_CONTENT_BLOCK = bytes(bytearray(range(256))) * 256
+_RANGE = re.compile(r'bytes=(\d+)-(\d*)$')
+
+
+class SimulatedDrive(object):
+    """ Deterministic drive layout served by `SimulatedServer`
+
+    The root folder holds:
+
+    - 'folder.big', a flat folder of `big_folder_items` files, to benchmark
+      listings
+    - `tree_folders` folders, each holding `tree_files` files and, down to
+      `tree_depth` levels, `tree_folders` sub-folders, to benchmark tree walks
+    - 'file.large', a file of `large_file_size` bytes, to benchmark downloads
+
+    Items carry a description of `item_padding` characters to emulate larger
+    payloads.
+    """
+
+    def __init__(self, big_folder_items=10000, tree_folders=4, tree_depth=3,
+                 tree_files=50, large_file_size=64 * 1024 * 1024,
+                 item_padding=0):
+        self.items = {}
+        self.children = {}
+        self.item_padding = item_padding
+        self.large_file_size = large_file_size
+        self.__add(ROOT_ID, None, 'root', 'folder')
+        self.__add(BIG_FOLDER_ID, ROOT_ID, 'big', 'folder')
+        for index in range(big_folder_items):
+            self.__add('file.big.{0}'.format(index), BIG_FOLDER_ID,
+                       'file{0:06d}.txt'.format(index), 'file', 1024)
+        self.__add_tree(ROOT_ID, 'tree', tree_folders, tree_depth, tree_files)
+        self.__add(LARGE_FILE_ID, ROOT_ID, 'large.bin', 'file',
+                   large_file_size)
+        # stable enumeration order for the change feed
+        self.order = sorted(self.items, key=self.__depth)
+
+    def __add(self, item_id, parent_id, name, item_type, size=0):
+        self.items[item_id] = {
+            'id': item_id,
+            'parent_id': parent_id,
+            'name': name,
+            'type': item_type,
+            'size': size,
+            'description': 'x' * self.item_padding,
+            'created_time': '2015-01-01T00:00:00+0000',
+            'updated_time': '2015-01-01T00:00:00+0000'
+        }
+        self.children[item_id] = []
+        if parent_id is not None:
+            self.children[parent_id].append(item_id)
+
+    def __add_tree(self, parent_id, prefix, folders, depth, files):
+        if not depth:
+            return
+        for index in range(folders):
+            folder_id = 'folder.{0}.{1}'.format(prefix, index)
+            self.__add(folder_id, parent_id, '{0}{1}'.format(prefix, index),
+                       'folder')
+            for file_index in range(files):
+                self.__add('file.{0}.{1}.{2}'.format(prefix, index,
+                                                     file_index),
+                           folder_id, 'file{0}.txt'.format(file_index),
+                           'file', 1024)
+            self.__add_tree(folder_id, '{0}.{1}'.format(prefix, index),
+                            folders, depth - 1, files)
+
+    def __depth(self, item_id):
+        depth = 0
+        while self.items[item_id]['parent_id'] is not None:
+            item_id = self.items[item_id]['parent_id']
+            depth += 1
+        return depth, item_id
+
+    def v5(self, item_id):
+        """ v5.0 representation of an item
+
+        """
+        item = dict(self.items[item_id])
+        if item['type'] == 'folder':
+            item['count'] = len(self.children[item_id])
+        return item
+
+    def v1(self, item_id):
+        """ v1.0 representation of an item
+
+        """
+        item = self.items[item_id]
+        result = {
+            'id': item_id,
+            'name': item['name'],
+            'size': item['size'],
+            'description': item['description'],
+            'eTag': '"{0}"'.format(item_id),
+            'lastModifiedDateTime': '2015-01-01T00:00:00Z'
+        }
+        if item['parent_id'] is not None:
+            result['parentReference'] = {'id': item['parent_id']}
+        else:
+            result['root'] = {}
+        if item['type'] == 'folder':
+            result['folder'] = {'childCount': len(self.children[item_id])}
+        else:
+            result['file'] = {'mimeType': 'application/octet-stream'}
+        return result
+
+    def content(self, start, end):
+        """ Generate a file's bytes in the given range, by chunks
+
+        """
+        position = start
+        while position <= end:
+            offset = position % len(_CONTENT_BLOCK)
+            chunk = _CONTENT_BLOCK[offset:offset + end + 1 - position]
+            position += len(chunk)
+            yield chunk
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # send headers and body together, avoiding delayed ACK stalls
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.__handle('GET')
+
+    def do_POST(self):
+        self.__handle('POST')
+
+    def __handle(self, method):
+        server = self.server
+        url = urlparse(self.path)
+        params = dict((key, values[0]) for key, values in
+                      parse_qs(url.query).items())
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        if server.latency:
+            time.sleep(server.latency)
+        throttled = server.count_request()
+        if throttled:
+            return self.__json(429, {'error': {'code': 'throttled'}},
+                               {'Retry-After': str(server.retry_after)})
+        if method == 'POST' and url.path == '/oauth20_token.srf':
+            return self.__json(200, server.refresh(body))
+        token = params.get('access_token') or \
+            (self.headers.get('Authorization') or '')[len('Bearer '):]
+        if not server.is_valid(token):
+            return self.__json(401,
+                               {'error': {'code': 'request_token_expired'}})
+        drive = server.drive
+        segments = url.path.strip('/').split('/')
+        if method == 'GET' and segments[0] == 'v5.0':
+            if segments[1:] == ['me', 'skydrive']:
+                return self.__json(200, drive.v5(ROOT_ID))
+            item_id = segments[1]
+            if item_id not in drive.items:
+                return self.__json(404, {'error': {'code': 'not_found'}})
+            if len(segments) == 2:
+                return self.__json(200, drive.v5(item_id))
+            if segments[2] == 'files':
+                return self.__files(item_id, params)
+            if segments[2] == 'content':
+                return self.__content(item_id)
+        if method == 'GET' and segments[0] == 'v1.0' and \
+                segments[-1] == 'view.changes':
+            return self.__changes(params)
+        if method == 'GET' and segments[:3] == ['v1.0', 'drive', 'items'] \
+                and len(segments) > 3:
+            item_id = segments[3]
+            if item_id not in drive.items:
+                return self.__json(404, {'error': {'code': 'not_found'}})
+            if len(segments) == 4:
+                return self.__json(200, drive.v1(item_id))
+            if segments[4:] == ['content']:
+                return self.__content(item_id)
+        self.__json(404, {'error': {'code': 'not_found'}})
+
+    def __json(self, status, content, headers=None):
+        body = json.dumps(content).encode('utf-8')
+        accepted = self.headers.get('Accept-Encoding') or ''
+        compressed = self.server.compress and 'gzip' in accepted
+        if compressed:
+            buf = io.BytesIO()
+            with gzip.GzipFile(fileobj=buf, mode='wb') as gzipped:
+                gzipped.write(body)
+            body = buf.getvalue()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if compressed:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count_bytes(len(body))
+
+    def __files(self, folder_id, params):
+        drive = self.server.drive
+        limit = int(params.get('limit', 20))
+        offset = int(params.get('offset', 0))
+        children = drive.children[folder_id]
+        page = {'data': [drive.v5(child)
+                         for child in children[offset:offset + limit]],
+                'paging': {}}
+        if offset + limit < len(children):
+            page['paging']['next'] = '{0}/v5.0/{1}/files?offset={2}'.format(
+                self.server.url, folder_id, offset + limit)
+        self.__json(200, page)
+
+    def __changes(self, params):
+        drive = self.server.drive
+        page_size = self.server.changes_page_size
+        offset = int(params.get('token') or 0)
+        ids = drive.order[offset:offset + page_size]
+        offset += len(ids)
+        self.__json(200, {
+            'value': [drive.v1(item_id) for item_id in ids],
+            '@changes.token': str(offset),
+            '@changes.hasMoreChanges': offset < len(drive.order)
+        })
+
+    def __content(self, item_id):
+        drive = self.server.drive
+        size = drive.items[item_id]['size']
+        etag = drive.v1(item_id)['eTag']
+        start, end, status = 0, size - 1, 200
+        match = _RANGE.match(self.headers.get('Range') or '')
+        if_range = self.headers.get('If-Range')
+        if match and if_range in (None, etag):
+            start = int(match.group(1))
+            end = min(int(match.group(2) or size - 1), size - 1)
+            status = 206
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(end + 1 - start))
+        self.send_header('ETag', etag)
+        if status == 206:
+            self.send_header('Content-Range', 'bytes {0}-{1}/{2}'.format(
+                start, end, size))
+        self.end_headers()
+        for chunk in drive.content(start, end):
+            self.wfile.write(chunk)
+        self.server.count_bytes(end + 1 - start)
+
+
+class SimulatedServer(ThreadingMixIn, HTTPServer):
+    """ Threaded HTTP server emulating the endpoints used by `OneDrive`
+
+    Besides serving a `SimulatedDrive`, the server can answer after a fixed
+    latency, expire access tokens after `token_ttl` seconds (answering 401
+    until the client refreshes them), throttle every `throttle_every`-th
+    request with a 429 response and gzip JSON responses when `compress` is
+    set and the client accepts it.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, drive=None, latency=0, token_ttl=None,
+                 throttle_every=None, retry_after=0, changes_page_size=200,
+                 compress=False, port=0):
+        """
+        @param drive: the `SimulatedDrive` to serve
+        @param latency: seconds to wait before answering each request
+        @param token_ttl: seconds an access token is valid, `None` for ever
+        @param throttle_every: throttle one request out of this number
+        @param retry_after: `Retry-After` value of throttled responses
+        @param changes_page_size: number of items per `view.changes` page
+        @param compress: whether to gzip JSON responses
+        @param port: port to listen on, 0 for any free one
+        """
+        HTTPServer.__init__(self, ('127.0.0.1', port), _Handler)
+        self.drive = drive or SimulatedDrive()
+        self.latency = latency
+        self.token_ttl = token_ttl
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.changes_page_size = changes_page_size
+        self.compress = compress
+        self.url = 'http://127.0.0.1:{0}'.format(self.server_address[1])
+        self._lock = threading.Lock()
+        self._tokens = {INITIAL_TOKEN: time.time()}
+        self._thread = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        """ Reset the request and byte counters
+
+        """
+        with self._lock:
+            self.requests = 0
+            self.throttled = 0
+            self.refreshes = 0
+            self.bytes_sent = 0
+
+    def count_request(self):
+        """ Count a request
+
+        @return: whether it must be throttled
+        """
+        with self._lock:
+            self.requests += 1
+            throttled = bool(self.throttle_every) and \
+                self.requests % self.throttle_every == 0
+            if throttled:
+                self.throttled += 1
+            return throttled
+
+    def count_bytes(self, count):
+        with self._lock:
+            self.bytes_sent += count
+
+    def is_valid(self, token):
+        with self._lock:
+            issued = self._tokens.get(token)
+        if issued is None:
+            return False
+        return self.token_ttl is None or time.time() - issued < self.token_ttl
+
+    def refresh(self, body):
+        """ Issue a new access token
+
+        """
+        with self._lock:
+            self.refreshes += 1
+            token = 'token-{0}'.format(self.refreshes)
+            self._tokens[token] = time.time()
+        response = {'access_token': token, 'refresh_token': 'refresh-' + token}
+        # expiring tokens are not announced, so that clients get 401 responses
+        if self.token_ttl is None:
+            response['expires_in'] = 3600
+        return response
+
+    def expire_tokens(self):
+        """ Expire every access token issued so far
+
+        """
+        with self._lock:
+            self._tokens.clear()
+
+    def handle_error(self, request, client_address):
+        # clients close connections early, e.g. when a download stops:
+        # no traceback on the console for these
+        LOGGER.debug("Error serving %s", client_address, exc_info=True)
+
+    def start(self):
+        """ Serve requests from a background thread
+
+        """
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """ Stop serving and close the socket
+
+        """
+        self.shutdown()
+        self.server_close()
+
+    def client(self, **kwargs):
+        """ Create a client sending its requests to this server
+
+        @param kwargs: extra `OneDrive` parameters
+        @rtype: OneDrive
+        """
+        return connect(self.url, **kwargs)
+
+
+def connect(url, **kwargs):
+    """ Create a client sending its requests to a simulated server
+
+    @param url: the server's URL, e.g. 'http://127.0.0.1:8000'
+    @param kwargs: extra `OneDrive` parameters
+    @rtype: OneDrive
+    """
+    client = OneDrive(INITIAL_TOKEN, 'refresh', 'client_id', 'secret',
+                      **kwargs)
+    client._api_url = url + '/v5.0/'
+    client._api_v1_url = url + '/v1.0/'
+    client._token_url = url + '/oauth20_token.srf'
+    return client
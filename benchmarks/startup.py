@@ -0,0 +1,122 @@
+""" Measure the cost of importing the package in a fresh interpreter
+
+Usage: python -m benchmarks.startup [--help]
+
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# statements timed, each in a new interpreter
+STATEMENTS = [
+    ('interpreter', 'pass'),
+    ('import pyonedrive', 'import pyonedrive'),
+    ('import OneDrive', 'from pyonedrive import OneDrive'),
+    ('first session', 'from pyonedrive import OneDrive\n'
+                      "OneDrive('t', 'r', 'id', 'secret').transport.session"),
+    ('import requests', 'import requests'),
+]
+
+# statements which must stay cheap, checked by `main`
+CHECKED = ('import pyonedrive', 'import OneDrive')
+
+# directory holding the package
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# third-party modules whose loading is reported
+HEAVY_MODULES = ('requests', 'urllib3', 'sqlite3', 'multiprocessing',
+                 'numpy')
+
+_PROBE = '''
+import sys, time
+start = time.time()
+exec({statement!r})
+elapsed = time.time() - start
+print(__import__('json').dumps({{
+    'elapsed': elapsed,
+    'modules': len(sys.modules),
+    'loaded': [name for name in {heavy!r} if name in sys.modules]}}))
+'''
+
+
+def measure(statement, repeat=5, python=sys.executable):
+    """ Time a statement in fresh interpreters
+
+    @param statement: the code to run, typically imports
+    @param repeat: number of interpreters to run it in
+    @param python: interpreter to use
+    @return: the median time in milliseconds spent running the statement, the
+    median time of the whole interpreter, the number of modules loaded and
+    the heavy modules among them
+    @rtype: dict
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [ROOT] + [path for path in [env.get('PYTHONPATH')] if path])
+    runs = []
+    for _ in range(repeat):
+        start = time.time()
+        output = subprocess.check_output(
+            [python, '-c', _PROBE.format(statement=statement,
+                                         heavy=HEAVY_MODULES)], env=env)
+        process = time.time() - start
+        run = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+        run['process'] = process
+        runs.append(run)
+    runs.sort(key=lambda run: run['elapsed'])
+    median = runs[len(runs) // 2]
+    return {
+        'import ms': median['elapsed'] * 1000,
+        'process ms': sorted(run['process'] for run in runs)[
+            len(runs) // 2] * 1000,
+        'modules': median['modules'],
+        'loaded': ','.join(median['loaded']) or None
+    }
+
+
+COLUMNS = ('name', 'import ms', 'process ms', 'modules', 'loaded')
+
+
+def format_row(values):
+    cells = []
+    for column, value in zip(COLUMNS, values):
+        if isinstance(value, float):
+            value = '{0:.1f}'.format(value)
+        elif value is None:
+            value = '-'
+        cells.append(str(value).ljust(20 if column == 'name' else 12))
+    return ''.join(cells).rstrip()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='interpreters started per statement')
+    parser.add_argument('--max-ms', type=float, default=None,
+                        help='fail if importing the package or the client '
+                        'takes longer')
+    args = parser.parse_args(argv)
+
+    print(format_row(COLUMNS))
+    reports = {}
+    for name, statement in STATEMENTS:
+        reports[name] = measure(statement, repeat=args.repeat)
+        print(format_row([name] + [reports[name][column]
+                                   for column in COLUMNS[1:]]))
+    for name in CHECKED:
+        report = reports[name]
+        if report['loaded']:
+            print('{0} loads {1}'.format(name, report['loaded']))
+            return 1
+        if args.max_ms is not None and report['import ms'] > args.max_ms:
+            print('{0} takes more than {1} ms'.format(name, args.max_ms))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,27 @@
 """ import the OneDrive client
 
+Public classes are imported upon first access, so importing the package
+neither loads the client's modules nor requests.
 """
 
-from py_onedrive import OneDrive
 from version import version
-from live_auth import LiveAuth
+from lazy import LazyPackage
+
+__all__ = ['version']
+
+LazyPackage.install(__name__, {
+    'OneDrive': 'py_onedrive',
+    'LiveAuth': 'live_auth',
+    'Transport': 'transport',
+    'AsyncOneDrive': 'async_onedrive',
+    'LRUCache': 'cache',
+    'DeltaSyncStore': 'delta_sync',
+    'RetryPolicy': 'retry',
+    'FileTokenStore': 'token_store',
+    'SQLiteTokenStore': 'token_store',
+    'DriveItem': 'item',
+    'MetricsCollector': 'metrics',
+    'ChangePipeline': 'pipeline',
+    'QuickXorHash': 'hashing',
+    'Mirror': 'mirror',
+})
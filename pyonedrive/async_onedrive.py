@@ -0,0 +1,106 @@
+""" Concurrent facade over the OneDrive client
+
+"""
+
+import functools
+import inspect
+import threading
+from multiprocessing.pool import ThreadPool
+
+from concurrency import BackgroundIterator
+
+
+class AsyncOneDrive(object):
+    """ Non blocking mirror of a `OneDrive` client
+
+    Every public method of the wrapped client is exposed under the same name
+    and signature, but is run on a bounded worker pool and immediately returns
+    a `multiprocessing.pool.AsyncResult`: call `get()` on it to obtain the
+    method's result (or have its exception raised).
+
+    Generator methods (`get_folder_content_generator`, `get_comments_generator`
+    , `get_tags_generator`, `get_view_changes_generator`, ...) return an
+    iterator fetching pages in the background instead. Generators called
+    with `stream=True` are returned as is: a streamed page is read as it is
+    consumed, it cannot be handed over by a background thread.
+
+    All calls share the wrapped client, hence its transport and its token
+    refresh logic. At most `max_in_flight` calls run at the same time, the
+    client's transport should therefore be created with a `pool_maxsize` at
+    least as large.
+
+    Calls are blocking ones run by a pool of threads: each call in flight
+    holds a thread for its whole duration, so concurrency is bound by
+    `max_in_flight` threads rather than by sockets. Hundreds of calls in
+    flight are fine, many thousands call for as many threads.
+    """
+
+    def __init__(self, client, max_in_flight=10, prefetch=1):
+        """
+        @param client: the `OneDrive` client to run the calls with
+        @param max_in_flight: maximum number of concurrent calls
+        @param prefetch: number of elements generators read in advance
+        """
+        self.client = client
+        self.max_in_flight = max_in_flight
+        self.prefetch = prefetch
+        self._semaphore = threading.BoundedSemaphore(max_in_flight)
+        self._pool = ThreadPool(max_in_flight)
+
+    def __getattr__(self, name):
+        client = self.__dict__.get('client')
+        if client is None or name.startswith('_'):
+            raise AttributeError(name)
+        attribute = getattr(client, name)
+        if not callable(attribute):
+            return attribute
+        if name.endswith('_generator'):
+            wrapper = self.__generator_wrapper(attribute)
+        else:
+            wrapper = self.__method_wrapper(attribute)
+        return functools.wraps(attribute)(wrapper)
+
+    def __run(self, method, args, kwargs):
+        with self._semaphore:
+            return method(*args, **kwargs)
+
+    def __method_wrapper(self, method):
+        def submit(*args, **kwargs):
+            return self._pool.apply_async(self.__run,
+                                          (method, args, kwargs))
+        return submit
+
+    def __generator_wrapper(self, method):
+        def iterate(*args, **kwargs):
+            generator = method(*args, **kwargs)
+            if inspect.getcallargs(method, *args, **kwargs).get('stream'):
+                return generator
+            return BackgroundIterator(generator, maxsize=self.prefetch,
+                                      semaphore=self._semaphore)
+        return iterate
+
+    def map(self, method, arguments):
+        """ Call a method once per argument, concurrently
+
+        @param method: name of the client's method to call
+        @param arguments: iterable of arguments, each being either a single
+        argument or a tuple of positional arguments
+        @return: the pending results, in the arguments order
+        @rtype: list
+        """
+        call = getattr(self, method)
+        return [call(*(arg if isinstance(arg, tuple) else (arg,)))
+                for arg in arguments]
+
+    def close(self):
+        """ Wait for pending calls to complete and stop the workers
+
+        """
+        self._pool.close()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
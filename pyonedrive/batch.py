@@ -0,0 +1,205 @@
+""" JSON batching of v1.0 API requests
+
+"""
+
+import collections
+from multiprocessing.pool import ThreadPool
+
+from lazy import LazyModule
+
+requests = LazyModule('requests')
+
+# maximum number of sub-requests the server accepts in a single batch
+MAX_BATCH_SIZE = 20
+
+
+class BatchResponse(object):
+    """ Result of a batched sub-request
+
+    """
+
+    def __init__(self, request_id, status_code, headers=None, body=None,
+                 error=None):
+        """
+        @param request_id: the sub-request's ID
+        @param status_code: sub-request's HTTP status, `None` if the batch
+        itself failed
+        @param headers: sub-request's response headers
+        @param body: sub-request's decoded response body
+        @param error: exception raised while sending the batch, if any
+        """
+        self.request_id = request_id
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.body = body
+        self.error = error
+
+    @property
+    def ok(self):
+        """ Whether the sub-request succeeded
+
+        @rtype: bool
+        """
+        return self.error is None and self.status_code is not None and \
+            200 <= self.status_code < 400
+
+    def json(self):
+        """ The sub-request's decoded body
+
+        """
+        return self.body
+
+    def raise_for_status(self):
+        """ Raise the sub-request's error, if any
+
+        @raises: `requests.exception.HTTPError` upon error
+        """
+        if self.error is not None:
+            raise self.error
+        if not self.ok:
+            raise requests.HTTPError('{0} error for batched request {1}'
+                                     .format(self.status_code,
+                                             self.request_id))
+
+
+class BatchRequest(object):
+    """ Pack many v1.0 API requests into `$batch` calls
+
+    Sub-requests are split into batches of at most `max_batch_size` requests,
+    batches being sent concurrently. Sub-request URLs are relative to the
+    v1.0 API root, e.g. '/drive/items/{id}'.
+    """
+
+    def __init__(self, send, max_batch_size=MAX_BATCH_SIZE, max_in_flight=4):
+        """
+        @param send: function posting a batch body and returning the decoded
+        response. It must raise upon error.
+        @param max_batch_size: maximum number of sub-requests per batch
+        @param max_in_flight: number of batches sent concurrently
+        """
+        self.send = send
+        self.max_batch_size = max_batch_size
+        self.max_in_flight = max_in_flight
+        self.requests = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self.requests)
+
+    def add(self, method, url, body=None, headers=None, request_id=None):
+        """ Add a sub-request to the batch
+
+        @param method: HTTP verb
+        @param url: resource's URL, relative to the v1.0 API root
+        @param body: JSON serializable request body
+        @param headers: sub-request's headers
+        @param request_id: sub-request's ID, generated if not provided
+        @raises: `ValueError` if the batch already holds a sub-request with
+        this ID
+        @return: the sub-request's ID, used to retrieve its response
+        """
+        if request_id is None:
+            number = len(self.requests) + 1
+            while str(number) in self.requests:
+                number += 1
+            request_id = str(number)
+        elif request_id in self.requests:
+            raise ValueError('Duplicate batch request ID {0!r}'
+                             .format(request_id))
+        request = {'id': request_id, 'method': method.upper(), 'url': url}
+        if body is not None:
+            request['body'] = body
+            headers = dict(headers or {})
+            headers.setdefault('Content-Type', 'application/json')
+        if headers:
+            request['headers'] = headers
+        self.requests[request_id] = request
+        return request_id
+
+    def add_item(self, item_id, request_id=None):
+        """ Add a request for an item's metadata
+
+        @return: the sub-request's ID
+        """
+        return self.add('get', '/drive/items/{0}'.format(item_id),
+                        request_id=request_id)
+
+    def add_children(self, item_id, request_id=None):
+        """ Add a request for a folder's children
+
+        @return: the sub-request's ID
+        """
+        return self.add('get', '/drive/items/{0}/children'.format(item_id),
+                        request_id=request_id)
+
+    def add_thumbnails(self, item_id, request_id=None):
+        """ Add a request for an item's thumbnails
+
+        @return: the sub-request's ID
+        """
+        return self.add('get', '/drive/items/{0}/thumbnails'.format(item_id),
+                        request_id=request_id)
+
+    def add_permissions(self, item_id, request_id=None):
+        """ Add a request for an item's sharing permissions
+
+        @return: the sub-request's ID
+        """
+        return self.add('get',
+                        '/drive/items/{0}/permissions'.format(item_id),
+                        request_id=request_id)
+
+    def add_link(self, item_id, link_type='view', request_id=None):
+        """ Add a request creating a sharing link for an item
+
+        @param link_type: 'view' (read only), 'edit' (read-write) or 'embed'
+        @return: the sub-request's ID
+        """
+        return self.add('post',
+                        '/drive/items/{0}/action.createLink'.format(item_id),
+                        body={'type': link_type}, request_id=request_id)
+
+    def __batches(self):
+        pending = list(self.requests.values())
+        for start in range(0, len(pending), self.max_batch_size):
+            yield pending[start:start + self.max_batch_size]
+
+    def __send_batch(self, batch):
+        try:
+            response = self.send({'requests': batch})
+        except IOError as exc:
+            return [BatchResponse(request['id'], None, error=exc)
+                    for request in batch]
+        return [BatchResponse(result.get('id'), result.get('status'),
+                              result.get('headers'), result.get('body'))
+                for result in response.get('responses', [])]
+
+    def execute(self):
+        """ Send every sub-request
+
+        A batch which could not be sent marks all its sub-requests as failed,
+        other batches are not affected.
+
+        @return: the sub-requests' responses by ID, in the order they were
+        added
+        @rtype: OrderedDict
+        """
+        responses = {}
+        batches = list(self.__batches())
+        if len(batches) > 1 and self.max_in_flight > 1:
+            pool = ThreadPool(min(self.max_in_flight, len(batches)))
+            try:
+                results = pool.map(self.__send_batch, batches)
+            finally:
+                pool.terminate()
+        else:
+            results = [self.__send_batch(batch) for batch in batches]
+        for batch_responses in results:
+            for response in batch_responses:
+                responses[response.request_id] = response
+        ordered = collections.OrderedDict()
+        for request_id in self.requests:
+            ordered[request_id] = responses.get(request_id) or BatchResponse(
+                request_id, None,
+                error=requests.HTTPError('No response for batched request '
+                                         '{0}'.format(request_id)))
+        return ordered
@@ -0,0 +1,123 @@
+""" Response caches for GET requests
+
+"""
+
+import collections
+import threading
+import time
+
+
+class CacheEntry(object):
+    """ A cached response along with its validator
+
+    """
+    __slots__ = ('response', 'etag', 'expires')
+
+    def __init__(self, response, etag, expires):
+        self.response = response
+        self.etag = etag
+        self.expires = expires
+
+
+class LRUCache(object):
+    """ Thread-safe, size bounded in-memory cache of API responses
+
+    Entries are served without any request while fresh (younger than `ttl`
+    seconds), stale entries holding an ETag are revalidated with a
+    conditional request. The least recently used entry is evicted when the
+    cache is full.
+
+    Any object exposing the same `get`, `is_fresh`, `set` and `refresh`
+    methods can be given to `OneDrive` instead.
+    """
+
+    def __init__(self, max_entries=1024, ttl=60, clock=time.time):
+        """
+        @param max_entries: maximum number of cached responses
+        @param ttl: number of seconds a response is served without being
+        revalidated, 0 to always revalidate
+        @param clock: function returning the current time in seconds
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """ Look a response up, fresh or not
+
+        @param key: the request's key
+        @return: the entry, or `None` if not cached
+        @rtype: CacheEntry
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries[key] = entry
+            if entry.expires > self.clock():
+                self.hits += 1
+            return entry
+
+    def is_fresh(self, entry):
+        """ Tell whether an entry can be served without revalidation
+
+        @param entry: an entry returned by `get`
+        @rtype: bool
+        """
+        return entry.expires > self.clock()
+
+    def set(self, key, response):
+        """ Store a successful response
+
+        @param key: the request's key
+        @param response: the response, its content must have been read
+        """
+        entry = CacheEntry(response, response.headers.get('ETag'),
+                           self.clock() + self.ttl)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def refresh(self, key):
+        """ Mark an entry as fresh again after a successful revalidation
+
+        @param key: the request's key
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.expires = self.clock() + self.ttl
+                self.revalidations += 1
+
+    def clear(self):
+        """ Drop every entry
+
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """ Usage counters
+
+        @rtype: dict
+        """
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'revalidations': self.revalidations,
+            'evictions': self.evictions
+        }
@@ -0,0 +1,77 @@
+""" Deduplication of identical concurrent requests
+
+"""
+
+import threading
+
+
+class _Call(object):
+    """ A request in flight, shared by the callers asking for it
+
+    """
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """ Run a function once for all the concurrent callers of a same key
+
+    The first caller of a key runs the function, callers arriving before it
+    returns wait for it and get the same result, or the same exception. Once
+    it has returned, the next caller runs the function again: results are not
+    cached.
+    """
+
+    def __init__(self):
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """ Number of calls in flight
+
+        """
+        return len(self._calls)
+
+    def do(self, key, function):
+        """ Run `function`, unless a call for `key` is already in flight
+
+        @param key: hashable identifier of the call
+        @param function: function called without arguments
+        @return: the function's result
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = function()
+        except Exception as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        """ Usage counters
+
+        @return: number of calls in flight and of calls which joined another
+        one instead of running
+        @rtype: dict
+        """
+        return {'in_flight': len(self._calls), 'coalesced': self.coalesced}
@@ -0,0 +1,61 @@
+""" Content encoding negotiation and transfer sizes
+
+"""
+
+# encoding asking the server to send bodies as is, e.g. for file contents
+IDENTITY = 'identity'
+
+_ACCEPT_ENCODING = []
+
+
+def supported_encodings():
+    """ List the content encodings responses can be decoded from
+
+    Brotli ('br') is only listed when urllib3 can decode it, i.e. when a
+    brotli package is installed along with a recent enough urllib3.
+
+    @return: the encodings, preferred first
+    @rtype: list
+    """
+    try:
+        from requests.packages.urllib3.response import HTTPResponse
+    except ImportError:  # requests without a vendored urllib3
+        from urllib3.response import HTTPResponse
+    decoders = getattr(HTTPResponse, 'CONTENT_DECODERS', ['gzip', 'deflate'])
+    return [encoding for encoding in ('br', 'gzip', 'deflate')
+            if encoding in decoders]
+
+
+def accept_encoding():
+    """ Value of the Accept-Encoding header sent with API requests
+
+    @return: the supported encodings, e.g. 'gzip, deflate'
+    """
+    if not _ACCEPT_ENCODING:
+        _ACCEPT_ENCODING.append(', '.join(supported_encodings()))
+    return _ACCEPT_ENCODING[0]
+
+
+def transfer_sizes(response, stream):
+    """ Measure a response's body on the wire and once decoded
+
+    @param response: the `requests.Response`
+    @param stream: whether the response is streamed, its body is then not
+    read yet and only its announced length is known
+    @return: the number of bytes received, i.e. compressed, and the number
+    of bytes once decompressed, each `None` when unknown
+    @rtype: tuple
+    """
+    encoding = (response.headers.get('Content-Encoding') or IDENTITY).lower()
+    length = response.headers.get('Content-Length')
+    length = int(length) if length and length.isdigit() else None
+    if stream:
+        return length, length if encoding == IDENTITY else None
+    decoded = len(response.content or b'')
+    if encoding == IDENTITY:
+        return decoded, decoded
+    received = getattr(response.raw, 'tell', None)
+    received = received() if callable(received) else None
+    if isinstance(received, int) and received:
+        return received, decoded
+    return length, decoded
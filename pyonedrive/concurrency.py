@@ -0,0 +1,108 @@
+""" Threading helpers shared by the concurrent features
+
+"""
+
+import sys
+import threading
+
+try:
+    import Queue as queue
+except ImportError:  # Python 3
+    import queue
+
+
+class BackgroundIterator(object):
+    """ Consume an iterable from a background thread
+
+    Elements are read ahead by a daemon thread and buffered in a bounded
+    queue, so producing the next element (typically fetching a page) overlaps
+    with the consumer's processing. Exceptions raised by the iterable are
+    re-raised on the consumer side. Closing the iterator, explicitly or when
+    leaving a `with` block, stops the producer which then closes the wrapped
+    iterator.
+    """
+
+    def __init__(self, iterable, maxsize=1, semaphore=None):
+        """
+        @param iterable: the iterable to consume
+        @param maxsize: maximum number of elements read in advance
+        @param semaphore: optional semaphore acquired while the wrapped
+        iterator produces an element, to bound the work done concurrently
+        """
+        self._queue = queue.Queue(max(maxsize, 1))
+        self._stop = threading.Event()
+        self._semaphore = semaphore
+        self._finished = False
+        self._thread = threading.Thread(target=self._produce,
+                                        args=(iterable,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _produce(self, iterable):
+        iterator = None
+        try:
+            iterator = iter(iterable)
+            while not self._stop.is_set():
+                if self._semaphore is not None:
+                    with self._semaphore:
+                        element = next(iterator)
+                else:
+                    element = next(iterator)
+                if not self._put((True, element)):
+                    break
+        except StopIteration:
+            self._put((False, None))
+        except Exception:
+            self._put((False, sys.exc_info()[1]))
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+
+    def _put(self, entry):
+        """ Enqueue an entry unless the consumer closed the iterator
+
+        @return: whether the entry was enqueued
+        @rtype: bool
+        """
+        while not self._stop.is_set():
+            try:
+                self._queue.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._finished:
+            raise StopIteration
+        has_element, value = self._queue.get()
+        if has_element:
+            return value
+        self.close()
+        if value is not None:
+            raise value
+        raise StopIteration
+
+    next = __next__
+
+    def close(self):
+        """ Stop the background producer and release buffered elements
+
+        """
+        self._finished = True
+        self._stop.set()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,301 @@
+""" Local SQLite index of a drive kept up to date from its change feed
+
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+
+from projection import with_required
+
+LOGGER = logging.getLogger(__name__)
+
+# properties the index relies on
+REQUIRED_FIELDS = ('id', 'name', 'parentReference', 'folder', 'size', 'eTag',
+                   'deleted', 'root')
+
+_SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS items ('
+    ' id TEXT PRIMARY KEY,'
+    ' parent_id TEXT,'
+    ' name TEXT,'
+    ' is_folder INTEGER NOT NULL DEFAULT 0,'
+    ' size INTEGER,'
+    ' etag TEXT,'
+    ' data TEXT NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS items_parent ON items (parent_id)',
+    'CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)',
+    'CREATE TABLE IF NOT EXISTS failed (id TEXT PRIMARY KEY)',
+]
+
+
+class DeltaSyncStore(object):
+    """ Apply a drive's change feed to a local SQLite index
+
+    Items are stored by ID along with their parent's ID. Each page of
+    changes is applied in a single transaction which also records the page's
+    change token, so a sync interrupted at any point resumes from the last
+    applied page. A `@changes.resync` page drops the whole index before the
+    full enumeration which follows it, and is remembered until
+    `acknowledge_resync` is called. Items a consumer failed to apply are
+    recorded along with their page, until `resolve_failed` is called.
+    """
+
+    def __init__(self, path):
+        """
+        @param path: path of the SQLite database, ':memory:' for a transient
+        index
+        """
+        self.database = path
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            for statement in _SCHEMA:
+                self._db.execute(statement)
+
+    def close(self):
+        """ Close the database
+
+        """
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+
+    @property
+    def change_token(self):
+        """ The checkpoint to resume the change feed from
+
+        @return: the token, `None` if nothing was synchronized yet
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM state WHERE key = 'change_token'"
+            ).fetchone()
+        return row[0] if row else None
+
+    @property
+    def resynced(self):
+        """ Whether a resync dropped the index since last acknowledged
+
+        The full enumeration following a resync does not report the items
+        deleted in between: consumers keeping their own copy of the drive
+        compare it with the index once the enumeration completes, then call
+        `acknowledge_resync`. The flag survives interrupted syncs.
+
+        @rtype: bool
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM state WHERE key = 'resynced'").fetchone()
+        return row is not None
+
+    def acknowledge_resync(self):
+        """ Clear the `resynced` flag
+
+        """
+        with self._lock:
+            with self._db:
+                self._db.execute("DELETE FROM state WHERE key = 'resynced'")
+
+    @property
+    def failed(self):
+        """ IDs of the items recorded as failed, and not resolved since
+
+        @rtype: list
+        """
+        with self._lock:
+            return [row[0] for row in self._db.execute(
+                'SELECT id FROM failed ORDER BY id')]
+
+    def resolve_failed(self, item_ids):
+        """ Forget items recorded as failed, e.g. once applied
+
+        @param item_ids: IDs of the items
+        """
+        with self._lock:
+            with self._db:
+                self._db.executemany('DELETE FROM failed WHERE id = ?',
+                                     ((item_id,) for item_id in item_ids))
+
+    def sync(self, client, drive, fields=None):
+        """ Fetch and apply the changes since the last checkpoint
+
+        @param client: the `OneDrive` client to fetch changes with
+        @param drive: drive identifier or dict providing it in the 'id' key
+        @param fields: if provided, only these item properties, plus the ones
+        the index relies on, are fetched and stored
+        @raises: `requests.exception.HTTPError` upon error, pages applied so
+        far are kept
+        @return: number of changed items applied
+        @rtype: int
+        """
+        applied = 0
+        for page in client.get_view_changes_page_generator(
+                drive, self.change_token,
+                fields=with_required(fields, REQUIRED_FIELDS)):
+            applied += self.apply_page(page)
+        return applied
+
+    def apply_page(self, page, failed=()):
+        """ Apply a page of changes and record its change token atomically
+
+        @param page: a page returned by `get_view_changes_page_generator`
+        @param failed: IDs of the page's items the consumer could not apply,
+        they are listed in `failed`. The page's other items are no longer
+        considered failed.
+        @return: number of changed items applied
+        @rtype: int
+        """
+        with self._lock:
+            with self._db:
+                if '@changes.resync' in page:
+                    LOGGER.info("Change feed asks for a resync, "
+                                "dropping the local index")
+                    self._db.execute('DELETE FROM items')
+                    self._db.execute('DELETE FROM failed')
+                    self._db.execute(
+                        "DELETE FROM state WHERE key = 'change_token'")
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO state (key, value) "
+                        "VALUES ('resynced', ?)", (page['@changes.resync'],))
+                    return 0
+                items = page.get('value', [])
+                for item in items:
+                    if 'deleted' in item:
+                        self.__delete(item['id'])
+                    else:
+                        self.__upsert(item)
+                        self._db.execute('DELETE FROM failed WHERE id = ?',
+                                         (item['id'],))
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO failed (id) VALUES (?)',
+                    ((item_id,) for item_id in failed))
+                self._db.execute(
+                    "INSERT OR REPLACE INTO state (key, value) "
+                    "VALUES ('change_token', ?)", (page['@changes.token'],))
+        return len(items)
+
+    def __upsert(self, item):
+        parent_id = (item.get('parentReference') or {}).get('id')
+        self._db.execute(
+            'INSERT OR REPLACE INTO items '
+            '(id, parent_id, name, is_folder, size, etag, data) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (item['id'], parent_id, item.get('name'),
+             1 if 'folder' in item else 0, item.get('size'),
+             item.get('eTag'), json.dumps(item)))
+
+    def __delete(self, item_id):
+        """ Delete an item and its descendants
+
+        """
+        pending = [item_id]
+        while pending:
+            current = pending.pop()
+            pending.extend(row[0] for row in self._db.execute(
+                'SELECT id FROM items WHERE parent_id = ?', (current,)))
+            self._db.execute('DELETE FROM items WHERE id = ?', (current,))
+            self._db.execute('DELETE FROM failed WHERE id = ?', (current,))
+
+    def get(self, item_id):
+        """ Retrieve an item's last known representation
+
+        @param item_id: the item's ID
+        @return: the item, `None` if unknown
+        @rtype: dict
+        """
+        with self._lock:
+            row = self._db.execute('SELECT data FROM items WHERE id = ?',
+                                   (item_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def children(self, parent_id):
+        """ Retrieve a folder's children
+
+        @param parent_id: the folder's ID
+        @return: the children, ordered by name
+        @rtype: list
+        """
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT data FROM items WHERE parent_id = ? ORDER BY name',
+                (parent_id,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def path(self, item_id, overlay=None):
+        """ Build an item's path from its ancestors' names
+
+        The drive's root, having no parent, is not part of the path.
+
+        @param item_id: the item's ID
+        @param overlay: dict mapping IDs to (parent ID, name) pairs, or `None`
+        for deleted items, taking precedence over the index, e.g. the changes
+        of a page not applied yet
+        @return: the item's path, e.g. '/Documents/file.txt', `None` if the
+        item or one of its ancestors is unknown
+        """
+        names = []
+        overlay = overlay or {}
+        with self._lock:
+            while True:
+                if item_id in overlay:
+                    row = overlay[item_id]
+                else:
+                    row = self._db.execute(
+                        'SELECT parent_id, name FROM items WHERE id = ?',
+                        (item_id,)).fetchone()
+                if row is None:
+                    return None
+                parent_id, name = row
+                if parent_id is None:
+                    break
+                names.append(name)
+                item_id = parent_id
+        return '/' + '/'.join(reversed(names))
+
+    def paths(self):
+        """ Build the path of every item
+
+        @return: dict mapping the IDs of the items whose ancestors are all
+        known to their paths
+        """
+        with self._lock:
+            parents = dict(
+                (item_id, (parent_id, name)) for item_id, parent_id, name in
+                self._db.execute('SELECT id, parent_id, name FROM items'))
+        paths = {}
+
+        def resolve(item_id):
+            # iterative, trees may be deeper than the recursion limit
+            chain = []
+            while item_id not in paths:
+                if item_id not in parents:
+                    path = None
+                    break
+                parent_id, name = parents[item_id]
+                if parent_id is None:
+                    paths[item_id] = path = '/'
+                    break
+                chain.append((item_id, name))
+                item_id = parent_id
+            else:
+                path = paths[item_id]
+            for child_id, name in reversed(chain):
+                if path is not None:
+                    path = path.rstrip('/') + '/' + name
+                paths[child_id] = path
+
+        for item_id in parents:
+            resolve(item_id)
+        return dict((item_id, path) for item_id, path in paths.items()
+                    if path is not None)
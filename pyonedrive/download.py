@@ -0,0 +1,221 @@
+""" Parallel, resumable ranged downloads
+
+"""
+
+import json
+import logging
+import os
+import threading
+from multiprocessing.pool import ThreadPool
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_SEGMENT_SIZE = 8 * 1024 * 1024
+
+
+class ContentChanged(IOError):
+    """ The file changed since the download started
+
+    Ranges of different versions are never combined, the download has to
+    start over.
+    """
+
+
+class _Cancelled(Exception):
+    """ Another segment failed, the download stops
+
+    """
+
+
+class RangedDownload(object):
+    """ Download a file as byte ranges fetched concurrently
+
+    Each segment is written at its offset in the destination as soon as its
+    bytes arrive, a failed segment is retried on its own. When a state file is
+    used, completed segments are recorded in it so an interrupted download can
+    be resumed later on, the state file is removed once the download
+    completes. The state also records the content's tag, if known, so that
+    ranges of a version replaced since are not reused.
+    """
+
+    def __init__(self, fetch_range, size, destination,
+                 segment_size=DEFAULT_SEGMENT_SIZE, max_in_flight=4,
+                 max_attempts=3, state_path=None, chunk_size=64 * 1024,
+                 etag=None):
+        """
+        @param fetch_range: function called with the first and last (included)
+        offsets of a range, returning the streamed response
+        @param size: file's size in bytes
+        @param destination: path of the file to write to, or a seekable file
+        object opened in binary write mode
+        @param segment_size: size in bytes of the ranges to fetch
+        @param max_in_flight: number of ranges fetched concurrently
+        @param max_attempts: number of times a segment is tried before giving
+        up
+        @param state_path: path of the file recording completed segments, the
+        download is not resumable if not provided
+        @param chunk_size: size of the blocks written to the destination
+        @param etag: tag of the content's version, e.g. the item's eTag. When
+        provided, `fetch_range` is expected to send it as `If-Range`, a full
+        (200) response to a range request then means the content changed.
+        """
+        self.fetch_range = fetch_range
+        self.size = size
+        self.destination = destination
+        self.segment_size = segment_size
+        self.max_in_flight = max_in_flight
+        self.max_attempts = max_attempts
+        self.state_path = state_path
+        self.chunk_size = chunk_size
+        self.etag = etag
+        self.completed = set()
+        self.transferred = 0
+        self._lock = threading.Lock()
+        self._file = None
+        self._discarded = False
+        self._cancelled = False
+
+    @property
+    def segments(self):
+        """ Number of segments the file is split into
+
+        @rtype: int
+        """
+        return (self.size + self.segment_size - 1) // self.segment_size
+
+    def run(self):
+        """ Download the missing segments
+
+        @raises: the last segment's error if a segment could not be fetched
+        after `max_attempts` tries, `ContentChanged` as soon as a range of
+        another version than `etag` is served, the state is then discarded
+        @return: number of bytes transferred by this run
+        @rtype: int
+        """
+        self.__load_state()
+        owned = not hasattr(self.destination, 'write')
+        if owned:
+            mode = 'r+b' if self.completed else 'w+b'
+            self._file = open(self.destination, mode)
+        else:
+            self._file = self.destination
+        try:
+            self._file.truncate(self.size)
+            missing = [index for index in range(self.segments)
+                       if index not in self.completed]
+            if len(missing) == 1 or self.max_in_flight == 1:
+                # a pool costs more than it saves, and up to 100 ms to stop
+                for index in missing:
+                    self.__fetch_segment(index)
+            elif missing:
+                pool = ThreadPool(min(self.max_in_flight, len(missing)))
+                try:
+                    for _ in pool.imap_unordered(self.__fetch_segment,
+                                                 missing):
+                        pass
+                except BaseException:
+                    # running segments stop at their next chunk, the file
+                    # is not closed before they do
+                    self._cancelled = True
+                    raise
+                finally:
+                    pool.close()
+                    pool.join()
+        except ContentChanged:
+            with self._lock:
+                self._discarded = True
+                if self.state_path and os.path.exists(self.state_path):
+                    os.remove(self.state_path)
+            raise
+        finally:
+            if owned:
+                self._file.close()
+        if self.state_path and os.path.exists(self.state_path):
+            os.remove(self.state_path)
+        return self.transferred
+
+    def __fetch_segment(self, index):
+        start = index * self.segment_size
+        end = min(self.size, start + self.segment_size) - 1
+        error = None
+        for attempt in range(self.max_attempts):
+            if self._cancelled:
+                return
+            try:
+                written = self.__write_segment(start, end)
+                break
+            except (ContentChanged, _Cancelled):
+                raise
+            except IOError as exc:
+                LOGGER.warning("Segment %d-%d failed (attempt %d): %s",
+                               start, end, attempt + 1, exc)
+                error = exc
+        else:
+            raise error
+        with self._lock:
+            # bytes of failed attempts are written again, not counted twice
+            self.transferred += written
+            self.completed.add(index)
+            self.__save_state()
+
+    def __write_segment(self, start, end):
+        """ Fetch a range and write it at its offset
+
+        @return: number of bytes written
+        """
+        response = self.fetch_range(start, end)
+        try:
+            response.raise_for_status()
+            if response.status_code != 206 and \
+                    (start, end) != (0, self.size - 1):
+                if self.etag is not None:
+                    raise ContentChanged("Content changed, tag {0!r} is no "
+                                         "longer current".format(self.etag))
+                raise IOError("Range request not honored")
+            position = start
+            for chunk in response.iter_content(self.chunk_size):
+                if self._cancelled:
+                    raise _Cancelled()
+                if position + len(chunk) > end + 1:
+                    raise IOError("Range response is too long")
+                with self._lock:
+                    self._file.seek(position)
+                    self._file.write(chunk)
+                position += len(chunk)
+            if position != end + 1:
+                raise IOError("Incomplete range {0}-{1}: got {2} bytes"
+                              .format(start, end, position - start))
+            return position - start
+        finally:
+            response.close()
+
+    def __load_state(self):
+        """ Read the completed segments of a previous run, if compatible
+
+        """
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        if hasattr(self.destination, 'write') or \
+                not os.path.exists(self.destination):
+            return
+        with open(self.state_path) as state_file:
+            try:
+                state = json.load(state_file)
+            except ValueError:
+                return
+        if state.get('size') == self.size and \
+                state.get('segment_size') == self.segment_size and \
+                state.get('etag') == self.etag:
+            self.completed = set(state.get('completed', []))
+
+    def __save_state(self):
+        if not self.state_path or self._discarded:
+            return
+        self._file.flush()
+        temp_path = self.state_path + '.tmp'
+        with open(temp_path, 'w') as state_file:
+            json.dump({'size': self.size,
+                       'segment_size': self.segment_size,
+                       'etag': self.etag,
+                       'completed': sorted(self.completed)}, state_file)
+        os.rename(temp_path, self.state_path)
@@ -0,0 +1,232 @@
+""" Hashing of local files, to compare them with their drive counterparts
+
+"""
+
+import base64
+import binascii
+import hashlib
+import mmap
+import os
+import struct
+import zlib
+
+# size of the blocks hashed at once, a multiple of QuickXorHash's width
+CHUNK_SIZE = 160 * 64 * 1024
+
+# names of the hashes, as found in the items' `file.hashes`, strongest first
+SHA1_HASH = 'sha1Hash'
+QUICK_XOR_HASH = 'quickXorHash'
+CRC32_HASH = 'crc32Hash'
+HASHES = (SHA1_HASH, QUICK_XOR_HASH, CRC32_HASH)
+
+_WIDTH = 160
+_SHIFT = 11
+_MASK = (1 << _WIDTH) - 1
+_WIDTH_BYTES = _WIDTH // 8
+# bytes XORed as a single Python integer by the pure Python fold
+_FOLD_BLOCK = _WIDTH_BYTES * 8 * 256
+
+_NUMPY = []
+
+
+def _load_numpy():
+    """ Import NumPy upon first use, it is optional
+
+    @return: the numpy module, `None` if not installed
+    """
+    if not _NUMPY:
+        try:
+            import numpy
+        except ImportError:  # hashes are then folded with Python integers
+            numpy = None
+        _NUMPY.append(numpy)
+    return _NUMPY[0]
+
+
+def _fold_python(data):
+    """ XOR together the bytes of `data` lying at a same offset modulo 160
+
+    @return: the 160 resulting bytes
+    @rtype: bytearray
+    """
+    length = len(data)
+    folded = 0
+    # XOR large blocks as integers, then the 160 bytes slices of the result
+    # and of the remaining bytes
+    full = length - length % _FOLD_BLOCK
+    for start in range(0, full, _FOLD_BLOCK):
+        folded ^= int(binascii.hexlify(data[start:start + _FOLD_BLOCK]), 16)
+    rest = data[full:]
+    if full:
+        rest = binascii.unhexlify('%0*x' % (_FOLD_BLOCK * 2, folded)) + rest
+        folded = 0
+    for start in range(0, len(rest), _WIDTH):
+        piece = rest[start:start + _WIDTH]
+        piece += b'\0' * (_WIDTH - len(piece))
+        folded ^= int(binascii.hexlify(piece), 16)
+    return bytearray(binascii.unhexlify('%0*x' % (_WIDTH * 2, folded)))
+
+
+def _fold_numpy(data):
+    """ Vectorized `_fold_python`
+
+    """
+    numpy = _load_numpy()
+    full = len(data) - len(data) % _WIDTH
+    folded = numpy.zeros(_WIDTH_BYTES, dtype=numpy.uint64)
+    if full:
+        words = numpy.frombuffer(data, dtype=numpy.uint64,
+                                 count=full // 8).reshape(-1, _WIDTH_BYTES)
+        folded = numpy.bitwise_xor.reduce(words, axis=0)
+    folded = bytearray(folded.tobytes())
+    for index, byte in enumerate(bytearray(data[full:])):
+        folded[index] ^= byte
+    return folded
+
+
+class QuickXorHash(object):
+    """ OneDrive's QuickXorHash, with a `hashlib` like interface
+
+    Each byte is XORed into a 160 bits register, shifted by 11 bits more than
+    the previous one. Bytes 160 positions apart are shifted the same way, so
+    data is first folded into 160 bytes (with NumPy when installed) before
+    being shifted into the register.
+    """
+    name = 'quickxorhash'
+    digest_size = _WIDTH_BYTES
+
+    def __init__(self, data=None):
+        self.length = 0
+        self._folded = bytearray(_WIDTH)
+        if data is not None:
+            self.update(data)
+
+    def update(self, data):
+        """ Hash more bytes
+
+        @param data: bytes or any buffer, such as an `mmap` slice
+        """
+        if not len(data):
+            return
+        fold = _fold_numpy if _load_numpy() is not None else _fold_python
+        offset = self.length % _WIDTH
+        for index, byte in enumerate(fold(data)):
+            if byte:
+                self._folded[(offset + index) % _WIDTH] ^= byte
+        self.length += len(data)
+
+    def digest(self):
+        """ The hash of the bytes so far
+
+        @return: 20 bytes
+        """
+        register = 0
+        for index, byte in enumerate(self._folded):
+            if byte:
+                shift = index * _SHIFT % _WIDTH
+                register ^= ((byte << shift) | (byte >> (_WIDTH - shift))) \
+                    & _MASK
+        register ^= self.length << (_WIDTH - 64)
+        return binascii.unhexlify('%0*x' % (_WIDTH_BYTES * 2, register))[::-1]
+
+    def b64digest(self):
+        """ The hash of the bytes so far, as found in items' metadata
+
+        @return: the base64 encoded digest
+        """
+        return base64.b64encode(self.digest()).decode('ascii')
+
+
+class _CRC32(object):
+    def __init__(self):
+        self.value = 0
+
+    def update(self, data):
+        self.value = zlib.crc32(data, self.value)
+
+    def hexdigest(self):
+        # OneDrive reports it as the hex of its little endian bytes
+        return binascii.hexlify(
+            struct.pack('<I', self.value & 0xffffffff)).decode('ascii')
+
+
+def _hasher(name):
+    if name == SHA1_HASH:
+        return hashlib.sha1()
+    if name == QUICK_XOR_HASH:
+        return QuickXorHash()
+    if name == CRC32_HASH:
+        return _CRC32()
+    raise ValueError('Unknown hash {0!r}'.format(name))
+
+
+def _encode(name, hasher):
+    if name == QUICK_XOR_HASH:
+        return hasher.b64digest()
+    return hasher.hexdigest().upper()
+
+
+def hash_file(path, names=HASHES, chunk_size=CHUNK_SIZE):
+    """ Hash a local file in a single pass
+
+    The file is memory mapped and hashed by blocks, so it is read at disk
+    speed without being held in memory.
+
+    @param path: the file's path
+    @param names: the hashes to compute, among `HASHES`
+    @param chunk_size: size of the blocks hashed at once
+    @return: dict mapping the names to the hashes, formatted as in items'
+    `file.hashes`
+    """
+    hashers = [(name, _hasher(name)) for name in names]
+    with open(path, 'rb') as source:
+        size = os.fstat(source.fileno()).st_size
+        if size:
+            mapped = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                for start in range(0, size, chunk_size):
+                    block = mapped[start:start + chunk_size]
+                    for _, hasher in hashers:
+                        hasher.update(block)
+            finally:
+                mapped.close()
+    return dict((name, _encode(name, hasher)) for name, hasher in hashers)
+
+
+def remote_hashes(item):
+    """ Read the hashes of an item's content
+
+    @param item: the item's v1.0 representation, or a `DriveItem`
+    @return: dict mapping the available hashes' names to their values
+    """
+    if isinstance(item, dict):
+        hashes = (item.get('file') or {}).get('hashes') or {}
+    else:
+        hashes = {SHA1_HASH: item.sha1, QUICK_XOR_HASH: item.quick_xor,
+                  CRC32_HASH: item.crc32}
+    return dict((name, hashes[name]) for name in HASHES if hashes.get(name))
+
+
+def is_unchanged(path, item):
+    """ Tell whether a local file holds an item's content
+
+    Sizes are compared first, then the strongest hash provided by the item.
+
+    @param path: the local file's path
+    @param item: the item's v1.0 representation, or a `DriveItem`
+    @return: `False` as well when the file does not exist or the item has no
+    hash to compare with
+    @rtype: bool
+    """
+    size = item.get('size') if isinstance(item, dict) else item.size
+    if not os.path.isfile(path) or \
+            size is not None and os.path.getsize(path) != size:
+        return False
+    hashes = remote_hashes(item)
+    if not hashes:
+        return False
+    name = next(name for name in HASHES if name in hashes)
+    local = hash_file(path, (name,))[name]
+    if name == QUICK_XOR_HASH:
+        return local == hashes[name]
+    return local.lower() == hashes[name].lower()
@@ -0,0 +1,148 @@
+""" Compact typed representation of drive items
+
+"""
+
+import json
+
+from walker import has_facet
+
+# facets exposed as attributes, in the order of their bit in the facets mask
+FACETS = ('file', 'folder', 'image', 'photo', 'audio', 'video', 'location',
+          'deleted', 'package', 'root')
+_FACET_BITS = dict((facet, 1 << index) for index, facet in enumerate(FACETS))
+
+
+class DriveItem(object):
+    """ Memory efficient, read-only view of an item's representation
+
+    Only the commonly used fields are kept, as slots. Facets are kept as a
+    compact JSON string decoded on first access, a bit mask telling which ones
+    the item exposes so `has_facet` never decodes them. Both v1.0 and v5.0
+    representations are supported, v5.0 item types being mapped to facets.
+    """
+
+    __slots__ = ('id', 'parent_id', 'name', 'size', 'created', 'modified',
+                 'etag', 'sha1', 'crc32', 'quick_xor', '_mask', '_facets',
+                 '_decoded')
+
+    def __init__(self, item_id, parent_id=None, name=None, size=None,
+                 created=None, modified=None, etag=None, sha1=None,
+                 crc32=None, quick_xor=None, facets=None):
+        """
+        @param item_id: the item's ID
+        @param parent_id: the parent folder's ID
+        @param name: the item's name
+        @param size: the item's size in bytes
+        @param created: creation time, as provided by the API
+        @param modified: last modification time, as provided by the API
+        @param etag: the item's ETag
+        @param sha1: SHA1 hash of a file's content
+        @param crc32: CRC32 hash of a file's content
+        @param quick_xor: QuickXorHash of a file's content
+        @param facets: dict of the item's facets
+        """
+        self.id = item_id
+        self.parent_id = parent_id
+        self.name = name
+        self.size = size
+        self.created = created
+        self.modified = modified
+        self.etag = etag
+        self.sha1 = sha1
+        self.crc32 = crc32
+        self.quick_xor = quick_xor
+        self._mask = 0
+        self._facets = None
+        self._decoded = None
+        if facets:
+            for facet in facets:
+                self._mask |= _FACET_BITS.get(facet, 0)
+            self._facets = json.dumps(facets, separators=(',', ':'),
+                                      sort_keys=True)
+
+    @classmethod
+    def from_json(cls, item):
+        """ Build an item from its decoded API representation
+
+        @param item: v1.0 or v5.0 item's representation
+        @rtype: DriveItem
+        """
+        facets = dict((facet, item[facet]) for facet in FACETS
+                      if facet in item)
+        if 'type' in item:
+            for facet in FACETS:
+                if facet not in facets and has_facet(item, facet):
+                    facets[facet] = {}
+        hashes = (item.get('file') or {}).get('hashes') or {}
+        return cls(
+            item['id'],
+            parent_id=(item.get('parentReference') or {}).get('id') or
+            item.get('parent_id'),
+            name=item.get('name'),
+            size=item.get('size'),
+            created=item.get('createdDateTime') or item.get('created_time'),
+            modified=item.get('lastModifiedDateTime') or
+            item.get('updated_time'),
+            etag=item.get('eTag'),
+            sha1=hashes.get('sha1Hash'),
+            crc32=hashes.get('crc32Hash'),
+            quick_xor=hashes.get('quickXorHash'),
+            facets=facets)
+
+    def has_facet(self, facet):
+        """ Tell whether the item exposes the given facet
+
+        @param facet: one of the `OneDrive.*_FACET` values
+        @rtype: bool
+        """
+        return bool(self._mask & _FACET_BITS.get(facet, 0))
+
+    @property
+    def is_folder(self):
+        """ Whether the item can be listed
+
+        """
+        return self.has_facet('folder')
+
+    def facet(self, facet):
+        """ Read one of the item's facets
+
+        @param facet: one of the `OneDrive.*_FACET` values
+        @return: the facet's content, `None` if the item does not expose it
+        @rtype: dict
+        """
+        if not self.has_facet(facet):
+            return None
+        if self._decoded is None:
+            self._decoded = json.loads(self._facets)
+        return self._decoded[facet]
+
+    def __eq__(self, other):
+        return isinstance(other, DriveItem) and \
+            all(getattr(self, name) == getattr(other, name)
+                for name in self.__slots__[:-1])
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '<DriveItem {0!r} {1!r}>'.format(self.id, self.name)
+
+
+def _facet_property(facet):
+    return property(lambda self: self.facet(facet),
+                    doc="The '{0}' facet, `None` if not exposed".format(facet))
+
+for _facet in FACETS:
+    setattr(DriveItem, _facet, _facet_property(_facet))
+del _facet
+
+
+def typed_items(items):
+    """ Convert the items of an iterator to `DriveItem` objects
+
+    @param items: iterator of items' representations
+    @return: A generator of `DriveItem`
+    """
+    for item in items:
+        yield DriveItem.from_json(item)
@@ -0,0 +1,83 @@
+""" Deferred imports, keeping the package cheap to import
+
+"""
+
+import importlib
+import sys
+from types import ModuleType
+
+
+class LazyModule(ModuleType):
+    """ Stand-in for a module, imported upon first attribute access
+
+    A module level ``requests = LazyModule('requests')`` reads like the
+    regular import and can be patched the same way, but only loads requests
+    when one of its attributes is used.
+    """
+
+    def __init__(self, name):
+        """
+        @param name: the module's absolute name
+        """
+        ModuleType.__init__(self, name)
+        self.__dict__['_module'] = None
+
+    def __getattr__(self, attribute):
+        module = self._module
+        if module is None:
+            module = self.__dict__['_module'] = \
+                importlib.import_module(self.__name__)
+        return getattr(module, attribute)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return '<lazy module {0!r} ({1})>'.format(self.__name__, state)
+
+
+class LazyPackage(ModuleType):
+    """ A package whose public names are imported upon first access
+
+    It replaces the package's module in `sys.modules`, see `install`.
+    """
+
+    def __init__(self, module, exports):
+        """
+        @param module: the package's original module
+        @param exports: dict mapping each public name to the package's
+        sub-module defining it
+        """
+        ModuleType.__init__(self, module.__name__, module.__doc__)
+        self.__dict__.update(module.__dict__)
+        # Python 2 clears the globals of modules which are garbage collected
+        self.__dict__['_original'] = module
+        self.__dict__['_exports'] = dict(exports)
+        self.__dict__['__all__'] = sorted(
+            set(exports) | set(getattr(module, '__all__', ())))
+
+    def __getattr__(self, name):
+        try:
+            module_name = self._exports[name]
+        except KeyError:
+            raise AttributeError('module {0!r} has no attribute {1!r}'
+                                 .format(self.__name__, name))
+        module = importlib.import_module('.' + module_name, self.__name__)
+        value = getattr(module, name)
+        setattr(self, name, value)
+        return value
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(self._exports))
+
+    @classmethod
+    def install(cls, name, exports):
+        """ Replace a package's module with a lazy one
+
+        To be called at the end of the package's `__init__` module.
+
+        @param name: the package's name, i.e. its `__name__`
+        @param exports: dict mapping each public name to its sub-module
+        @rtype: LazyPackage
+        """
+        package = cls(sys.modules[name], exports)
+        sys.modules[name] = package
+        return package
@@ -1,7 +1,7 @@
 """ Convenience wrapper to handle Oauth authentication
 
 """
-import requests
+from transport import Transport
 
 
 class LiveAuth(object):
@@ -12,11 +12,13 @@ class LiveAuth(object):
     _authorize_uri = 'oauth20_authorize.srf'
     _token_url = 'oauth20_token.srf'
 
-    def __init__(self, client_id, client_secret, scope, redirect_uri):
+    def __init__(self, client_id, client_secret, scope, redirect_uri,
+                 transport=None):
         self._client_id = client_id
         self._client_secret = client_secret
         self._scope = scope
         self._redirect_uri = redirect_uri
+        self._transport = transport or Transport()
 
     def generate_oauth_initiation_url(self, response_type):
         """ generate the oauth dialog initiation url
@@ -56,6 +58,6 @@ class LiveAuth(object):
             'grant_type': 'authorization_code',
             'code': code
         }
-        return requests.post('{base}{token}'.format(
+        return self._transport.post('{base}{token}'.format(
             base=self._base_url, token=self._token_url),
-                             data=post_data)
\ No newline at end of file
+                                    data=post_data)
\ No newline at end of file
@@ -0,0 +1,259 @@
+""" Request instrumentation: endpoint naming and in-process metrics
+
+"""
+
+import bisect
+import re
+import threading
+
+try:
+    from urlparse import urlparse
+except ImportError:  # Python 3
+    from urllib.parse import urlparse
+
+# latency buckets upper bounds, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0)
+
+# v5.0 IDs, e.g. 'folder.1a2b.1A2B!103', and v1.0 ones, e.g. '1A2B!103'
+_ID_SEGMENT = re.compile(
+    r'^(folder|file|photo|video|audio|album|notebook|comment|tag)\.|'
+    r'^[0-9A-Fa-f]+!\d+$')
+# opaque tokens, e.g. in upload session URLs '/rup/1a2b3c4d5e6f7a8b/eyJ...'
+_OPAQUE_SEGMENT = re.compile(r'^(?=.*\d)[\w-]{16,}$')
+# path based addressing, e.g. 'root:/Documents/file.txt:'
+_ITEM_PATH = re.compile(r':/.*?:(?=/|$)')
+
+
+def endpoint_of(url):
+    """ Name the endpoint of a URL, independently of the addressed items
+
+    @param url: the request's URL
+    @return: the URL's path, IDs, opaque tokens and item paths replaced with
+    placeholders, e.g. '/v5.0/{id}/files'
+    """
+    path = _ITEM_PATH.sub(':{path}:', urlparse(url).path)
+    segments = path.split('/')
+    for index in range(1, len(segments)):
+        if segments[index - 1] in ('items', 'drives') or \
+                _ID_SEGMENT.match(segments[index]) or \
+                _OPAQUE_SEGMENT.match(segments[index]):
+            segments[index] = '{id}'
+    return '/'.join(segments)
+
+
+class Histogram(object):
+    """ Thread-unsafe latency histogram with fixed buckets
+
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        """ Record a value
+
+        @param value: the latency in seconds
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        """ Estimate a percentile from the buckets
+
+        @param percent: the percentile, between 0 and 100
+        @return: upper bound of the bucket holding the percentile, the maximum
+        value for the last bucket, `None` if nothing was recorded
+        """
+        if not self.count:
+            return None
+        rank = percent / 100.0 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                if index < len(self.buckets):
+                    return min(self.buckets[index], self.max)
+                return self.max
+        return self.max
+
+    def snapshot(self):
+        """ Export the histogram
+
+        @return: cumulative counts by bucket upper bound ('+Inf' for the last
+        one), along with the count, sum, min, max and estimated median, 95th
+        and 99th percentiles
+        @rtype: dict
+        """
+        cumulative = []
+        seen = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            seen += count
+            cumulative.append((bound, seen))
+        return {
+            'buckets': cumulative,
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99)
+        }
+
+
+class EndpointMetrics(object):
+    """ Counters of an endpoint
+
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.latency = Histogram(buckets)
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.statuses = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.bytes_decoded = 0
+
+    def snapshot(self):
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'retries': self.retries,
+            'statuses': dict(self.statuses),
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'bytes_decoded': self.bytes_decoded,
+            'latency': self.latency.snapshot()
+        }
+
+
+class MetricsCollector(object):
+    """ Aggregate the events of one or several clients
+
+    Requests are grouped by method and endpoint (see `endpoint_of`), each
+    group counting requests, errors (connection errors and 4xx or 5xx
+    statuses), retries, statuses and bytes (sent, received and received once
+    decompressed), and recording latencies in a histogram. Token refreshes
+    and fetched pages are counted globally.
+
+    ``` python
+    metrics = MetricsCollector()
+    client = OneDrive(token, refresh_token, client_id, client_secret,
+                      hooks=metrics.hooks())
+    ```
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        @param buckets: latency histograms buckets upper bounds, in seconds
+        """
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """ Reset every counter
+
+        """
+        with self._lock:
+            self.endpoints = {}
+            self.token_refreshes = 0
+            self.pages = 0
+            self.items = 0
+
+    def hooks(self):
+        """ Hooks feeding this collector, to give to `OneDrive`
+
+        @rtype: dict
+        """
+        return {
+            'response': [self.on_response],
+            'token_refresh': [self.on_token_refresh],
+            'page': [self.on_page]
+        }
+
+    def on_response(self, info):
+        """ Record a request's outcome
+
+        @param info: the 'response' event
+        """
+        key = (info['method'].upper(), info['endpoint'])
+        status = info['status']
+        with self._lock:
+            metrics = self.endpoints.get(key)
+            if metrics is None:
+                metrics = self.endpoints[key] = EndpointMetrics(self.buckets)
+            metrics.requests += 1
+            if info['attempt'] > 1:
+                metrics.retries += 1
+            if status is None or status >= 400:
+                metrics.errors += 1
+            if status is not None:
+                metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+            metrics.bytes_sent += info['bytes_sent'] or 0
+            metrics.bytes_received += info['bytes_received'] or 0
+            metrics.bytes_decoded += info.get('bytes_decoded') or 0
+            metrics.latency.observe(info['elapsed'])
+
+    def on_token_refresh(self, info):
+        """ Count a token refresh
+
+        @param info: the 'token_refresh' event
+        """
+        with self._lock:
+            self.token_refreshes += 1
+
+    def on_page(self, info):
+        """ Count a page fetched by a generator
+
+        @param info: the 'page' event
+        """
+        with self._lock:
+            self.pages += 1
+            self.items += info['items'] or 0
+
+    def snapshot(self):
+        """ Export the metrics, e.g. to a monitoring system
+
+        @return: the global counters and, in the 'endpoints' key, the
+        counters of each endpoint keyed by 'METHOD endpoint'
+        @rtype: dict
+        """
+        with self._lock:
+            return {
+                'token_refreshes': self.token_refreshes,
+                'pages': self.pages,
+                'items': self.items,
+                'endpoints': dict(
+                    ('{0} {1}'.format(method, endpoint), metrics.snapshot())
+                    for (method, endpoint), metrics in
+                    self.endpoints.items())
+            }
+
+    def slowest(self, count=5, percent=95):
+        """ List the slowest endpoints
+
+        @param count: number of endpoints to list
+        @param percent: latency percentile to rank endpoints by
+        @return: list of ('METHOD endpoint', latency) tuples, slowest first
+        """
+        with self._lock:
+            latencies = [('{0} {1}'.format(method, endpoint),
+                          metrics.latency.percentile(percent))
+                         for (method, endpoint), metrics in
+                         self.endpoints.items()]
+        latencies.sort(key=lambda entry: entry[1], reverse=True)
+        return latencies[:count]
@@ -0,0 +1,321 @@
+""" One-way mirroring of a drive to a local directory
+
+"""
+
+import logging
+import os
+import shutil
+import sys
+from multiprocessing.pool import ThreadPool
+
+from concurrency import BackgroundIterator
+from delta_sync import REQUIRED_FIELDS, DeltaSyncStore
+from hashing import is_unchanged
+from projection import with_required
+
+LOGGER = logging.getLogger(__name__)
+
+# name of the index kept in the mirrored directory by default
+INDEX_NAME = '.pyonedrive-index'
+# suffix of the files being downloaded
+PART_SUFFIX = '.pyonedrive-part'
+
+# properties the mirror relies on, besides the index's ones
+MIRROR_FIELDS = REQUIRED_FIELDS + ('file', 'cTag', 'eTag')
+
+
+def _replace(source, destination):
+    """ Move a file over another one, atomically where supported
+
+    """
+    if os.name == 'nt' and os.path.exists(destination):
+        os.remove(destination)
+    os.rename(source, destination)
+
+
+def _remove(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+
+class Mirror(object):
+    """ Keep a local directory tree identical to a drive
+
+    Each page of the change feed is applied locally, then recorded along with
+    its change token in a `DeltaSyncStore` index, so an interrupted sync
+    resumes from the first page not fully applied and incremental syncs only
+    touch what changed:
+
+    - moved or renamed items are renamed locally, deleted ones removed
+    - new or changed files are downloaded concurrently to temporary files
+      renamed once complete, a local file is never partial. Files whose local
+      copy already matches their metadata's hash are not downloaded again.
+
+    Files which could not be downloaded are recorded in the index with their
+    page, and downloaded again at the start of the next sync.
+
+    Changes made to the local directory are not sent to the drive, and the
+    local copy of a changed file is overwritten.
+    """
+
+    def __init__(self, client, drive, directory, index=None, max_in_flight=4,
+                 segment_size=None, prefetch=1, on_error=None, fields=None):
+        """
+        @param client: the `OneDrive` client to fetch changes and files with
+        @param drive: drive identifier or dict providing it in the 'id' key
+        @param directory: the local directory mirroring the drive's root
+        @param index: path of the SQLite index holding the drive's items and
+        the change token, '<directory>/.pyonedrive-index' by default
+        @param max_in_flight: number of files downloaded concurrently
+        @param segment_size: size of the ranges large files are downloaded
+        as, see `download_item_to`
+        @param prefetch: number of pages of changes fetched in advance
+        @param on_error: function called with the item and the exception when
+        a file cannot be downloaded, the sync then goes on without it and the
+        next sync tries it again. If not provided the sync stops at the page
+        holding the file, and the exception is raised.
+        @param fields: if provided, only these item properties, plus the ones
+        the mirror relies on, are fetched and indexed
+        """
+        if isinstance(directory, bytes):  # Python 2 native strings
+            directory = directory.decode(sys.getfilesystemencoding() or
+                                         'utf-8')
+        self.client = client
+        self.drive = drive
+        self.directory = directory
+        self.index = index or os.path.join(directory, INDEX_NAME)
+        self.max_in_flight = max_in_flight
+        self.segment_size = segment_size
+        self.prefetch = prefetch
+        self.on_error = on_error
+        self.fields = fields
+        self.stats = {}
+
+    def local_path(self, path):
+        """ Map a drive path to the local file system
+
+        @param path: the item's path in the drive, e.g. '/Documents/a.txt'
+        @return: the local path
+        """
+        return os.path.join(self.directory, *path.strip('/').split('/'))
+
+    def sync(self):
+        """ Apply the changes since the last sync to the local directory
+
+        @raises: `requests.exception.HTTPError` upon error, pages applied so
+        far are kept
+        @return: counters of 'downloaded', 'skipped' (unchanged), 'moved',
+        'deleted' and 'failed' items, and of 'bytes' downloaded
+        @rtype: dict
+        """
+        self.stats = dict((name, 0) for name in ('downloaded', 'skipped',
+                                                 'moved', 'deleted', 'failed',
+                                                 'bytes'))
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        with DeltaSyncStore(self.index) as store:
+            if store.failed:
+                self.__retry(store)
+            pages = BackgroundIterator(
+                self.client.get_view_changes_page_generator(
+                    self.drive, store.change_token,
+                    fields=with_required(self.fields, MIRROR_FIELDS)),
+                maxsize=self.prefetch)
+            try:
+                for page in pages:
+                    failed = []
+                    if '@changes.resync' not in page:
+                        failed = self.__apply(store, page.get('value', []))
+                    store.apply_page(page, failed=failed)
+            finally:
+                pages.close()
+            # the store remembers resyncs until the enumeration completes,
+            # even across interrupted syncs
+            if store.resynced:
+                self.__prune(store)
+                store.acknowledge_resync()
+        return self.stats
+
+    def __retry(self, store):
+        """ Download the files previous syncs failed to
+
+        """
+        downloads = []
+        for item_id in store.failed:
+            item = store.get(item_id)
+            path = store.path(item_id) if item else None
+            if path is None or 'file' not in item:
+                continue
+            local = self.local_path(path)
+            if self.__is_current(local, item, None):
+                self.stats['skipped'] += 1
+            else:
+                downloads.append((item, local))
+        failed = set(self.__download(downloads))
+        store.resolve_failed(item_id for item_id in store.failed
+                             if item_id not in failed)
+
+    def __apply(self, store, items):
+        """ Apply a page of changes to the local directory
+
+        @return: IDs of the files which could not be downloaded
+        """
+        overlay = {}
+        for item in items:
+            if 'deleted' in item:
+                overlay[item['id']] = None
+            else:
+                overlay[item['id']] = (
+                    (item.get('parentReference') or {}).get('id'),
+                    item.get('name'))
+        changes = []
+        for item in items:
+            old_path = store.path(item['id'])
+            new_path = None if 'deleted' in item else \
+                store.path(item['id'], overlay)
+            if old_path == '/' or new_path == '/':
+                continue
+            changes.append((item, old_path, new_path))
+
+        # parents are moved before their children, whose paths follow them
+        renames = []
+        moves = sorted(
+            (change for change in changes
+             if change[1] is not None and change[2] is not None and
+             change[1] != change[2]),
+            key=lambda change: change[1].count('/'))
+        for item, old_path, new_path in moves:
+            current = self.__follow(renames, old_path)
+            if current == new_path:
+                continue
+            source = self.local_path(current)
+            if not os.path.lexists(source):
+                continue
+            destination = self.local_path(new_path)
+            parent = os.path.dirname(destination)
+            if not os.path.isdir(parent):
+                os.makedirs(parent)
+            if os.path.lexists(destination):
+                _remove(destination)
+            os.rename(source, destination)
+            renames.append((current, new_path))
+            self.stats['moved'] += 1
+
+        for item, old_path, new_path in changes:
+            if new_path is None and old_path is not None:
+                local = self.local_path(self.__follow(renames, old_path))
+                if os.path.lexists(local):
+                    _remove(local)
+                    self.stats['deleted'] += 1
+
+        downloads = []
+        for item, old_path, new_path in changes:
+            if new_path is None:
+                if 'deleted' not in item:
+                    LOGGER.warning("Cannot resolve the path of %s",
+                                   item['id'])
+                continue
+            local = self.local_path(new_path)
+            if 'folder' in item:
+                if os.path.lexists(local) and not os.path.isdir(local):
+                    os.remove(local)
+                if not os.path.isdir(local):
+                    os.makedirs(local)
+            elif 'file' in item:
+                previous = store.get(item['id']) if old_path else None
+                if self.__is_current(local, item, previous):
+                    self.stats['skipped'] += 1
+                else:
+                    downloads.append((item, local))
+        return self.__download(downloads)
+
+    @staticmethod
+    def __follow(renames, path):
+        """ Current location of a path once the given renames are done
+
+        """
+        for source, destination in renames:
+            if path == source or path.startswith(source + '/'):
+                path = destination + path[len(source):]
+        return path
+
+    @staticmethod
+    def __is_current(local, item, previous):
+        """ Tell whether a local file already holds an item's content
+
+        """
+        if not os.path.isfile(local):
+            return False
+        if is_unchanged(local, item):
+            return True
+        # without hashes, rely on the content's tag
+        return previous is not None and \
+            not (item.get('file') or {}).get('hashes') and \
+            item.get('cTag') is not None and \
+            previous.get('cTag') == item.get('cTag') and \
+            os.path.getsize(local) == item.get('size')
+
+    def __download(self, downloads):
+        """ Download files concurrently, each to a temporary file
+
+        @return: IDs of the files which could not be downloaded
+        """
+        failed = []
+        if not downloads:
+            return failed
+        pool = ThreadPool(max(1, min(self.max_in_flight, len(downloads))))
+        try:
+            for item, transferred, error in pool.imap_unordered(
+                    self.__download_one, downloads):
+                if error is None:
+                    self.stats['downloaded'] += 1
+                    self.stats['bytes'] += transferred
+                    continue
+                self.stats['failed'] += 1
+                if self.on_error is None:
+                    raise error
+                self.on_error(item, error)
+                failed.append(item['id'])
+        finally:
+            pool.terminate()
+        return failed
+
+    def __download_one(self, download):
+        item, local = download
+        directory, name = os.path.split(local)
+        temp_path = os.path.join(directory, '.' + name + PART_SUFFIX)
+        try:
+            if os.path.isdir(local):
+                shutil.rmtree(local)
+            # change feed IDs are v1.0 ones
+            transferred = self.client.download_item_to(
+                item['id'], temp_path, size=item.get('size'),
+                etag=item.get('eTag'), segment_size=self.segment_size,
+                max_in_flight=1, resume=False)
+            _replace(temp_path, local)
+        except Exception as exc:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            LOGGER.error("Downloading %s failed: %s", item['id'], exc)
+            return item, 0, exc
+        return item, transferred, None
+
+    def __prune(self, store):
+        """ Remove the local files and folders the drive no longer holds
+
+        Called after a full enumeration, which does not report the items
+        deleted since the last sync.
+        """
+        expected = set(self.local_path(path)
+                       for path in store.paths().values())
+        for root, folders, files in os.walk(self.directory, topdown=False):
+            for name in files + folders:
+                path = os.path.join(root, name)
+                if root == self.directory and name.startswith(INDEX_NAME):
+                    continue
+                if path not in expected:
+                    LOGGER.info("Removing %s, no longer in the drive", path)
+                    _remove(path)
+                    self.stats['deleted'] += 1
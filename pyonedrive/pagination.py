@@ -0,0 +1,154 @@
+""" Paging engine shared by the listing generators
+
+"""
+
+from multiprocessing.pool import ThreadPool
+
+from concurrency import BackgroundIterator
+
+try:
+    import Queue as queue
+except ImportError:  # Python 3
+    import queue
+
+
+class Paginator(object):
+    """ Iterate over the items of a paginated v5.0 resource
+
+    Pages are either fetched one after the other following the `paging.next`
+    links, optionally read ahead in background, or, when the resource's size
+    is known, as concurrent `offset` windows.
+    """
+
+    def __init__(self, fetch, path, params, count=20, prefetch=0,
+                 max_in_flight=1, ordered=True, total=None, stream=False):
+        """
+        @param fetch: function called with a path and a params dict,
+        returning the decoded page. It must raise upon error.
+        @param path: resource endpoint
+        @param params: request's parameters, without `limit` nor `offset`
+        @param count: number of items per page
+        @param prefetch: number of pages read in advance when pages are
+        fetched sequentially
+        @param max_in_flight: number of pages fetched concurrently, when
+        greater than 1 and the total is known windows are fetched in parallel
+        @param ordered: whether concurrently fetched pages must be yielded in
+        order, otherwise they are yielded as they arrive
+        @param total: number of items of the resource, or a function returning
+        it (or `None` if unknown), only called when fetching concurrently
+        @param stream: whether `fetch` returns `StreamedPage` objects, decoded
+        while iterated. Pages are then fetched sequentially, `prefetch` and
+        `max_in_flight` are ignored.
+        """
+        self.fetch = fetch
+        self.path = path
+        self.params = params
+        self.count = count
+        self.prefetch = prefetch
+        self.max_in_flight = max_in_flight
+        self.ordered = ordered
+        self.total = total
+        self.stream = stream
+
+    def __iter__(self):
+        pages = self.pages()
+        try:
+            for page in pages:
+                for content in page['data']:
+                    yield content
+        finally:
+            pages.close()
+
+    def pages(self):
+        """ Create an iterator over the resource's pages
+
+        @return: an iterator of decoded pages
+        """
+        if self.stream:
+            return self.__follow_next()
+        if self.max_in_flight > 1:
+            total = self.total() if callable(self.total) else self.total
+            if total is not None:
+                return self.__windows(total)
+        pages = self.__follow_next()
+        if self.prefetch:
+            pages = BackgroundIterator(pages, maxsize=self.prefetch)
+        return pages
+
+    def __window_params(self, offset):
+        params = dict(self.params)
+        params['limit'] = self.count
+        params['offset'] = offset
+        return params
+
+    def __follow_next(self):
+        params = dict(self.params)
+        params['limit'] = self.count
+        resp = self.fetch(self.path, params)
+
+        while True:
+            try:
+                yield resp
+                paging = resp['paging']
+            finally:
+                if self.stream:
+                    resp.close()
+            if not 'next' in paging:
+                break
+            resp = self.fetch(paging['next'], params)
+
+    def __windows(self, total):
+        """ Fetch `offset` windows concurrently
+
+        Windows are requested up to the announced total, then one after the
+        other as long as the last one comes back full, in case the resource
+        grew since its size was read.
+        """
+        pool = ThreadPool(self.max_in_flight)
+        results = queue.Queue()
+        received = {}
+        state = {'expected': 0, 'outstanding': 0}
+
+        def fetch_window(offset):
+            try:
+                page = self.fetch(self.path, self.__window_params(offset))
+                results.put((offset, page, None))
+            except Exception as exc:
+                results.put((offset, None, exc))
+
+        def next_page():
+            while True:
+                if self.ordered and state['expected'] in received:
+                    offset = state['expected']
+                    state['expected'] += self.count
+                    return offset, received.pop(offset)
+                if not self.ordered and received:
+                    return received.popitem()
+                offset, page, error = results.get()
+                if error is not None:
+                    raise error
+                received[offset] = page
+
+        limit = total
+        next_offset = 0
+        # nothing fetched yet: try at least one window
+        last_full = True
+        try:
+            while True:
+                while state['outstanding'] < self.max_in_flight and \
+                        next_offset < limit:
+                    pool.apply_async(fetch_window, (next_offset,))
+                    state['outstanding'] += 1
+                    next_offset += self.count
+                if not state['outstanding']:
+                    if not last_full:
+                        break
+                    limit = next_offset + self.count
+                    continue
+                offset, page = next_page()
+                state['outstanding'] -= 1
+                if offset == next_offset - self.count:
+                    last_full = len(page['data']) >= self.count
+                yield page
+        finally:
+            pool.terminate()
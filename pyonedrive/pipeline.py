@@ -0,0 +1,191 @@
+""" Concurrent processing of a drive's change feed
+
+"""
+
+import collections
+import logging
+import multiprocessing
+import threading
+
+from concurrency import BackgroundIterator
+
+try:
+    import Queue as queue
+except ImportError:  # Python 3
+    import queue
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ChangePipeline(object):
+    """ Dispatch the changes of a drive to concurrent workers
+
+    Pages of changes are fetched in background while their items are handled
+    by `max_workers` lanes. Changes of a same item always go to the same lane
+    and are thus handled in order. The change token is only advanced, and
+    `on_checkpoint` called, once every change of its page and of the previous
+    pages has been handled, so a token persisted from `on_checkpoint` is
+    always safe to resume from.
+
+    Handlers run in the lanes' threads, or in a pool of processes when
+    `processes` is set, the handler must then be picklable (e.g. a module
+    level function).
+    """
+
+    def __init__(self, client, drive, handler, change_token=None,
+                 max_workers=8, processes=False, prefetch=2, max_queued=100,
+                 on_checkpoint=None, on_error=None, on_resync=None,
+                 fields=None):
+        """
+        @param client: the `OneDrive` client to fetch changes with
+        @param drive: drive identifier or dict providing it in the 'id' key
+        @param handler: function called with each changed item
+        @param change_token: token to resume from, `None` for all changes
+        @param max_workers: number of lanes, i.e. of changes handled
+        concurrently
+        @param processes: whether to run the handler in a process pool
+        @param prefetch: number of pages fetched in advance
+        @param max_queued: maximum number of changes waiting in a lane
+        @param on_checkpoint: function called with each new safe change
+        token, in order and while holding the pipeline's lock
+        @param on_error: function called with the item and the exception when
+        the handler fails, the change then counts as handled. If not provided
+        the pipeline stops and the exception is raised by `run`
+        @param on_resync: function called when the server cannot provide a
+        delta, once the changes already dispatched are handled: every item is
+        then enumerated again
+        @param fields: if provided, only these item properties are fetched
+        """
+        self.client = client
+        self.drive = drive
+        self.handler = handler
+        self.change_token = change_token
+        self.max_workers = max_workers
+        self.processes = processes
+        self.prefetch = prefetch
+        self.max_queued = max_queued
+        self.on_checkpoint = on_checkpoint
+        self.on_error = on_error
+        self.on_resync = on_resync
+        self.fields = fields
+        self.handled = 0
+        self._pending = collections.OrderedDict()
+        self._condition = threading.Condition()
+        self._error = None
+        self._pool = None
+
+    def run(self):
+        """ Handle every change since `change_token`
+
+        @raises: the first exception raised by the handler (unless `on_error`
+        is provided) or while fetching changes
+        @return: the last safe change token
+        """
+        lanes = [queue.Queue(self.max_queued) for _ in range(self.max_workers)]
+        workers = [threading.Thread(target=self.__work, args=(lane,))
+                   for lane in lanes]
+        if self.processes:
+            self._pool = multiprocessing.Pool(self.max_workers)
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        pages = BackgroundIterator(
+            self.client.get_view_changes_page_generator(
+                self.drive, self.change_token, fields=self.fields),
+            maxsize=self.prefetch)
+        try:
+            for index, page in enumerate(pages):
+                if self._error is not None:
+                    break
+                if '@changes.resync' in page:
+                    self.__resync()
+                    continue
+                items = page.get('value', [])
+                with self._condition:
+                    self._pending[index] = [len(items),
+                                            page['@changes.token']]
+                    self.__advance()
+                for item in items:
+                    lane = lanes[hash(item.get('id')) % self.max_workers]
+                    lane.put((index, item))
+        finally:
+            pages.close()
+            for lane in lanes:
+                lane.put(None)
+            for worker in workers:
+                worker.join()
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+                self._pool = None
+        if self._error is not None:
+            raise self._error
+        return self.change_token
+
+    def __resync(self):
+        """ Wait for the dispatched changes, then notify of the resync
+
+        """
+        LOGGER.info("Change feed asks for a resync")
+        with self._condition:
+            while self._pending and self._error is None:
+                self._condition.wait(0.1)
+        if self._error is None and self.on_resync is not None:
+            self.on_resync()
+
+    def __work(self, lane):
+        while True:
+            entry = lane.get()
+            if entry is None:
+                return
+            index, item = entry
+            # once failed, drain the lane without handling nor checkpointing
+            if self._error is not None:
+                continue
+            try:
+                self.__handle(item)
+            except Exception as exc:
+                if self.on_error is None:
+                    LOGGER.error("Handling change of %s failed: %s",
+                                 item.get('id'), exc)
+                    with self._condition:
+                        if self._error is None:
+                            self._error = exc
+                        self._condition.notify_all()
+                    continue
+                try:
+                    self.on_error(item, exc)
+                except Exception as error:
+                    with self._condition:
+                        if self._error is None:
+                            self._error = error
+                        self._condition.notify_all()
+                    continue
+            with self._condition:
+                self.handled += 1
+                self._pending[index][0] -= 1
+                self.__advance()
+
+    def __handle(self, item):
+        if self._pool is not None:
+            self._pool.apply(self.handler, (item,))
+        else:
+            self.handler(item)
+
+    def __advance(self):
+        """ Checkpoint the leading pages whose changes are all handled
+
+        Must be called while holding the condition.
+        """
+        advanced = False
+        while self._pending:
+            index, (remaining, token) = next(iter(self._pending.items()))
+            if remaining:
+                break
+            del self._pending[index]
+            self.change_token = token
+            advanced = True
+            if self.on_checkpoint is not None:
+                self.on_checkpoint(token)
+        if advanced:
+            self._condition.notify_all()
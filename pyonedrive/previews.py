@@ -0,0 +1,103 @@
+""" Concurrent retrieval of item previews
+
+"""
+
+import collections
+import mimetypes
+import os
+from multiprocessing.pool import ThreadPool
+
+# size of the chunks written to disk
+CHUNK_SIZE = 64 * 1024
+
+
+def preview_path(directory, item_id, content_type):
+    """ Build the file name of an item's preview
+
+    @param directory: directory holding the previews
+    @param item_id: the previewed item's ID
+    @param content_type: the preview's media type
+    @return: the preview's path, e.g. '<directory>/<item_id>.jpg'
+    """
+    media_type = (content_type or '').split(';')[0].strip()
+    extension = {'image/jpeg': '.jpg'}.get(media_type) or \
+        mimetypes.guess_extension(media_type) or ''
+    return os.path.join(directory, item_id + extension)
+
+
+def save_preview(response, directory, item_id):
+    """ Write a streamed preview to disk
+
+    The preview is written to a temporary file renamed once complete, so a
+    preview file is never partial.
+
+    @return: the preview's path
+    """
+    path = preview_path(directory, item_id,
+                        response.headers.get('Content-Type'))
+    temp_path = path + '.part'
+    try:
+        with open(temp_path, 'wb') as preview:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                preview.write(chunk)
+        if os.name == 'nt' and os.path.exists(path):
+            os.remove(path)
+        os.rename(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    finally:
+        response.close()
+    return path
+
+
+def fetch_previews(fetch, item_ids, max_in_flight=8, directory=None,
+                   on_error=None):
+    """ Fetch the previews of several items concurrently
+
+    @param fetch: function called with an item's ID and whether to stream the
+    response, returning the preview's response
+    @param item_ids: IDs of the items to preview
+    @param max_in_flight: number of previews fetched concurrently
+    @param directory: if provided, previews are written to this directory
+    instead of being returned
+    @param on_error: function called with the item's ID and the exception
+    when a preview cannot be fetched, the other previews are then still
+    fetched. If not provided the first exception is raised.
+    @return: OrderedDict mapping the IDs, in order, to the previews'
+    responses, or paths if `directory` is provided. Failed previews are left
+    out.
+    """
+    def fetch_one(item_id):
+        try:
+            response = fetch(item_id, directory is not None)
+            try:
+                response.raise_for_status()
+            except Exception:
+                response.close()
+                raise
+            if directory is not None:
+                return item_id, save_preview(response, directory, item_id), \
+                    None
+            return item_id, response, None
+        except Exception as exc:
+            return item_id, None, exc
+
+    previews = collections.OrderedDict()
+    # each item is previewed once
+    item_ids = list(collections.OrderedDict.fromkeys(item_ids))
+    if not item_ids:
+        return previews
+    pool = ThreadPool(max(1, min(max_in_flight, len(item_ids))))
+    try:
+        for item_id, preview, error in pool.imap(fetch_one, item_ids):
+            if error is None:
+                previews[item_id] = preview
+            elif on_error is not None:
+                on_error(item_id, error)
+            else:
+                raise error
+    finally:
+        pool.terminate()
+    return previews
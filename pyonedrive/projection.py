@@ -0,0 +1,38 @@
+""" Field projection of item representations
+
+"""
+
+
+def with_required(fields, required):
+    """ Add the fields a feature relies on to a projection
+
+    @param fields: the requested fields, `None` for every field
+    @param required: fields needed by the feature
+    @return: the fields to select, `None` for every field
+    @rtype: tuple
+    """
+    if fields is None:
+        return None
+    fields = tuple(fields)
+    return fields + tuple(field for field in required if field not in fields)
+
+
+def select_param(fields):
+    """ Build the v1.0 `select` query parameter
+
+    @param fields: the top level properties to select
+    @return: the parameter's value, e.g. 'id,name,size'
+    """
+    return ','.join(fields)
+
+
+def project(item, fields):
+    """ Trim an item representation down to some fields
+
+    @param item: the item's decoded representation
+    @param fields: the top level properties to keep, `None` for all
+    @return: the trimmed representation, a new dict
+    """
+    if fields is None:
+        return item
+    return dict((field, item[field]) for field in fields if field in item)
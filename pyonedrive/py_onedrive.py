@@ -2,11 +2,40 @@
 
 """
 
+import json
 import logging
-import requests
+import os
+import sys
+import threading
+import time
+
+from coalesce import SingleFlight
+from compression import IDENTITY, transfer_sizes
+from lazy import LazyModule
+from projection import project, select_param, with_required
+from streaming import StreamedPage
+from transport import Transport
+
+# loaded upon first use, keeping the client cheap to import: these modules
+# load multiprocessing, sqlite3, hashlib, mimetypes, re or urllib
+batch = LazyModule('pyonedrive.batch')
+download = LazyModule('pyonedrive.download')
+drive_item = LazyModule('pyonedrive.item')
+hashing = LazyModule('pyonedrive.hashing')
+metrics = LazyModule('pyonedrive.metrics')
+mirror = LazyModule('pyonedrive.mirror')
+pagination = LazyModule('pyonedrive.pagination')
+pipeline = LazyModule('pyonedrive.pipeline')
+previews = LazyModule('pyonedrive.previews')
+upload = LazyModule('pyonedrive.upload')
+urllib = LazyModule('urllib' if sys.version_info[0] < 3 else 'urllib.parse')
+walker = LazyModule('pyonedrive.walker')
 
 LOGGER = logging.getLogger(__name__)
 
+# events emitted to hooks
+EVENTS = ('request', 'response', 'token_refresh', 'page')
+
 class OneDrive(object):
     """ OneDrive basic API providing helpers to ease query
 
@@ -21,13 +50,110 @@ class OneDrive(object):
     LOCATION_FACET = 'location'
     DELETED_FACET = 'deleted'
 
+    _api_url = 'https://apis.live.net/v5.0/'
+    _api_v1_url = 'https://api.onedrive.com/v1.0/'
+    _token_url = 'https://login.live.com/oauth20_token.srf'
+
     def __init__(self, token, refresh_token, client_id, client_secret,
-                 refresh_callback=None):
+                 refresh_callback=None, transport=None, cache=None,
+                 retry_policy=None, token_expires_at=None, refresh_margin=60,
+                 token_store=None, hooks=None, coalesce=False,
+                 link_cache=None):
+        """
+        @param token: OAuth access token
+        @param refresh_token: OAuth refresh token
+        @param client_id: application's client ID
+        @param client_secret: application's client secret
+        @param refresh_callback: function called with the new token and
+        refresh token each time they are refreshed
+        @param transport: `Transport` used to send every request, a new pooled
+        transport is created if not provided. It may be shared between clients.
+        @param cache: optional response cache for GET requests, such as an
+        `LRUCache`. Responses are cached regardless of the token, a cache must
+        not be shared between accounts
+        @param retry_policy: optional `RetryPolicy` retrying throttled (429,
+        503) and failed requests
+        @param token_expires_at: timestamp at which `token` expires, if known.
+        It is then refreshed before expiring instead of upon a 401 response
+        @param refresh_margin: number of seconds before expiry at which the
+        token is refreshed
+        @param token_store: optional token store, such as a `FileTokenStore`,
+        shared by every process using the account. Refreshes are then done
+        under its lock, and tokens already refreshed by another process are
+        reused instead of being refreshed again
+        @param hooks: dict mapping events to a function or a list of functions
+        called with a dict describing the event, see `add_hook`
+        @param coalesce: whether identical GET requests sent concurrently
+        (same URL, parameters and headers) share a single API call and
+        response. Their statistics are given by `single_flight.stats()`
+        @param link_cache: optional cache of the read only share links used
+        by `get_preview`, such as an `LRUCache` with a long `ttl`
+        """
         self.token = token
         self.refresh_token = refresh_token
         self.client_id = client_id
         self.client_secret = client_secret
         self.refresh_callback = refresh_callback
+        self.transport = transport or Transport()
+        self.cache = cache
+        self.retry_policy = retry_policy
+        self.token_expires_at = token_expires_at
+        self.refresh_margin = refresh_margin
+        self.token_store = token_store
+        self.single_flight = None
+        if coalesce:
+            self.single_flight = SingleFlight()
+        self.link_cache = link_cache
+        self._refresh_lock = threading.Lock()
+        self.hooks = dict((event, []) for event in EVENTS)
+        for event, event_hooks in (hooks or {}).items():
+            if callable(event_hooks):
+                event_hooks = [event_hooks]
+            for hook in event_hooks:
+                self.add_hook(event, hook)
+
+    def add_hook(self, event, hook):
+        """ Register a function called upon an event
+
+        Hooks are called synchronously, from the thread running the request,
+        with a dict holding the 'event' name and:
+
+        - 'request', before each try of a request: 'method', 'url',
+          'endpoint' (the URL's path without IDs, see `endpoint_of`) and
+          'attempt' (1 for the first try)
+        - 'response', after each try: the 'request' keys plus 'status' (`None`
+          upon connection error), 'error' (the raised exception, if any),
+          'elapsed' seconds until the response's headers were received,
+          'bytes_sent', 'bytes_received' as transferred, i.e. compressed, and
+          'bytes_decoded' once decompressed (each `None` when unknown, e.g.
+          the decoded size of compressed streamed responses)
+        - 'token_refresh': 'elapsed' seconds and 'source', 'login' or 'store'
+          when the token was refreshed by another process
+        - 'page', for each page fetched by a generator: its 'path' and number
+          of 'items' (`None` when decoded while streamed)
+
+        Exceptions raised by hooks are logged and ignored.
+
+        @param event: one of 'request', 'response', 'token_refresh', 'page'
+        @param hook: the function to call
+        """
+        if event not in self.hooks:
+            raise ValueError('Unknown event {0!r}'.format(event))
+        self.hooks[event].append(hook)
+
+    def __emit(self, event, info):
+        """ Call the hooks registered for an event
+
+        """
+        hooks = self.hooks[event]
+        if not hooks:
+            return
+        info = dict(info, event=event)
+        for hook in hooks:
+            try:
+                hook(info)
+            except Exception:
+                LOGGER.exception("%s hook failed", event)
 
     def __token_params(self, params):
         """ add an access_token to the params dict
@@ -41,63 +167,236 @@ class OneDrive(object):
             params = {'access_token': self.token}
         return params
 
-    def __bearer_headers(self):
+    def __bearer_headers(self, headers=None):
         """ Generate an authorization header for a request
 
+        @param headers: request's original headers, if any
+        @return: a new dict holding the original headers and the
+        authorization one
         """
-        return {'Authorization': 'Bearer {token}'.format(token=self.token)}
+        bearer_headers = dict(headers or {})
+        bearer_headers['Authorization'] = 'Bearer {token}'.format(
+            token=self.token)
+        return bearer_headers
 
-    def __request(self, method, path, params=None, data=None, stream=False, absolute=False):
+    def __request(self, method, path, params=None, data=None, stream=False,
+                  absolute=False, headers=None):
         """ Run a request on OneDrive APIs
 
         @param method: HTTP verb
         @param path: resource endpoint
         @param params: request's parameters
         @param absolute: wether the `path` parameter provides full URL or not.
+        @param headers: request's extra headers
         @rtype: requests.Response
         @return: API's response
         """
         if absolute:
             url = path
         else:
-            url = 'https://apis.live.net/v5.0/' + path
-        headers = None
+            url = self._api_url + path
+
+        if method != 'get' or stream:
+            return self.__authorized_request(method, url, params, data,
+                                             stream, headers)
+        if self.single_flight is not None:
+            key = (self.__request_key(url, params),
+                   tuple(sorted((headers or {}).items())))
+            return self.single_flight.do(
+                key, lambda: self.__get(url, params, headers))
+        return self.__get(url, params, headers)
+
+    def __get(self, url, params, headers):
+        if self.cache is not None:
+            return self.__cached_request(url, params, headers)
+        return self.__authorized_request('get', url, params, None, False,
+                                         headers)
+
+    @staticmethod
+    def __request_key(url, params):
+        """ Identify a GET request regardless of the access token
+
+        """
+        return (url, tuple(sorted((name, value) for name, value in
+                                  (params or {}).items()
+                                  if name != 'access_token')))
+
+    def __cached_request(self, url, params, headers):
+        """ Run a GET request through the cache
+
+        Fresh cached responses are returned as is, stale ones are revalidated
+        with their ETag.
+
+        @rtype: requests.Response
+        @return: API's response, possibly from the cache
+        """
+        key = self.__request_key(url, params)
+        entry = self.cache.get(key)
+        if entry is not None:
+            if self.cache.is_fresh(entry):
+                return entry.response
+            if entry.etag:
+                headers = dict(headers or {})
+                headers['If-None-Match'] = entry.etag
+        response = self.__authorized_request('get', url, params, None, False,
+                                             headers)
+        if response.status_code == 304 and entry is not None:
+            self.cache.refresh(key)
+            return entry.response
+        if response.status_code == 200:
+            self.cache.set(key, response)
+        return response
+
+    def __authorized_request(self, method, url, params, data, stream,
+                             headers):
+        """ Run an authenticated request, refreshing the token if needed
+
+        @rtype: requests.Response
+        @return: API's response
+        """
+        extra_headers = headers
 
-        if method is 'get' or 'delete':
+        if self.token_expires_at is not None and \
+                time.time() >= self.token_expires_at - self.refresh_margin:
+            self.__refresh_token(self.token)
+        token = self.token
+
+        if method in ('get', 'delete'):
             params = self.__token_params(params)
         else:
-            headers = self.__bearer_headers()
+            headers = self.__bearer_headers(extra_headers)
 
         response = self.__do_request(
             method, url, headers, params, data, stream
         )
 
         if response.status_code == 401:
-            self.__refresh_token()
-            if method is 'get' or 'delete':
+            self.__refresh_token(token)
+            if method in ('get', 'delete'):
                 params = self.__token_params(params)
             else:
-                headers = self.__bearer_headers()
+                headers = self.__bearer_headers(extra_headers)
             return self.__do_request(
                 method, url, headers, params, data, stream
             )
         else:
             return response
 
+    def __unauthenticated_request(self, method, url, headers=None,
+                                  params=None, data=None, stream=False):
+        """ Run a request without the access token, e.g. on an upload URL
+
+        The retry policy and hooks apply as to API requests.
+
+        @rtype: requests.Response
+        @return: server's response
+        """
+        return self.__do_request(method, url, headers, params, data, stream)
+
     def __do_request(self, method, path, headers, params, data, stream):
+        if self.retry_policy is None:
+            return self.__send(method, path, headers, params, data, stream)
+        attempts = {'count': 0}
+
+        def send():
+            attempts['count'] += 1
+            return self.__send(method, path, headers, params, data, stream,
+                               attempts['count'])
+        return self.retry_policy.call(method, send)
+
+    def __send(self, method, path, headers, params, data, stream, attempt=1):
+        if not self.hooks['request'] and not self.hooks['response']:
+            return self.__transport_request(method, path, headers, params,
+                                            data, stream)
+        info = {
+            'method': method,
+            'url': path,
+            'endpoint': metrics.endpoint_of(path),
+            'attempt': attempt
+        }
+        self.__emit('request', info)
+        info['bytes_sent'] = len(data) if isinstance(data, (bytes, str)) \
+            else None
+        start = time.time()
+        try:
+            response = self.__transport_request(method, path, headers,
+                                                params, data, stream)
+        except Exception as exc:
+            info.update(status=None, error=exc, elapsed=time.time() - start,
+                        bytes_received=None, bytes_decoded=None)
+            self.__emit('response', info)
+            raise
+        received, decoded = transfer_sizes(response, stream)
+        info.update(status=response.status_code, error=None,
+                    elapsed=time.time() - start, bytes_received=received,
+                    bytes_decoded=decoded)
+        self.__emit('response', info)
+        return response
+
+    def __transport_request(self, method, path, headers, params, data,
+                            stream):
         if stream:
-            return requests.request(
+            return self.transport.request(
                 method, path, headers=headers, params=params, data=data,
                 stream=True)
         else:
-            return requests.request(
+            return self.transport.request(
                 method, path, headers=headers, params=params, data=data
             )
 
-    def __refresh_token(self):
+    def __refresh_token(self, stale_token=None):
         """ Handles the refresh process and update with newly acquired values
 
+        Refreshes are serialized: threads which find the token already
+        replaced while waiting for their turn use the new one instead of
+        refreshing it again.
+
+        @param stale_token: the token known to be expired, `None` to refresh
+        unconditionally
+        """
+        with self._refresh_lock:
+            if stale_token is not None and self.token != stale_token:
+                return
+            start = time.time()
+            source = 'login'
+            if self.token_store is None:
+                self.__do_refresh_token()
+            else:
+                with self.token_store.lock():
+                    if self.__use_stored_token(stale_token or self.token):
+                        source = 'store'
+                    else:
+                        self.__do_refresh_token()
+                        self.token_store.save(self.token, self.refresh_token,
+                                              self.token_expires_at)
+            self.__emit('token_refresh', {'elapsed': time.time() - start,
+                                          'source': source})
+
+    def __use_stored_token(self, stale_token):
+        """ Adopt the tokens of the store if another process refreshed them
+
+        @param stale_token: the token known to be expired
+        @return: whether the stored access token can be used
+        @rtype: bool
         """
+        stored = self.token_store.load()
+        if not stored:
+            return False
+        # the stored refresh token is the latest one, ours may be revoked
+        self.refresh_token = stored['refresh_token']
+        expires_at = stored.get('expires_at')
+        if stored['access_token'] == stale_token or (
+                expires_at is not None and
+                time.time() >= expires_at - self.refresh_margin):
+            return False
+        LOGGER.info("Using OAuth token refreshed by another process")
+        self.token = stored['access_token']
+        self.token_expires_at = expires_at
+        if self.refresh_callback:
+            self.refresh_callback(self.token, self.refresh_token)
+        return True
+
+    def __do_refresh_token(self):
         refresh_data = {
             'refresh_token': self.refresh_token,
             'client_id': self.client_id,
@@ -106,16 +405,99 @@ class OneDrive(object):
         }
 
         LOGGER.info("Refreshing OAuth token")
-        response = requests.post('https://login.live.com/oauth20_token.srf',
-                                 data=refresh_data)
+        response = self.transport.post(self._token_url, data=refresh_data)
         response.raise_for_status()
         response = response.json()
         self.token = response['access_token']
         self.refresh_token = response['refresh_token']
+        if 'expires_in' in response:
+            self.token_expires_at = time.time() + int(response['expires_in'])
 
         if self.refresh_callback:
             self.refresh_callback(self.token, self.refresh_token)
 
+    @staticmethod
+    def __is_absolute(path):
+        """ Tell whether a path is a full URL, such as a `paging.next` link
+
+        """
+        return path.startswith(('http://', 'https://'))
+
+    def __get_json(self, path, params=None):
+        """ Run a GET request and decode its response
+
+        @param path: resource endpoint
+        @param params: request's parameters
+        @raises: `requests.exception.HTTPError` upon error
+        @return: the decoded response
+        """
+        resp = self.__request('get', path, params=params,
+                              absolute=self.__is_absolute(path))
+        resp.raise_for_status()
+        return resp.json()
+
+    def __get_stream(self, path, params=None, fields=None):
+        """ Run a GET request and decode its response's items while read
+
+        @param path: resource endpoint
+        @param params: request's parameters
+        @param fields: if provided, items are trimmed down to these keys
+        @raises: `requests.exception.HTTPError` upon error
+        @rtype: StreamedPage
+        @return: the page, its items being in the 'data' key
+        """
+        resp = self.__request('get', path, params=params, stream=True,
+                              absolute=self.__is_absolute(path))
+        resp.raise_for_status()
+        return StreamedPage(resp, 'data', fields=fields)
+
+    def __count_probe(self, item_id, key):
+        """ Build a function reading an item's size attribute
+
+        @param item_id: the item's ID
+        @param key: attribute holding the number of children, e.g. 'count'
+        @return: function returning the attribute's value or `None`
+        """
+        return lambda: self.__get_json(item_id).get(key)
+
+    def __paginate(self, path, params, count=20, prefetch=0, max_in_flight=1,
+                   ordered=True, total=None, stream=False, fields=None):
+        """ Iterate over the items of a paginated resource
+
+        @param path: resource endpoint
+        @param params: request's parameters, reused for every page
+        @param count: number of items per page
+        @param prefetch: number of pages to fetch in advance in a background
+        thread, 0 to fetch a page only once the previous one is consumed
+        @param max_in_flight: number of pages fetched concurrently once the
+        resource's size is known
+        @param ordered: whether concurrently fetched items must be yielded in
+        order
+        @param total: resource's size, or a function returning it
+        @param stream: whether to decode the items of each page while it is
+        read, pages being fetched sequentially
+        @param fields: if provided, items are trimmed down to these keys as
+        soon as their page is decoded
+        @return: A generator for the resource's items
+        """
+
+        def fetch(path, params):
+            if stream:
+                page = self.__get_stream(path, params, fields)
+            else:
+                page = self.__get_json(path, params)
+                if fields is not None:
+                    page['data'] = [project(item, fields)
+                                    for item in page['data']]
+            self.__emit('page', {'path': path,
+                                 'items': None if stream else
+                                 len(page['data'])})
+            return page
+        return iter(pagination.Paginator(
+            fetch, path, params, count=count, prefetch=prefetch,
+            max_in_flight=max_in_flight, ordered=ordered, total=total,
+            stream=stream))
+
     def get_user_metadata(self):
         """ Retrieve all token's scope granted information about the user
 
@@ -157,36 +539,42 @@ class OneDrive(object):
         return self.__request('get', 'me/skydrive/shared/albums')
 
     def get_folder_content_generator(self, folder_id, content_filter=None,
-                                     count=20):
+                                     count=20, prefetch=0, max_in_flight=1,
+                                     ordered=True, stream=False, typed=False,
+                                     fields=None):
         """ Create a generator to browse a folder
 
+        When `max_in_flight` is greater than 1, the folder's size is read first
+        and pages are fetched concurrently as `offset` windows.
+
         @param folder_id: the folder's to get content from ID
         @param content_filter: a certain content type to filter, can be
         'folders', 'albums', 'photos', 'videos', 'audio'
         @param count: number of item to get
+        @param prefetch: number of pages to fetch in advance in background
+        @param max_in_flight: number of pages fetched concurrently
+        @param ordered: whether concurrently fetched items must be yielded in
+        order, otherwise pages are yielded as they arrive
+        @param stream: whether to decode items while each page is read,
+        keeping memory bounded whatever the page size. Pages are then fetched
+        sequentially, `prefetch` and `max_in_flight` are ignored.
+        @param typed: whether to yield `DriveItem` objects instead of dicts
+        @param fields: if provided, items are trimmed down to these keys
+        as soon as their page is decoded, the v5.0 API always sending full
+        representations
         @return: A generator for folder items
         """
-        request_params = {
-            'limit': count
-        }
+        request_params = {}
 
         if content_filter:
             request_params['filter'] = content_filter
 
-        resp = self.__request('get', '{id}/files'.format(id=folder_id),
-                              params=request_params)
-        resp.raise_for_status()
-        resp = resp.json()
-
-        while True:
-            for content in resp['data']:
-                yield content
-            if not 'next' in resp['paging']:
-                break
-            resp = self.__request('get', resp['paging']['next'],
-                                  params=request_params)
-            resp.raise_for_status()
-            resp = resp.json()
+        items = self.__paginate('{id}/files'.format(id=folder_id),
+                                request_params, count, prefetch,
+                                max_in_flight, ordered,
+                                self.__count_probe(folder_id, 'count'),
+                                stream, fields)
+        return drive_item.typed_items(items) if typed else items
 
     def get_folder_content(self, folder_id, content_filter=None,
                            count=20, offset=0):
@@ -211,16 +599,61 @@ class OneDrive(object):
         return self.__request('get', '{id}/files'.format(id=folder_id),
                               params=request_params)
 
-
-    def get_drive_root(self):
+    def get_tree_generator(self, folder_id=None, max_depth=None, facet=None,
+                           max_in_flight=8, count=100, on_error=None,
+                           typed=False, fields=None):
+        """ Create a generator browsing a folder and all its sub-folders
+
+        Sub-folders are listed concurrently, a folder's items are yielded as
+        soon as it is fully listed so the traversal order is not deterministic.
+
+        @param folder_id: ID of the folder to start from, the root folder if
+        not provided
+        @param max_depth: number of levels to list, `None` for no limit. A
+        depth of 1 only lists the starting folder's content
+        @param facet: only yield items exposing this facet, one of the
+        `*_FACET` class attributes. Sub-folders are browsed regardless of it
+        @param max_in_flight: number of folders listed concurrently
+        @param count: number of items requested per page
+        @param on_error: function called with the folder's ID and the
+        exception when a folder cannot be listed, the walk then goes on.
+        If not provided the exception is raised.
+        @param typed: whether to yield `DriveItem` objects instead of dicts
+        @param fields: if provided, items are trimmed down to these keys, plus
+        the ones needed to browse the tree
+        @return: A generator of (parent's path, item) tuples, paths being
+        relative to the starting folder ('/')
+        """
+        if folder_id is None:
+            root = self.get_root_folder()
+            root.raise_for_status()
+            folder_id = root.json()['id']
+        tree = walker.walk_tree(self, folder_id, max_depth=max_depth,
+                                facet=facet, max_in_flight=max_in_flight,
+                                count=count, on_error=on_error, fields=fields)
+        if typed:
+            return ((path, drive_item.DriveItem.from_json(item))
+                    for path, item in tree)
+        return tree
+
+    def get_drive_root(self, fields=None):
+        """ Retrieve the v1.0 representation of the drive's root
+
+        @param fields: if provided, only these properties are requested
+        @raises: `requests.exception.HTTPError` upon error
+        @return: the decoded representation
+        """
+        params = {'select': select_param(fields)} if fields else None
         response = self.__request('get',
-            'https://api.onedrive.com/v1.0/drive/root',
+            self._api_v1_url + 'drive/root',
+            params=params,
             absolute=True
         )
         response.raise_for_status()
         return response.json()
 
-    def get_view_changes_generator(self, drive, change_token=None):
+    def get_view_changes_generator(self, drive, change_token=None,
+                                   stream=False, typed=False, fields=None):
         """ Provides generator over modified objects since last call
 
         The last yield object is a dict with the `change_token` key
@@ -230,29 +663,135 @@ class OneDrive(object):
         returned by the `get_drive_root` member method.
         @param change_token: `None` to retrieve all changes, otherwise
         you may pass the one previously returned to get changes since then.
+        @param stream: whether to decode changes while each page is read,
+        keeping memory bounded whatever the page size
+        @param typed: whether to yield changed items as `DriveItem` objects
+        instead of dicts, the last yielded object remains a dict
+        @param fields: if provided, only these item properties are requested,
+        along with 'id' and 'deleted'
+
+        @raises: `requests.exception.HTTPError` upon error
+        """
+        pages = self.get_view_changes_page_generator(drive, change_token,
+                                                     stream, fields)
+        for page in pages:
+            # Emit fetched items
+            for item in page.get('value', []):
+                yield drive_item.DriveItem.from_json(item) if typed else item
+            if '@changes.resync' not in page:
+                change_token = page['@changes.token']
+        yield {'change_token': change_token}
+
+    def get_view_changes_page_generator(self, drive, change_token=None,
+                                        stream=False, fields=None):
+        """ Provides generator over the pages of modified objects
+
+        Each page is the decoded API response: changed items are in the
+        'value' key and the checkpoint reached once the page is processed in
+        the '@changes.token' key. A page holding a '@changes.resync' key means
+        the server cannot provide a delta, all items are then enumerated again
+        starting with the next page.
+
+        In streaming mode pages are `StreamedPage` objects: their 'value' key
+        is an iterator decoding the changes while the page is read, the other
+        keys are available once it is exhausted. A page is fully read when the
+        generator moves to the next one.
+
+        @param drive: drive identifier or dict providing the drive identifier
+        in the 'id' key, returned by the `get_drive_root` member method.
+        @param change_token: `None` to retrieve all changes, otherwise
+        you may pass a previously returned one to get changes since then.
+        @param stream: whether to yield pages decoded while read instead of
+        fully decoded ones
+        @param fields: if provided, only these item properties are requested,
+        along with 'id' and 'deleted'
 
         @raises: `requests.exception.HTTPError` upon error
         """
-        params = self.__token_params({'token': change_token} if change_token else {})
+        base_params = {}
+        if fields is not None:
+            base_params['select'] = select_param(
+                with_required(fields, ('id', 'deleted')))
+        params = self.__token_params(dict(base_params))
+        if change_token:
+            params['token'] = change_token
         if isinstance(drive, dict):
             drive = drive['id']
-        path = 'https://api.onedrive.com/v1.0/drive/items/{0}/view.changes'.format(drive)
+        path = '{0}drive/items/{1}/view.changes'.format(self._api_v1_url,
+                                                        drive)
         while True:
-            response = self.__request('get', path, params=params, absolute=True)
+            response = self.__request('get', path, params=params,
+                                      absolute=True, stream=stream)
             response.raise_for_status()
-            response = response.json()
-            # Emit fetched items
-            for item in response.get('value', []):
-                yield item
+            if stream:
+                response = StreamedPage(response, 'value')
+                self.__emit('page', {'path': path, 'items': None})
+                try:
+                    yield response
+                    response.drain()
+                finally:
+                    response.close()
+            else:
+                response = response.json()
+                self.__emit('page', {'path': path,
+                                     'items': len(response.get('value', []))})
+                yield response
             if '@changes.resync' in response:
                 # server is not able to provide delta.
                 # => Force full synchronization
-                params = {}
+                params = dict(base_params)
                 continue
             params['token'] = response['@changes.token']
             if not response.get("@changes.hasMoreChanges", False):
                 break
-        yield {'change_token': params.get('token')}
+
+    def process_changes(self, drive, handler, change_token=None,
+                        max_workers=8, processes=False, on_checkpoint=None,
+                        on_error=None, on_resync=None, fields=None):
+        """ Handle the changes of a drive concurrently
+
+        Changes of a same item are handled in order, see `ChangePipeline`.
+
+        @param drive: drive identifier or dict providing the drive identifier
+        in the 'id' key, returned by the `get_drive_root` member method.
+        @param handler: function called with each changed item
+        @param change_token: `None` to handle all changes, otherwise a
+        previously returned one to handle changes since then.
+        @param max_workers: number of changes handled concurrently
+        @param processes: whether to run the handler in a process pool
+        @param on_checkpoint: function called with each change token up to
+        which every change has been handled, to persist it
+        @param on_error: function called with the item and the exception when
+        the handler fails, processing then goes on
+        @param on_resync: function called before all items are enumerated
+        again because the server cannot provide a delta
+        @param fields: if provided, only these item properties are requested,
+        along with 'id' and 'deleted'
+        @raises: `requests.exception.HTTPError` upon error, or the handler's
+        exception
+        @return: the change token up to which every change has been handled
+        """
+        return pipeline.ChangePipeline(
+            self, drive, handler, change_token, max_workers=max_workers,
+            processes=processes, on_checkpoint=on_checkpoint,
+            on_error=on_error, on_resync=on_resync, fields=fields).run()
+
+    def mirror_drive(self, drive, directory, **kwargs):
+        """ Update a local copy of a drive with the changes since last time
+
+        Moves and deletions are applied locally, new and changed files
+        downloaded concurrently, see `Mirror`.
+
+        @param drive: drive identifier or dict providing the drive identifier
+        in the 'id' key, returned by the `get_drive_root` member method.
+        @param directory: the local directory mirroring the drive's root
+        @param kwargs: extra `Mirror` parameters, such as `max_in_flight`
+        @raises: `requests.exception.HTTPError` upon error, the changes
+        applied so far are kept and the next call resumes from them
+        @return: counters of the applied changes
+        @rtype: dict
+        """
+        return mirror.Mirror(self, drive, directory, **kwargs).sync()
 
     def get_shared_objects(self, content_filter=None, count=20, offset=0):
         """ Retrieve the list of objects shared with the signed user
@@ -275,6 +814,40 @@ class OneDrive(object):
         return self.__request('get', 'me/skydrive/shared',
                               params=request_params)
 
+    def get_shared_objects_generator(self, content_filter=None, count=20,
+                                     prefetch=0, max_in_flight=1,
+                                     ordered=True, total=None, stream=False,
+                                     typed=False, fields=None):
+        """ Create a generator over the objects shared with the signed user
+
+        @param content_filter: a certain content type to filter, can be
+        'folders', 'albums', 'photos', 'videos', 'audio'
+        @param count: number of item to get
+        @param prefetch: number of pages to fetch in advance in background
+        @param max_in_flight: number of pages fetched concurrently, only used
+        if `total` is provided
+        @param ordered: whether concurrently fetched objects must be yielded
+        in order
+        @param total: expected number of shared objects
+        @param stream: whether to decode items while each page is read,
+        keeping memory bounded whatever the page size. Pages are then fetched
+        sequentially, `prefetch` and `max_in_flight` are ignored.
+        @param typed: whether to yield `DriveItem` objects instead of dicts
+        @param fields: if provided, items are trimmed down to these keys
+        as soon as their page is decoded, the v5.0 API always sending full
+        representations
+        @return: A generator for shared objects
+        """
+        request_params = {}
+
+        if content_filter:
+            request_params['filter'] = content_filter
+
+        items = self.__paginate('me/skydrive/shared', request_params, count,
+                                prefetch, max_in_flight, ordered, total,
+                                stream, fields)
+        return drive_item.typed_items(items) if typed else items
+
     def get_shared_folders(self, count=20, offset=0):
         """ Retrieve the list of folders shared with the signed user
 
@@ -330,28 +903,65 @@ class OneDrive(object):
         """
         return self.__request('get', '{id}/embed'.format(id=item_id))
 
-    def get_preview(self, item_id, size='thumbnail'):
+    def __read_link(self, item_id):
+        """ Get an item's read only share link, from `link_cache` if possible
+
+        @raises: `requests.exception.HTTPError` upon error
+        @return: the link
+        """
+        key = ('shared_read_link', item_id)
+        if self.link_cache is not None:
+            entry = self.link_cache.get(key)
+            if entry is not None and self.link_cache.is_fresh(entry):
+                return entry.response.json()['link']
+        response = self.get_shared_read_link(item_id)
+        response.raise_for_status()
+        if self.link_cache is not None:
+            self.link_cache.set(key, response)
+        return response.json()['link']
+
+    def get_preview(self, item_id, size='thumbnail', stream=False):
         """ Generate a preview image for the specified item
 
+        The item's share link is taken from `link_cache` when available.
+
         @param item_id: the item's to preview id
         @param size: preview's type, can be 'thumbnail', 'small', 'album' or
         'normal'
+        @param stream: whether to stream the preview's content
         @rtype: Response
         @return: API's response
         """
-        link = self.get_shared_read_link(item_id)
-        link.raise_for_status()
-        link = link.json()['link']
-
         params = {
             'type': size,
-            'url': link
+            'url': self.__read_link(item_id)
         }
 
-        return requests.request(
-            'get',
-            'https://apis.live.net/v5.0/skydrive/get_item_preview',
-            params=params)
+        return self.__unauthenticated_request(
+            'get', self._api_url + 'skydrive/get_item_preview',
+            params=params, stream=stream)
+
+    def get_previews(self, item_ids, size='thumbnail', max_in_flight=8,
+                     directory=None, on_error=None):
+        """ Generate the preview images of several items concurrently
+
+        @param item_ids: IDs of the items to preview
+        @param size: previews' type, can be 'thumbnail', 'small', 'album' or
+        'normal'
+        @param max_in_flight: number of previews fetched concurrently
+        @param directory: if provided, previews are streamed to files of this
+        directory named after the items' IDs, e.g. '<item_id>.jpg'
+        @param on_error: function called with the item's ID and the exception
+        when a preview cannot be generated, the other previews are then still
+        generated. If not provided the first exception is raised.
+        @raises: `requests.exception.HTTPError` upon error
+        @return: OrderedDict mapping the IDs to the previews' responses, or
+        paths if `directory` is provided. Failed previews are left out.
+        """
+        return previews.fetch_previews(
+            lambda item_id, stream: self.get_preview(item_id, size, stream),
+            item_ids, max_in_flight=max_in_flight, directory=directory,
+            on_error=on_error)
 
     def get_comments(self, item_id, count=20, offset=0):
         """ Retrieve a list of comment for the given item
@@ -369,31 +979,25 @@ class OneDrive(object):
         return self.__request('get', '{id}/comments'.format(id=item_id),
                               params=request_params)
 
-    def get_comments_generator(self, item_id, count=20):
+    def get_comments_generator(self, item_id, count=20, prefetch=0,
+                               max_in_flight=1, ordered=True, stream=False):
         """ Create a generator to get comments from a specified item
 
         @param item_id: the item's to get related comments from
         @param count: number of comments to get
-        @param offset: pagination offset
+        @param prefetch: number of pages to fetch in advance in background
+        @param max_in_flight: number of pages fetched concurrently
+        @param ordered: whether concurrently fetched comments must be yielded
+        in order
+        @param stream: whether to decode items while each page is read,
+        keeping memory bounded whatever the page size. Pages are then fetched
+        sequentially, `prefetch` and `max_in_flight` are ignored.
         @return: A generator for item's comments
         """
-        request_params = {
-            'limit': count
-        }
-        resp = self.__request('get', '{id}/comments'.format(id=item_id),
-                              params=request_params)
-        resp.raise_for_status()
-        resp = resp.json()
-
-        while True:
-            for content in resp['data']:
-                yield content
-            if not 'next' in resp['paging']:
-                break
-            resp = self.__request('get', resp['paging']['next'],
-                                  params=request_params)
-            resp.raise_for_status()
-            resp = resp.json()
+        return self.__paginate('{id}/comments'.format(id=item_id), {}, count,
+                               prefetch, max_in_flight, ordered,
+                               self.__count_probe(item_id, 'comments_count'),
+                               stream)
 
     def get_tags(self, item_id, count=20, offset=0):
         """ Retrieve a list of tags for the given item
@@ -411,31 +1015,25 @@ class OneDrive(object):
         return self.__request('get', '{id}/tags'.format(id=item_id),
                               params=request_params)
 
-    def get_tags_generator(self, item_id, count=20):
+    def get_tags_generator(self, item_id, count=20, prefetch=0,
+                           max_in_flight=1, ordered=True, stream=False):
         """ Create a generator to get tags from a specified item
 
         @param item_id: the item's to get related tags from
         @param count: number of tags to get
-        @param offset: pagination offset
+        @param prefetch: number of pages to fetch in advance in background
+        @param max_in_flight: number of pages fetched concurrently
+        @param ordered: whether concurrently fetched tags must be yielded in
+        order
+        @param stream: whether to decode items while each page is read,
+        keeping memory bounded whatever the page size. Pages are then fetched
+        sequentially, `prefetch` and `max_in_flight` are ignored.
         @return: A generator for item's tags
         """
-        request_params = {
-            'limit': count
-        }
-        resp = self.__request('get', '{id}/tags'.format(id=item_id),
-                              params=request_params)
-        resp.raise_for_status()
-        resp = resp.json()
-
-        while True:
-            for content in resp['data']:
-                yield content
-            if not 'next' in resp['paging']:
-                break
-            resp = self.__request('get', resp['paging']['next'],
-                                  params=request_params)
-            resp.raise_for_status()
-            resp = resp.json()
+        return self.__paginate('{id}/tags'.format(id=item_id), {}, count,
+                               prefetch, max_in_flight, ordered,
+                               self.__count_probe(item_id, 'tags_count'),
+                               stream)
 
     def delete_item(self, item_id):
         """ Delete the requested item (file, folder, comment, etc)
@@ -451,11 +1049,279 @@ class OneDrive(object):
 
         file's actual content as Bytes can be found under the content file of
         the Response, metadata are to be seeked into the headers field (file's
-        name, length, content type)
+        name, length, content type). The content is requested without
+        compression, so it is received byte for byte.
 
         @param file_id: the file's to download ID
         @rtype: Response
         @return: API's response
         """
         return self.__request('get', '{id}/content'.format(id=file_id),
-            stream=True)
+            stream=True, headers={'Accept-Encoding': IDENTITY})
+
+    def download_file_to(self, file_id, destination,
+                         segment_size=None, max_in_flight=4,
+                         max_attempts=3, resume=True, size=None, etag=None):
+        """ Download a file to disk as concurrently fetched byte ranges
+
+        Each range is retried on its own upon failure. When downloading to a
+        path with `resume` enabled, completed ranges are recorded in a
+        `<destination>.state` file, so that a later call with the same
+        parameters only fetches the missing ranges. Given the content's tag,
+        ranges are requested with `If-Range`, so a file changed in between is
+        not assembled from both versions.
+
+        @param file_id: the file's to download ID
+        @param destination: path of the file to write, or a seekable file
+        object opened in binary write mode
+        @param segment_size: size in bytes of the ranges to fetch, 8 MiB by
+        default
+        @param max_in_flight: number of ranges fetched concurrently
+        @param max_attempts: number of times a range is tried before giving up
+        @param resume: whether to resume from / record to the state file
+        @param size: file's size in bytes, read from the file's metadata if
+        not provided
+        @param etag: the content's tag, e.g. the item's eTag, recorded in the
+        state file along with the completed ranges
+        @raises: `requests.exception.HTTPError` upon error,
+        `download.ContentChanged` if the file no longer matches `etag`
+        @rtype: int
+        @return: number of bytes transferred
+        """
+        if size is None:
+            size = self.__get_json(file_id)['size']
+        return self.__download_ranges('{id}/content'.format(id=file_id),
+                                      destination, size, etag, segment_size,
+                                      max_in_flight, max_attempts, resume)
+
+    def download_item_to(self, item_id, destination, segment_size=None,
+                         max_in_flight=4, max_attempts=3, resume=True,
+                         size=None, etag=None):
+        """ Download a file to disk through the v1.0 API
+
+        Same as `download_file_to`, for the v1.0 IDs found in the changes
+        feed and the v1.0 representations.
+
+        @param item_id: the file's v1.0 ID
+        @param destination: path of the file to write, or a seekable file
+        object opened in binary write mode
+        @param segment_size: size in bytes of the ranges to fetch, 8 MiB by
+        default
+        @param max_in_flight: number of ranges fetched concurrently
+        @param max_attempts: number of times a range is tried before giving up
+        @param resume: whether to resume from / record to the state file
+        @param size: file's size in bytes. If not provided, the size and the
+        eTag are read from the file's metadata
+        @param etag: the content's tag, the item's eTag
+        @raises: `requests.exception.HTTPError` upon error,
+        `download.ContentChanged` if the file no longer matches `etag`
+        @rtype: int
+        @return: number of bytes transferred
+        """
+        path = '{0}drive/items/{1}'.format(self._api_v1_url, item_id)
+        if size is None:
+            item = self.__get_json(path, {'select': 'id,size,eTag'})
+            size = item['size']
+            etag = etag or item.get('eTag')
+        return self.__download_ranges(path + '/content', destination, size,
+                                      etag, segment_size, max_in_flight,
+                                      max_attempts, resume)
+
+    def __download_ranges(self, path, destination, size, etag, segment_size,
+                          max_in_flight, max_attempts, resume):
+        """ Download a content endpoint as concurrently fetched byte ranges
+
+        @param path: the content's endpoint, relative to the v5.0 API or
+        absolute
+        @rtype: int
+        @return: number of bytes transferred
+        """
+        if segment_size is None:
+            segment_size = download.DEFAULT_SEGMENT_SIZE
+        state_path = None
+        if resume and not hasattr(destination, 'write'):
+            state_path = destination + '.state'
+        absolute = self.__is_absolute(path)
+
+        def fetch_range(start, end):
+            headers = {'Range': 'bytes={0}-{1}'.format(start, end),
+                       'Accept-Encoding': IDENTITY}
+            if etag:
+                headers['If-Range'] = etag
+            return self.__request('get', path, stream=True, headers=headers,
+                                  absolute=absolute)
+
+        return download.RangedDownload(fetch_range, size, destination,
+                                       segment_size=segment_size,
+                                       max_in_flight=max_in_flight,
+                                       max_attempts=max_attempts,
+                                       state_path=state_path,
+                                       etag=etag).run()
+
+    def download_if_changed(self, file_id, destination, item=None, **kwargs):
+        """ Download a file unless the local copy already holds its content
+
+        The local file's size, then hash, are compared with the item's
+        metadata before any content is requested. Files whose metadata holds
+        no hash are always downloaded. Metadata and content are both read
+        from the v1.0 API, see `download_item_to`.
+
+        @param file_id: the file's v1.0 ID
+        @param destination: path of the local copy
+        @param item: the file's v1.0 representation or `DriveItem`, e.g. from
+        the changes feed, read from the v1.0 API if not provided
+        @param kwargs: extra `download_item_to` parameters
+        @raises: `requests.exception.HTTPError` upon error
+        @return: number of bytes transferred, `None` if the file was
+        unchanged
+        """
+        if item is None:
+            item = self.__get_json(
+                '{0}drive/items/{1}'.format(self._api_v1_url, file_id),
+                {'select': 'id,size,file,eTag'})
+        if hashing.is_unchanged(destination, item):
+            return None
+        if isinstance(item, dict):
+            size, etag = item.get('size'), item.get('eTag')
+        else:
+            size, etag = item.size, item.etag
+        return self.download_item_to(file_id, destination, size=size,
+                                     etag=etag, **kwargs)
+
+    def __item_path(self, name, parent_id=None):
+        """ Build the v1.0 API path of an item addressed by name
+
+        @param name: item's name, or path relative to the parent folder
+        @param parent_id: parent folder's ID, the root folder if not provided
+        @return: the item's path
+        """
+        parent = 'drive/items/{0}'.format(parent_id) if parent_id \
+            else 'drive/root'
+        return '{0}{1}:/{2}:'.format(self._api_v1_url, parent,
+                                     urllib.quote(name.encode('utf-8')))
+
+    def create_upload_session(self, name, parent_id=None,
+                              conflict_behavior='rename'):
+        """ Create an upload session for a new file
+
+        @param name: file's name, or path relative to the parent folder
+        @param parent_id: parent folder's ID, the root folder if not provided
+        @param conflict_behavior: what to do if the file already exists,
+        'rename', 'replace' or 'fail'
+        @raises: `requests.exception.HTTPError` upon error
+        @rtype: dict
+        @return: the session, providing the `uploadUrl` to send the content
+        to and the `nextExpectedRanges`
+        """
+        body = {'item': {'@name.conflictBehavior': conflict_behavior}}
+        path = self.__item_path(name, parent_id) + '/upload.createSession'
+        response = self.__request(
+            'post', path, data=json.dumps(body), absolute=True,
+            headers={'Content-Type': 'application/json'})
+        response.raise_for_status()
+        return response.json()
+
+    def upload_file(self, source, name, parent_id=None,
+                    fragment_size=None, max_in_flight=1,
+                    max_attempts=3, conflict_behavior='rename'):
+        """ Upload a file through an upload session
+
+        The file is streamed from disk fragment by fragment, failed fragments
+        are sent again from the ranges the server still expects.
+
+        @param source: path of the file to upload, or a seekable file object
+        opened in binary mode
+        @param name: file's name, or path relative to the parent folder
+        @param parent_id: parent folder's ID, the root folder if not provided
+        @param fragment_size: size in bytes of the fragments, rounded down to
+        a multiple of 320 KiB, 10 MiB by default
+        @param max_in_flight: number of fragments sent concurrently, only
+        raise it if the server accepts out of order fragments
+        @param max_attempts: number of consecutive failures before giving up
+        @param conflict_behavior: what to do if the file already exists,
+        'rename', 'replace' or 'fail'
+        @raises: `requests.exception.HTTPError` upon error
+        @rtype: dict
+        @return: the uploaded item
+        """
+        if fragment_size is None:
+            fragment_size = upload.DEFAULT_FRAGMENT_SIZE
+        if hasattr(source, 'read'):
+            source.seek(0, os.SEEK_END)
+            size = source.tell()
+        else:
+            size = os.path.getsize(source)
+        if not size:
+            # upload sessions do not accept empty files
+            response = self.__request(
+                'put', self.__item_path(name, parent_id) + '/content',
+                params={'@name.conflictBehavior': conflict_behavior},
+                data=b'', absolute=True)
+            response.raise_for_status()
+            return response.json()
+        session = self.create_upload_session(name, parent_id,
+                                             conflict_behavior)
+        return upload.UploadSession(
+            self.__unauthenticated_request, session['uploadUrl'], source,
+            size=size,
+            fragment_size=fragment_size, max_in_flight=max_in_flight,
+            max_attempts=max_attempts,
+            next_expected_ranges=session.get('nextExpectedRanges')).run()
+
+    def resume_upload(self, upload_url, source,
+                      fragment_size=None, max_in_flight=1,
+                      max_attempts=3):
+        """ Resume an upload session created by `create_upload_session`
+
+        Only the ranges the server still expects are sent.
+
+        @param upload_url: the session's `uploadUrl`
+        @param source: path of the file to upload, or a seekable file object
+        opened in binary mode
+        @param fragment_size: size in bytes of the fragments, 10 MiB by
+        default
+        @param max_in_flight: number of fragments sent concurrently
+        @param max_attempts: number of consecutive failures before giving up
+        @raises: `requests.exception.HTTPError` upon error
+        @rtype: dict
+        @return: the uploaded item
+        """
+        if fragment_size is None:
+            fragment_size = upload.DEFAULT_FRAGMENT_SIZE
+        return upload.UploadSession(self.__unauthenticated_request,
+                                    upload_url, source,
+                                    fragment_size=fragment_size,
+                                    max_in_flight=max_in_flight,
+                                    max_attempts=max_attempts).run()
+
+    def __send_batch(self, body):
+        """ Post a `$batch` request
+
+        @param body: the batch's body
+        @raises: `requests.exception.HTTPError` upon error
+        @return: the decoded response
+        """
+        response = self.__request(
+            'post', self._api_v1_url + '$batch', data=json.dumps(body),
+            absolute=True, headers={'Content-Type': 'application/json'})
+        response.raise_for_status()
+        return response.json()
+
+    def batch(self, max_batch_size=None, max_in_flight=4):
+        """ Create a builder packing v1.0 API requests into `$batch` calls
+
+        Sub-requests are added with the builder's `add` method (or helpers
+        such as `add_item`, `add_link`, ...), then sent with `execute`, which
+        returns each sub-request's response or error.
+
+        @param max_batch_size: maximum number of sub-requests per batch, 20
+        by default
+        @param max_in_flight: number of batches sent concurrently
+        @rtype: BatchRequest
+        @return: an empty batch
+        """
+        if max_batch_size is None:
+            max_batch_size = batch.MAX_BATCH_SIZE
+        return batch.BatchRequest(self.__send_batch,
+                                  max_batch_size=max_batch_size,
+                                  max_in_flight=max_in_flight)
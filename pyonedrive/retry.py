@@ -0,0 +1,179 @@
+""" Retry policy for throttled and transient failures
+
+"""
+
+import email.utils
+import logging
+import random
+import threading
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+# methods which can safely be sent again after a connection failure
+IDEMPOTENT_METHODS = frozenset(['get', 'head', 'put', 'delete', 'options'])
+# statuses meaning the request was not processed, retried whatever the method
+THROTTLED_STATUSES = frozenset([429, 503])
+
+
+class RetryPolicy(object):
+    """ Retry throttled and failed requests with jittered exponential backoff
+
+    Responses whose status is in `statuses` are retried after the delay given
+    by their `Retry-After` header, or after an exponential backoff if they do
+    not provide one. Requests with non-idempotent methods, such as POST, may
+    have been processed when failing: they are only retried when throttled
+    (429 or 503), and not after connection errors and timeouts. A request is
+    given up, returning its last response or raising its last error, after
+    `max_attempts` tries or when waiting again would exceed `max_total_time`
+    seconds.
+
+    A policy is thread-safe and may be shared between clients, its counters
+    then aggregate all of them.
+    """
+
+    def __init__(self, max_attempts=5, backoff_factor=0.5, max_backoff=60,
+                 max_total_time=300, statuses=(429, 500, 502, 503, 504),
+                 jitter=True, sleep=time.sleep, clock=time.time):
+        """
+        @param max_attempts: maximum number of tries per request
+        @param backoff_factor: base delay in seconds, doubled at each retry
+        @param max_backoff: maximum computed delay in seconds
+        @param max_total_time: maximum number of seconds spent on a request,
+        waits included
+        @param statuses: HTTP statuses worth retrying
+        @param jitter: whether to randomize computed delays ("full jitter")
+        to avoid synchronized retries
+        @param sleep: function used to wait
+        @param clock: function returning the current time in seconds
+        """
+        self.max_attempts = max_attempts
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.max_total_time = max_total_time
+        self.statuses = frozenset(statuses)
+        self.jitter = jitter
+        self.sleep = sleep
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        """ Reset the counters
+
+        """
+        with self._lock:
+            self.retries = 0
+            self.throttled = 0
+            self.errors = 0
+            self.given_up = 0
+            self.time_throttled = 0.0
+            self.time_waiting = 0.0
+
+    def stats(self):
+        """ Counters of the requests sent with this policy
+
+        @return: number of retries, of throttled responses (429 or 503), of
+        connection errors, of requests given up, and the seconds spent
+        waiting, in total and because of throttling
+        @rtype: dict
+        """
+        with self._lock:
+            return {
+                'retries': self.retries,
+                'throttled': self.throttled,
+                'errors': self.errors,
+                'given_up': self.given_up,
+                'time_throttled': self.time_throttled,
+                'time_waiting': self.time_waiting
+            }
+
+    def backoff(self, attempt):
+        """ Compute the delay before a retry
+
+        @param attempt: number of tries done so far
+        @return: delay in seconds
+        @rtype: float
+        """
+        delay = min(self.max_backoff,
+                    self.backoff_factor * (2 ** (attempt - 1)))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    @staticmethod
+    def retry_after(response):
+        """ Read a response's `Retry-After` header
+
+        @return: the delay in seconds, `None` if absent or invalid
+        """
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            date = email.utils.parsedate_tz(value)
+            if date is None:
+                return None
+            return max(0.0, email.utils.mktime_tz(date) - time.time())
+
+    def call(self, method, send):
+        """ Send a request, retrying it according to the policy
+
+        @param method: HTTP verb of the request
+        @param send: function sending the request and returning its response
+        @rtype: requests.Response
+        @return: the last response
+        """
+        start = self.clock()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = send()
+            except IOError as exc:
+                with self._lock:
+                    self.errors += 1
+                if method.lower() not in IDEMPOTENT_METHODS or \
+                        not self.__wait(start, attempt, None, exc):
+                    raise
+                continue
+            if response.status_code not in self.statuses or \
+                    method.lower() not in IDEMPOTENT_METHODS and \
+                    response.status_code not in THROTTLED_STATUSES:
+                return response
+            if not self.__wait(start, attempt, response, None):
+                return response
+            response.close()
+
+    def __wait(self, start, attempt, response, error):
+        """ Wait before the next try, if the policy allows one
+
+        @return: whether the request must be tried again
+        """
+        delay = None
+        throttled = False
+        if response is not None:
+            delay = self.retry_after(response)
+            throttled = response.status_code in THROTTLED_STATUSES
+            if throttled:
+                with self._lock:
+                    self.throttled += 1
+        if delay is None:
+            delay = self.backoff(attempt)
+        if attempt >= self.max_attempts or \
+                self.clock() + delay - start > self.max_total_time:
+            with self._lock:
+                self.given_up += 1
+            return False
+        LOGGER.info("Retrying in %.2fs after %s (attempt %d)", delay,
+                    response.status_code if error is None else error,
+                    attempt)
+        with self._lock:
+            self.retries += 1
+            self.time_waiting += delay
+            if throttled:
+                self.time_throttled += delay
+        self.sleep(delay)
+        return True
@@ -0,0 +1,177 @@
+""" Incremental decoding of paginated JSON responses
+
+"""
+
+import codecs
+import json
+
+from projection import project
+
+# size of the chunks read from a streamed response
+CHUNK_SIZE = 64 * 1024
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = u' \t\n\r'
+# characters which may follow a complete JSON value
+_DELIMITERS = _WHITESPACE + u',:]}'
+
+
+class StreamedPage(object):
+    """ A page of items decoded while its response body is being read
+
+    The page is a top-level JSON object holding its items in an array. Items
+    are decoded one at a time, so only the current one and a chunk of the body
+    are held in memory whatever the page's size. The page acts as a read-only
+    mapping: its items key maps to a one-shot iterator over the items, other
+    keys are available once the body is read. Reading one of them first reads
+    the rest of the body, discarding the items not consumed yet.
+    """
+
+    def __init__(self, response, items_key, chunk_size=CHUNK_SIZE,
+                 fields=None):
+        """
+        @param response: a streamed `requests.Response`
+        @param items_key: key of the items array, 'data' for v5.0 pages,
+        'value' for v1.0 ones
+        @param chunk_size: number of bytes read at once
+        @param fields: if provided, items are trimmed down to these keys as
+        soon as decoded
+        """
+        self.items_key = items_key
+        self.fields = fields
+        self._response = response
+        self._chunks = response.iter_content(chunk_size)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = u''
+        self._pos = 0
+        self._eof = False
+        self._metadata = {}
+        self._items = self.__parse()
+
+    def __iter__(self):
+        return self._items
+
+    def __getitem__(self, key):
+        if key == self.items_key:
+            return self._items
+        self.drain()
+        return self._metadata[key]
+
+    def __contains__(self, key):
+        if key == self.items_key:
+            return True
+        self.drain()
+        return key in self._metadata
+
+    def get(self, key, default=None):
+        """ Read a key of the page
+
+        @param key: the key to read
+        @param default: value returned if the page does not hold the key
+        """
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def drain(self):
+        """ Read the rest of the body, skipping the remaining items
+
+        """
+        for _ in self._items:
+            pass
+
+    def close(self):
+        """ Stop reading the page and release its connection
+
+        """
+        self._items.close()
+        self._response.close()
+
+    def __parse(self):
+        try:
+            self.__expect(u'{')
+            if self.__peek() == u'}':
+                return
+            while True:
+                key = self.__value()
+                self.__expect(u':')
+                if key == self.items_key and self.__peek() == u'[':
+                    self._pos += 1
+                    if self.__peek() == u']':
+                        self._pos += 1
+                    else:
+                        while True:
+                            yield project(self.__value(), self.fields)
+                            if self.__next_char() == u']':
+                                break
+                            self._pos -= 1
+                            self.__expect(u',')
+                else:
+                    self._metadata[key] = self.__value()
+                if self.__next_char() == u'}':
+                    return
+                self._pos -= 1
+                self.__expect(u',')
+        finally:
+            self._response.close()
+
+    def __fill(self):
+        """ Append the next chunk of the body to the buffer
+
+        @return: `False` once the body is fully read
+        """
+        if self._eof:
+            return False
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self._eof = True
+            chunk = b''
+        # drop what was already decoded to keep the buffer bounded
+        self._buffer = self._buffer[self._pos:] + \
+            self._decoder.decode(chunk, final=self._eof)
+        self._pos = 0
+        return True
+
+    def __peek(self):
+        """ Skip whitespaces and return the next character
+
+        """
+        while True:
+            while self._pos < len(self._buffer) and \
+                    self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self.__fill():
+                raise ValueError('Unexpected end of JSON page')
+
+    def __next_char(self):
+        char = self.__peek()
+        self._pos += 1
+        return char
+
+    def __expect(self, expected):
+        char = self.__next_char()
+        if char != expected:
+            raise ValueError('Expected {0!r} at offset {1}, got {2!r}'
+                             .format(expected, self._pos - 1, char))
+
+    def __value(self):
+        """ Decode the next value, reading the body until it is complete
+
+        """
+        self.__peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self._buffer, self._pos)
+            except ValueError:
+                if not self.__fill():
+                    raise
+                continue
+            # a number may go on in the next chunk
+            if end < len(self._buffer) and self._buffer[end] in _DELIMITERS \
+                    or not self.__fill():
+                self._pos = end
+                return value
@@ -0,0 +1,182 @@
+""" Token stores shared between processes refreshing the same account
+
+"""
+
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+_SCHEMA = ('CREATE TABLE IF NOT EXISTS tokens ('
+           ' key TEXT PRIMARY KEY,'
+           ' access_token TEXT NOT NULL,'
+           ' refresh_token TEXT NOT NULL,'
+           ' expires_at REAL)')
+
+
+class FileTokenStore(object):
+    """ Keep an account's tokens in a JSON file guarded by a lock file
+
+    The lock is an exclusive `fcntl` lock (`msvcrt` on Windows) taken on
+    `<path>.lock`, so it is released by the system if its holder dies. The
+    tokens file is replaced atomically and readable by its owner only.
+
+    A token store exposes `lock`, `load` and `save`: `OneDrive` takes the lock
+    before refreshing its token, then uses the stored tokens if another
+    process already refreshed them, or refreshes them and saves the result.
+    """
+
+    def __init__(self, path):
+        """
+        @param path: path of the tokens file, one per account
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def lock(self):
+        """ Hold the account's refresh lock, across threads and processes
+
+        """
+        with self._lock:
+            fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                else:
+                    msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(fd, fcntl.LOCK_UN)
+                    else:
+                        os.lseek(fd, 0, os.SEEK_SET)
+                        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+            finally:
+                os.close(fd)
+
+    def load(self):
+        """ Read the stored tokens
+
+        @return: dict holding 'access_token', 'refresh_token' and
+        'expires_at' (a timestamp or `None`), `None` if nothing is stored
+        """
+        try:
+            with open(self.path) as tokens_file:
+                return json.load(tokens_file)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def save(self, access_token, refresh_token, expires_at=None):
+        """ Store freshly acquired tokens
+
+        @param access_token: the new access token
+        @param refresh_token: the new refresh token
+        @param expires_at: timestamp at which `access_token` expires, if known
+        """
+        temp_path = self.path + '.tmp'
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as tokens_file:
+            json.dump({'access_token': access_token,
+                       'refresh_token': refresh_token,
+                       'expires_at': expires_at}, tokens_file)
+        if os.name == 'nt' and os.path.exists(self.path):
+            os.remove(self.path)
+        os.rename(temp_path, self.path)
+
+
+class SQLiteTokenStore(object):
+    """ Keep tokens in a SQLite database, keyed by account
+
+    The lock is an immediate write transaction on the database, so a single
+    database can serve many accounts and processes. See `FileTokenStore` for
+    the token store interface.
+    """
+
+    def __init__(self, path, key='default', timeout=60):
+        """
+        @param path: path of the SQLite database
+        @param key: account identifier, the same for every process refreshing
+        the account's tokens
+        @param timeout: maximum number of seconds to wait for the lock
+        """
+        self.database = path
+        self.key = key
+        self.timeout = timeout
+        self._local = threading.local()
+        with contextlib.closing(self.__connect()) as db:
+            db.execute(_SCHEMA)
+
+    def __connect(self):
+        return sqlite3.connect(self.database, timeout=self.timeout,
+                               isolation_level=None)
+
+    @contextlib.contextmanager
+    def __connection(self):
+        """ Use the connection holding the lock if any, a new one otherwise
+
+        """
+        db = getattr(self._local, 'db', None)
+        if db is not None:
+            yield db
+            return
+        with contextlib.closing(self.__connect()) as db:
+            yield db
+
+    @contextlib.contextmanager
+    def lock(self):
+        """ Hold the account's refresh lock, across threads and processes
+
+        """
+        db = self.__connect()
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            self._local.db = db
+            try:
+                yield
+            except Exception:
+                db.execute('ROLLBACK')
+                raise
+            else:
+                db.execute('COMMIT')
+            finally:
+                self._local.db = None
+        finally:
+            db.close()
+
+    def load(self):
+        """ Read the stored tokens
+
+        @return: dict holding 'access_token', 'refresh_token' and
+        'expires_at' (a timestamp or `None`), `None` if nothing is stored
+        """
+        with self.__connection() as db:
+            row = db.execute(
+                'SELECT access_token, refresh_token, expires_at '
+                'FROM tokens WHERE key = ?', (self.key,)).fetchone()
+        if row is None:
+            return None
+        return {'access_token': row[0], 'refresh_token': row[1],
+                'expires_at': row[2]}
+
+    def save(self, access_token, refresh_token, expires_at=None):
+        """ Store freshly acquired tokens
+
+        @param access_token: the new access token
+        @param refresh_token: the new refresh token
+        @param expires_at: timestamp at which `access_token` expires, if known
+        """
+        with self.__connection() as db:
+            db.execute(
+                'INSERT OR REPLACE INTO tokens '
+                '(key, access_token, refresh_token, expires_at) '
+                'VALUES (?, ?, ?, ?)',
+                (self.key, access_token, refresh_token, expires_at))
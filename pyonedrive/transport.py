@@ -0,0 +1,107 @@
+""" Pooled HTTP transport shared by the API clients
+
+"""
+
+import threading
+
+from compression import accept_encoding
+from lazy import LazyModule
+
+# loaded when the first session is created
+requests = LazyModule('requests')
+
+
+class Transport(object):
+    """ Keep-alive, connection pooling HTTP transport
+
+    A single `requests.Session` is lazily created on first use and shared by
+    every call going through this transport, so connections to a given host
+    are reused instead of paying a new TCP + TLS handshake each time.
+    Sessions' connection pools are thread-safe, a transport may therefore be
+    shared between threads (and between several clients).
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, max_retries=0,
+                 pool_block=False, session=None,
+                 accept_encoding=None):
+        """
+        @param pool_connections: number of hosts to keep a connection pool for
+        @param pool_maxsize: maximum number of connections kept alive per host,
+        should be at least the number of threads sharing the transport
+        @param max_retries: transport level retries (connection errors only),
+        either an int or a `urllib3.util.Retry` instance
+        @param pool_block: whether to wait for a free connection when the pool
+        is exhausted instead of opening a throw-away one
+        @param session: an already configured `requests.Session` to use
+        instead of creating one. It is used as is, no adapter is mounted on it.
+        @param accept_encoding: value of the Accept-Encoding header of the
+        created session, the compressions supported by this installation if
+        not provided, e.g. 'gzip, deflate'. Requests may still override it,
+        as downloads do.
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.max_retries = max_retries
+        self.pool_block = pool_block
+        self.accept_encoding = accept_encoding
+        self._session = session
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        """ The underlying session, created on first access
+
+        @rtype: requests.Session
+        """
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+
+    def _create_session(self):
+        """ Build a session with pooling adapters mounted for http and https
+
+        @rtype: requests.Session
+        """
+        session = requests.Session()
+        session.headers.update(
+            {'Accept-Encoding': self.accept_encoding or accept_encoding()})
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=self.max_retries,
+            pool_block=self.pool_block)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def request(self, method, url, **kwargs):
+        """ Send a request through the pooled session
+
+        @param method: HTTP verb
+        @param url: full URL of the resource
+        @param kwargs: any extra argument supported by `requests.request`
+        @rtype: requests.Response
+        @return: server's response
+        """
+        return self.session.request(method, url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """ Send a POST request through the pooled session
+
+        @param url: full URL of the resource
+        @rtype: requests.Response
+        @return: server's response
+        """
+        return self.session.post(url, **kwargs)
+
+    def close(self):
+        """ Close every pooled connection
+
+        A new session is created if the transport is used afterwards.
+        """
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
@@ -0,0 +1,180 @@
+""" Chunked, resumable uploads through v1.0 API upload sessions
+
+"""
+
+import logging
+import os
+import threading
+from multiprocessing.pool import ThreadPool
+
+LOGGER = logging.getLogger(__name__)
+
+# fragments must be a multiple of 320 KiB
+FRAGMENT_UNIT = 320 * 1024
+DEFAULT_FRAGMENT_SIZE = 32 * FRAGMENT_UNIT
+
+
+def parse_ranges(ranges, size):
+    """ Convert `nextExpectedRanges` values into (start, end) tuples
+
+    @param ranges: list of 'start-end' or 'start-' strings
+    @param size: file's size in bytes
+    @return: list of (first, last) included offsets
+    """
+    parsed = []
+    for byte_range in ranges:
+        start, _, end = byte_range.partition('-')
+        parsed.append((int(start), int(end) if end else size - 1))
+    return parsed
+
+
+class UploadSession(object):
+    """ Upload a file's content to an upload session's URL
+
+    The file is read fragment by fragment, at most `max_in_flight` fragments
+    being in memory and in flight at the same time. After a failure, the
+    ranges still expected by the server are asked for and only those are sent
+    again.
+    """
+
+    def __init__(self, send, upload_url, source, size=None,
+                 fragment_size=DEFAULT_FRAGMENT_SIZE, max_in_flight=1,
+                 max_attempts=3, next_expected_ranges=None):
+        """
+        @param send: function sending a request without a token, as upload
+        URLs are pre-authenticated. It is called with the HTTP verb, the URL
+        and optional `headers` and `data`, and returns the response.
+        @param upload_url: the session's URL
+        @param source: path of the file to upload, or a seekable file object
+        opened in binary mode
+        @param size: number of bytes to upload, the source's size if not
+        provided
+        @param fragment_size: size in bytes of the fragments, rounded down to
+        a multiple of 320 KiB
+        @param max_in_flight: number of fragments sent concurrently. OneDrive
+        may require fragments to be received in order, keep it to 1 unless
+        out of order uploads are known to be accepted
+        @param max_attempts: number of consecutive failed rounds before giving
+        up
+        @param next_expected_ranges: ranges to send, as returned upon session
+        creation. The session's status is read if not provided
+        """
+        self.send = send
+        self.upload_url = upload_url
+        self.source = source
+        self.fragment_size = max(fragment_size // FRAGMENT_UNIT, 1) * \
+            FRAGMENT_UNIT
+        self.max_in_flight = max_in_flight
+        self.max_attempts = max_attempts
+        self.next_expected_ranges = next_expected_ranges
+        self._lock = threading.Lock()
+        self._file = None
+        self.size = size
+
+    def status(self):
+        """ Retrieve the session's status
+
+        @raises: `requests.exception.HTTPError` upon error
+        @return: the session, including its `nextExpectedRanges`
+        @rtype: dict
+        """
+        response = self.send('get', self.upload_url)
+        response.raise_for_status()
+        return response.json()
+
+    def cancel(self):
+        """ Cancel the session, uploaded fragments are discarded
+
+        @rtype: Response
+        @return: API's response
+        """
+        return self.send('delete', self.upload_url)
+
+    def run(self):
+        """ Send the expected fragments until the upload completes
+
+        @raises: the last error if `max_attempts` consecutive rounds failed
+        @return: the created item
+        @rtype: dict
+        """
+        owned = not hasattr(self.source, 'read')
+        self._file = open(self.source, 'rb') if owned else self.source
+        try:
+            if self.size is None:
+                self._file.seek(0, os.SEEK_END)
+                self.size = self._file.tell()
+            ranges = self.next_expected_ranges
+            failures = 0
+            while True:
+                if ranges is None:
+                    ranges = self.status().get('nextExpectedRanges', [])
+                try:
+                    item = self.__send(parse_ranges(ranges, self.size))
+                    failures = 0
+                except IOError as exc:
+                    failures += 1
+                    if failures >= self.max_attempts:
+                        raise
+                    LOGGER.warning("Upload round failed (attempt %d): %s",
+                                   failures, exc)
+                    item = None
+                if item is not None:
+                    return item
+                if not ranges and not failures:
+                    raise IOError("Upload session expects no more bytes "
+                                  "but did not complete")
+                ranges = None
+        finally:
+            if owned:
+                self._file.close()
+
+    def __fragments(self, ranges):
+        for start, end in ranges:
+            while start <= end:
+                last = min(start + self.fragment_size, end + 1) - 1
+                yield start, last
+                start = last + 1
+
+    def __send(self, ranges):
+        """ Send the fragments covering the given ranges
+
+        @return: the created item if the upload completed, `None` otherwise
+        """
+        fragments = list(self.__fragments(ranges))
+        if self.max_in_flight <= 1 or len(fragments) <= 1:
+            for fragment in fragments:
+                item = self.__put_fragment(fragment)
+                if item is not None:
+                    return item
+            return None
+        pool = ThreadPool(min(self.max_in_flight, len(fragments)))
+        try:
+            completed = None
+            for item in pool.imap_unordered(self.__put_fragment, fragments):
+                if item is not None:
+                    completed = item
+            return completed
+        finally:
+            pool.terminate()
+
+    def __read(self, start, length):
+        with self._lock:
+            self._file.seek(start)
+            return self._file.read(length)
+
+    def __put_fragment(self, fragment):
+        start, end = fragment
+        data = self.__read(start, end - start + 1)
+        if len(data) != end - start + 1:
+            raise IOError("Source is shorter than announced")
+        response = self.send(
+            'put', self.upload_url, data=data,
+            headers={
+                'Content-Length': str(len(data)),
+                'Content-Range': 'bytes {0}-{1}/{2}'.format(start, end,
+                                                            self.size)
+            })
+        response.raise_for_status()
+        if response.status_code in (200, 201):
+            return response.json()
+        return None
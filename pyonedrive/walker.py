@@ -0,0 +1,112 @@
+""" Parallel recursive listing of a drive tree
+
+"""
+
+import posixpath
+from multiprocessing.pool import ThreadPool
+
+from projection import with_required
+
+try:
+    import Queue as queue
+except ImportError:  # Python 3
+    import queue
+
+# v5.0 API items expose a `type` instead of facets
+_FOLDER_TYPES = frozenset(['folder', 'album'])
+_FILE_TYPES = frozenset(['file', 'photo', 'video', 'audio', 'notebook'])
+_TYPE_FACETS = {
+    'album': 'folder',
+    'photo': 'image',
+}
+
+
+def is_folder(item):
+    """ Tell whether an item can be listed
+
+    @param item: item's representation
+    @rtype: bool
+    """
+    return 'folder' in item or item.get('type') in _FOLDER_TYPES
+
+
+def has_facet(item, facet):
+    """ Tell whether an item exposes the given facet
+
+    Works with both v1.0 representations, holding facets as keys, and v5.0
+    ones whose `type` is mapped to the corresponding facet.
+
+    @param item: item's representation
+    @param facet: one of the `OneDrive.*_FACET` values
+    @rtype: bool
+    """
+    if facet in item:
+        return True
+    item_type = item.get('type')
+    return item_type == facet or _TYPE_FACETS.get(item_type) == facet or \
+        (facet == 'file' and item_type in _FILE_TYPES)
+
+
+def walk_tree(client, folder_id, path='/', max_depth=None, facet=None,
+              max_in_flight=8, count=100, on_error=None, fields=None):
+    """ Browse a folder and its sub-folders concurrently
+
+    Folders are listed by a pool of `max_in_flight` workers, a folder's items
+    are yielded as soon as it has been fully listed, so the traversal order is
+    not deterministic.
+
+    @param client: the `OneDrive` client to list folders with
+    @param folder_id: ID of the folder to start from
+    @param path: path of the starting folder, used to build yielded paths
+    @param max_depth: number of levels to list, `None` for no limit. A depth
+    of 1 only lists the starting folder's content
+    @param facet: only yield items exposing this facet, sub-folders are
+    browsed regardless of it
+    @param max_in_flight: number of folders listed concurrently
+    @param count: number of items requested per page
+    @param on_error: function called with the folder's ID and the exception
+    when a folder cannot be listed, the walk then goes on. If not provided the
+    exception is raised.
+    @param fields: if provided, items are trimmed down to these keys, plus the
+    ones needed to browse the tree and filter items
+    @return: A generator of (parent's path, item) tuples
+    """
+    options = {'count': count}
+    if fields is not None:
+        options['fields'] = with_required(
+            fields, ('id', 'name', 'type', 'folder') +
+            ((facet,) if facet else ()))
+    results = queue.Queue()
+    pool = ThreadPool(max_in_flight)
+
+    def list_folder(folder, folder_path, depth):
+        try:
+            items = list(client.get_folder_content_generator(folder,
+                                                             **options))
+            results.put((folder, folder_path, depth, items, None))
+        except Exception as exc:
+            results.put((folder, folder_path, depth, None, exc))
+
+    pool.apply_async(list_folder, (folder_id, path, 1))
+    pending = 1
+    try:
+        while pending:
+            folder, folder_path, depth, items, error = results.get()
+            pending -= 1
+            if error is not None:
+                if on_error is None:
+                    raise error
+                on_error(folder, error)
+                continue
+            for item in items:
+                if is_folder(item) and (max_depth is None or
+                                        depth < max_depth):
+                    pool.apply_async(list_folder, (
+                        item['id'],
+                        posixpath.join(folder_path, item['name']),
+                        depth + 1))
+                    pending += 1
+                if facet is None or has_facet(item, facet):
+                    yield folder_path, item
+    finally:
+        pool.terminate()
@@ -2,8 +2,7 @@
 
 """
 
-from distutils.core import setup
-from setuptools import find_packages
+from setuptools import find_packages, setup
 
 NAME = 'pyonedrive'
 GITHUB_ORG_URL = "https://github.com/cogniteev"
@@ -17,7 +16,7 @@ setup(
     url=GITHUB_ORG_URL + '/' + NAME,
     download_url="{0}/{1}/tarball/v{2}".format(GITHUB_ORG_URL, NAME, version),
     description='Onedrive REST api client',
-    packages=find_packages(exclude=['tests']),
+    packages=find_packages(exclude=['tests', 'benchmarks']),
     license='Apache license version 2.0',
     platforms='OS Independent',
     zip_safe=False,
@@ -31,5 +30,9 @@ setup(
         'Environment :: Web Environment',
         'Development Status :: 4 - Beta'
     ],
-    install_requires='requests>=2.2.1'
+    install_requires='requests>=2.2.1',
+    extras_require={
+        # vectorized QuickXorHash in pyonedrive.hashing
+        'numpy': ['numpy>=1.7,<1.17'],
+    }
 )
@@ -1 +1,38 @@
+""" Helpers shared by the tests
 
+"""
+
+import json
+from mock import Mock
+import requests
+
+
+def raw_response(body, status_code=200, headers=None):
+    """ Build a response whose body is already read
+
+    @param body: the response's body, as bytes
+    @param status_code: the response's HTTP status
+    @param headers: the response's headers
+    """
+    res = requests.Response()
+    res.status_code = status_code
+    res._content = body
+    res._content_consumed = True
+    res.raw = Mock()
+    res.headers.update(headers or {})
+    return res
+
+
+def json_response(content, status_code=200, etag=None, headers=None):
+    """ Build a JSON response whose body is already read
+
+    @param content: the object sent as JSON
+    @param status_code: the response's HTTP status
+    @param etag: value of the ETag header, if any
+    @param headers: the response's other headers
+    """
+    headers = dict(headers or {})
+    if etag:
+        headers['ETag'] = etag
+    return raw_response(json.dumps(content).encode('utf-8'), status_code,
+                        headers)
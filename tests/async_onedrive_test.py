@@ -0,0 +1,86 @@
+""" Testing the concurrent client facade
+
+"""
+
+import unittest
+from mock import Mock
+from pyonedrive import AsyncOneDrive, OneDrive, Transport
+import requests
+from tests import json_response
+
+
+class AsyncOneDriveTestCase(unittest.TestCase):
+    def setUp(self):
+        self.session = Mock()
+        client = OneDrive('token', 'r_token', 'id', 'secret',
+                          transport=Transport(session=self.session))
+        self.client = AsyncOneDrive(client, max_in_flight=4)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_method(self):
+        self.session.request.return_value = json_response({'metadata': 'OK'})
+        result = self.client.get_user_metadata()
+        self.assertEquals(result.get(1).json(), {'metadata': 'OK'})
+        self.session.request.assert_called_once_with(
+            'get',
+            'https://apis.live.net/v5.0/me',
+            params={'access_token': 'token'},
+            data=None,
+            headers=None
+        )
+
+    def test_method_error(self):
+        self.session.request.side_effect = requests.ConnectionError()
+        result = self.client.get_root_folder()
+        with self.assertRaises(requests.ConnectionError):
+            result.get(1)
+
+    def test_map(self):
+        def request(method, url, **kwargs):
+            return json_response({'link': url})
+        self.session.request.side_effect = request
+        results = self.client.map('get_shared_read_link', [1, 2, 3])
+        self.assertEquals(len(results), 3)
+        for item_id, result in zip([1, 2, 3], results):
+            self.assertEquals(
+                result.get(1).json(),
+                {'link': 'https://apis.live.net/v5.0/{0}/shared_read_link'
+                 .format(item_id)})
+
+    def test_generator(self):
+        self.session.request.side_effect = [
+            json_response({'data': ['a', 'b'],
+                           'paging': {'next': 'next_url'}}),
+            json_response({'data': ['c'], 'paging': {}})
+        ]
+        items = list(self.client.get_folder_content_generator(1))
+        self.assertEquals(items, ['a', 'b', 'c'])
+
+    def test_generator_error(self):
+        self.session.request.return_value = json_response({}, 500)
+        with self.assertRaises(requests.HTTPError):
+            list(self.client.get_comments_generator(1))
+
+    def test_generator_close(self):
+        self.session.request.return_value = json_response(
+            {'data': ['a'], 'paging': {'next': 'next_url'}})
+        with self.client.get_tags_generator(1) as tags:
+            self.assertEquals(next(tags), 'a')
+        self.assertRaises(StopIteration, next, tags)
+
+    def test_streamed_pages(self):
+        self.session.request.side_effect = [
+            json_response({'value': ['a', 'b'], '@changes.token': 't1',
+                           '@changes.hasMoreChanges': True}),
+            json_response({'value': ['c'], '@changes.token': 't2'})
+        ]
+        pages = self.client.get_view_changes_page_generator('root', None,
+                                                            True)
+        self.assertEquals([list(page['value']) for page in pages],
+                          [['a', 'b'], ['c']])
+
+    def test_attribute(self):
+        self.assertEquals(self.client.token, 'token')
+        self.assertEquals(self.client.FILE_FACET, 'file')
@@ -37,10 +37,11 @@ class AuthTestCase(unittest.TestCase):
     def test_exchange_code(self):
         res = requests.Response()
         res.status_code = 200
-        with mock.patch('pyonedrive.live_auth.requests') as mock_requests:
-            mock_requests.post.return_value = res
+        with mock.patch('pyonedrive.transport.requests') as mock_requests:
+            session = mock_requests.Session.return_value
+            session.post.return_value = res
             r = self.auth.exchange_oauth_code_for_token('my_code')
-            mock_requests.post.assert_called_once_with(
+            session.post.assert_called_once_with(
                 'https://login.live.com/oauth20_token.srf',
                 data={
                     'code': 'my_code',
@@ -0,0 +1,104 @@
+""" Testing JSON batching
+
+"""
+
+import json
+import threading
+import unittest
+from mock import Mock
+from pyonedrive import OneDrive, Transport
+import requests
+from tests import json_response
+
+
+def batch_server(method, url, data=None, **kwargs):
+    """ Answer each sub-request with its URL, failing '/drive/items/bad'
+
+    """
+    responses = []
+    for request in json.loads(data)['requests']:
+        if request['url'] == '/drive/items/bad':
+            responses.append({'id': request['id'], 'status': 404,
+                              'body': {'error': {'code': 'itemNotFound'}}})
+        else:
+            responses.append({'id': request['id'], 'status': 200,
+                              'body': {'url': request['url']}})
+    return json_response({'responses': list(reversed(responses))})
+
+
+class BatchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.session = Mock()
+        self.client = OneDrive('token', 'r_token', 'id', 'secret',
+                               transport=Transport(session=self.session))
+
+    def test_batch(self):
+        self.session.request.side_effect = batch_server
+        batch = self.client.batch()
+        item = batch.add_item('A!1')
+        bad = batch.add_item('bad')
+        link = batch.add_link('A!2', 'edit', request_id='link')
+        responses = batch.execute()
+
+        self.assertEquals(list(responses.keys()), [item, bad, 'link'])
+        self.assertEquals(responses[item].json(),
+                          {'url': '/drive/items/A!1'})
+        self.assertTrue(responses[link].ok)
+        self.assertFalse(responses[bad].ok)
+        self.assertRaises(requests.HTTPError, responses[bad].raise_for_status)
+
+        args, kwargs = self.session.request.call_args
+        self.assertEquals(args, ('post',
+                                 'https://api.onedrive.com/v1.0/$batch'))
+        self.assertEquals(kwargs['headers'],
+                          {'Content-Type': 'application/json',
+                           'Authorization': 'Bearer token'})
+        self.assertEquals(json.loads(kwargs['data'])['requests'][2], {
+            'id': 'link',
+            'method': 'POST',
+            'url': '/drive/items/A!2/action.createLink',
+            'body': {'type': 'edit'},
+            'headers': {'Content-Type': 'application/json'}
+        })
+
+    def test_request_ids(self):
+        batch = self.client.batch()
+        self.assertEquals(batch.add_item('A!1', request_id='2'), '2')
+        self.assertEquals(batch.add_item('A!2'), '3')
+        self.assertEquals(batch.add_item('A!3'), '4')
+        self.assertRaises(ValueError, batch.add_item, 'A!4', request_id='3')
+        self.assertEquals(len(batch), 3)
+
+    def test_split(self):
+        sizes = []
+        lock = threading.Lock()
+
+        def request(method, url, data=None, **kwargs):
+            with lock:
+                sizes.append(len(json.loads(data)['requests']))
+            return batch_server(method, url, data=data, **kwargs)
+        self.session.request.side_effect = request
+        batch = self.client.batch(max_batch_size=20, max_in_flight=3)
+        ids = [batch.add_item(i) for i in range(45)]
+        responses = batch.execute()
+        self.assertEquals(sorted(sizes), [5, 20, 20])
+        self.assertEquals(list(responses.keys()), ids)
+        self.assertTrue(all(response.ok for response in responses.values()))
+
+    def test_failed_batch(self):
+        calls = []
+
+        def flaky_server(method, url, data=None, **kwargs):
+            calls.append(data)
+            if len(calls) == 2:
+                raise requests.ConnectionError('reset')
+            return batch_server(method, url, data=data, **kwargs)
+        self.session.request.side_effect = flaky_server
+        batch = self.client.batch(max_batch_size=2, max_in_flight=1)
+        for i in range(5):
+            batch.add_thumbnails(i)
+        responses = batch.execute()
+        self.assertEquals([response.ok for response in responses.values()],
+                          [True, True, False, False, True])
+        self.assertRaises(requests.ConnectionError,
+                          responses['3'].raise_for_status)
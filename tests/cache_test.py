@@ -0,0 +1,108 @@
+""" Testing the response cache
+
+"""
+
+import unittest
+from mock import Mock
+from pyonedrive import LRUCache, OneDrive, Transport
+from tests import json_response
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class LRUCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.cache = LRUCache(max_entries=2, ttl=10, clock=self.clock)
+
+    def test_eviction(self):
+        self.cache.set('a', json_response({}))
+        self.cache.set('b', json_response({}))
+        self.assertIsNotNone(self.cache.get('a'))
+        self.cache.set('c', json_response({}))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertEquals(self.cache.stats(), {
+            'entries': 2,
+            'hits': 2,
+            'misses': 1,
+            'revalidations': 0,
+            'evictions': 1
+        })
+
+    def test_freshness(self):
+        self.cache.set('a', json_response({}, etag='"1"'))
+        entry = self.cache.get('a')
+        self.assertTrue(self.cache.is_fresh(entry))
+        self.assertEquals(entry.etag, '"1"')
+        self.clock.now += 10
+        self.assertFalse(self.cache.is_fresh(entry))
+        self.cache.refresh('a')
+        self.assertTrue(self.cache.is_fresh(entry))
+        self.assertEquals(self.cache.revalidations, 1)
+
+
+class CachedClientTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.cache = LRUCache(ttl=10, clock=self.clock)
+        self.session = Mock()
+        self.client = OneDrive('token', 'r_token', 'id', 'secret',
+                               transport=Transport(session=self.session),
+                               cache=self.cache)
+
+    def test_fresh_response(self):
+        self.session.request.return_value = json_response({'quota': 1})
+        self.client.get_usage_quota()
+        r = self.client.get_usage_quota()
+        self.assertEquals(r.json(), {'quota': 1})
+        self.assertEquals(self.session.request.call_count, 1)
+
+    def test_revalidation(self):
+        self.session.request.side_effect = [
+            json_response({'id': 'root'}, etag='"v1"'),
+            json_response(None, 304),
+            json_response({'id': 'root', 'name': 'new'}, etag='"v2"'),
+        ]
+        self.client.get_drive_root()
+        self.clock.now += 11
+        self.assertEquals(self.client.get_drive_root(), {'id': 'root'})
+        self.session.request.assert_called_with(
+            'get',
+            'https://api.onedrive.com/v1.0/drive/root',
+            params={'access_token': 'token'},
+            data=None,
+            headers={'If-None-Match': '"v1"'}
+        )
+        self.clock.now += 11
+        self.assertEquals(self.client.get_drive_root(),
+                          {'id': 'root', 'name': 'new'})
+        self.assertEquals(self.cache.revalidations, 1)
+
+    def test_parameters(self):
+        self.session.request.return_value = json_response({})
+        self.client.get_folder_content(1)
+        self.client.get_folder_content(1, offset=20)
+        self.client.get_folder_content(1)
+        self.assertEquals(self.session.request.call_count, 2)
+
+    def test_uncached_requests(self):
+        self.session.request.return_value = json_response({})
+        self.client.delete_item(1)
+        self.client.delete_item(1)
+        self.client.download_file(1)
+        self.client.download_file(1)
+        self.assertEquals(self.session.request.call_count, 4)
+        self.assertEquals(len(self.cache), 0)
+
+    def test_errors_not_cached(self):
+        self.session.request.return_value = json_response({}, 404)
+        self.client.get_root_folder()
+        self.client.get_root_folder()
+        self.assertEquals(self.session.request.call_count, 2)
@@ -0,0 +1,108 @@
+""" Testing the coalescing of identical concurrent requests
+
+"""
+
+import threading
+import time
+import unittest
+from mock import Mock
+from pyonedrive import OneDrive, Transport
+from pyonedrive.coalesce import SingleFlight
+import requests
+from tests import json_response
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError('timed out')
+        time.sleep(0.001)
+
+
+class CoalescingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.session = Mock()
+        self.client = OneDrive('token', 'r_token', 'id', 'secret',
+                               transport=Transport(session=self.session),
+                               coalesce=True)
+        self.release = threading.Event()
+        self.sent = []
+        self.lock = threading.Lock()
+
+        def request(method, url, params=None, **kwargs):
+            with self.lock:
+                self.sent.append((method, url))
+            self.release.wait()
+            if '/bad/' in url:
+                raise requests.ConnectionError('reset')
+            return json_response({'url': url})
+        self.session.request.side_effect = request
+
+    def concurrently(self, calls, followers):
+        """ Run calls in threads, releasing the server once `followers`
+        callers joined a request in flight
+
+        """
+        results = [None] * len(calls)
+
+        def run(index, call):
+            try:
+                results[index] = call()
+            except Exception as exc:
+                results[index] = exc
+        threads = [threading.Thread(target=run, args=(index, call))
+                   for index, call in enumerate(calls)]
+        for thread in threads:
+            thread.start()
+        wait_for(lambda: self.client.single_flight.coalesced >= followers)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_shared_response(self):
+        results = self.concurrently([self.client.get_root_folder] * 5, 4)
+        self.assertEquals(self.sent,
+                          [('get', 'https://apis.live.net/v5.0/me/skydrive')])
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEquals(self.client.single_flight.stats(),
+                          {'in_flight': 0, 'coalesced': 4})
+
+    def test_distinct_requests(self):
+        results = self.concurrently(
+            [lambda: self.client.get_folder_content(1),
+             lambda: self.client.get_folder_content(1),
+             lambda: self.client.get_folder_content(1, offset=20),
+             lambda: self.client.get_shared_read_link(1)], 1)
+        self.assertEquals(len(self.sent), 3)
+        self.assertTrue(results[0] is results[1])
+        self.assertFalse(results[0] is results[2])
+
+    def test_shared_error(self):
+        results = self.concurrently(
+            [lambda: self.client.get_shared_read_link('bad')] * 3, 2)
+        self.assertEquals(len(self.sent), 1)
+        self.assertTrue(all(isinstance(result, requests.ConnectionError)
+                            for result in results))
+
+    def test_sequential_requests(self):
+        self.release.set()
+        self.client.get_root_folder()
+        self.client.get_root_folder()
+        self.assertEquals(len(self.sent), 2)
+
+    def test_not_coalesced(self):
+        self.release.set()
+        self.client.delete_item(1)
+        self.client.delete_item(1)
+        self.assertEquals(len(self.sent), 2)
+        self.assertEquals(self.client.single_flight.coalesced, 0)
+
+
+class SingleFlightTestCase(unittest.TestCase):
+    def test_reentrant_keys(self):
+        flight = SingleFlight()
+        self.assertEquals(
+            flight.do('a', lambda: flight.do('b', lambda: 1) + 1), 2)
+        self.assertEquals(len(flight), 0)
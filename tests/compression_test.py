@@ -0,0 +1,110 @@
+""" Testing content encoding negotiation and transfer accounting
+
+"""
+
+import gzip
+import io
+import json
+import unittest
+from mock import Mock
+from pyonedrive import MetricsCollector, OneDrive, Transport
+from pyonedrive.compression import (accept_encoding, supported_encodings,
+                                    transfer_sizes)
+from benchmarks.server import (BIG_FOLDER_ID, LARGE_FILE_ID, SimulatedDrive,
+                               SimulatedServer)
+import requests
+
+try:
+    from requests.packages.urllib3.response import HTTPResponse
+except ImportError:
+    from urllib3.response import HTTPResponse
+
+
+def gzipped(content):
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb') as compressed:
+        compressed.write(content)
+    return buf.getvalue()
+
+
+def raw_response(body, headers):
+    res = requests.Response()
+    res.status_code = 200
+    res.raw = HTTPResponse(body=io.BytesIO(body), headers=headers,
+                           preload_content=False)
+    res.headers = requests.structures.CaseInsensitiveDict(headers)
+    return res
+
+
+PAGE = json.dumps({'data': [{'id': 'file.{0}'.format(i), 'name': 'a.txt'}
+                            for i in range(100)]}).encode('utf-8')
+
+
+class CompressionTestCase(unittest.TestCase):
+    def test_supported_encodings(self):
+        encodings = supported_encodings()
+        self.assertTrue('gzip' in encodings and 'deflate' in encodings)
+        self.assertEquals(accept_encoding(), ', '.join(encodings))
+
+    def test_transport_session(self):
+        session = Transport()._create_session()
+        self.assertEquals(session.headers['Accept-Encoding'],
+                          accept_encoding())
+        session = Transport(accept_encoding='identity')._create_session()
+        self.assertEquals(session.headers['Accept-Encoding'], 'identity')
+
+    def test_gzipped_sizes(self):
+        body = gzipped(PAGE)
+        res = raw_response(body, {'Content-Encoding': 'gzip'})
+        self.assertEquals(transfer_sizes(res, False), (len(body), len(PAGE)))
+        self.assertEquals(res.json()['data'][0]['id'], 'file.0')
+
+    def test_identity_sizes(self):
+        res = raw_response(PAGE, {'Content-Length': str(len(PAGE))})
+        self.assertEquals(transfer_sizes(res, True), (len(PAGE), len(PAGE)))
+        self.assertEquals(transfer_sizes(res, False), (len(PAGE), len(PAGE)))
+
+    def test_streamed_gzipped_sizes(self):
+        res = raw_response(b'', {'Content-Encoding': 'gzip',
+                                 'Content-Length': '120'})
+        self.assertEquals(transfer_sizes(res, True), (120, None))
+
+    def test_download_identity(self):
+        session = Mock()
+        session.request.return_value = raw_response(PAGE, {})
+        client = OneDrive('token', 'r_token', 'id', 'secret',
+                          transport=Transport(session=session))
+        client.download_file('file.1')
+        headers = session.request.call_args[1]['headers']
+        self.assertEquals(headers, {'Accept-Encoding': 'identity'})
+
+
+class CompressedServerTestCase(unittest.TestCase):
+    def setUp(self):
+        drive = SimulatedDrive(big_folder_items=300, tree_folders=1,
+                               tree_depth=1, tree_files=1,
+                               large_file_size=100000)
+        self.server = SimulatedServer(drive, compress=True).start()
+        self.metrics = MetricsCollector()
+        self.client = self.server.client(hooks=self.metrics.hooks())
+
+    def tearDown(self):
+        self.client.transport.close()
+        self.server.stop()
+
+    def test_listing(self):
+        items = list(self.client.get_folder_content_generator(BIG_FOLDER_ID,
+                                                              count=100))
+        self.assertEquals(len(items), 300)
+        files = self.metrics.snapshot()['endpoints']['GET /v5.0/{id}/files']
+        self.assertEquals(files['bytes_received'], self.server.bytes_sent)
+        self.assertTrue(files['bytes_received'] * 3 < files['bytes_decoded'])
+
+    def test_download(self):
+        response = self.client.download_file(LARGE_FILE_ID)
+        self.assertEquals(len(response.content), 100000)
+        self.assertEquals(response.headers.get('Content-Encoding'), None)
+        content = self.metrics.snapshot()['endpoints'][
+            'GET /v5.0/{id}/content']
+        self.assertEquals(content['bytes_received'], 100000)
+        self.assertEquals(content['bytes_decoded'], 100000)
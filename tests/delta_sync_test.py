@@ -0,0 +1,124 @@
+""" Testing the SQLite delta sync store
+
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from mock import Mock
+from pyonedrive import DeltaSyncStore, OneDrive, Transport
+import requests
+from tests import json_response
+
+
+def item(item_id, name, parent_id=None, folder=False, **facets):
+    item = {'id': item_id, 'name': name}
+    if parent_id:
+        item['parentReference'] = {'id': parent_id}
+    if folder:
+        item['folder'] = {}
+    item.update(facets)
+    return item
+
+
+FIRST_SYNC = [
+    {'value': [item('root', 'root', folder=True),
+               item('A', 'Documents', 'root', folder=True),
+               item('B', 'b.txt', 'A', size=3)],
+     '@changes.token': 't1', '@changes.hasMoreChanges': True},
+    {'value': [item('C', 'c.txt', 'root')],
+     '@changes.token': 't2'},
+]
+
+
+class DeltaSyncStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'index.db')
+        self.store = DeltaSyncStore(self.path)
+        self.session = Mock()
+        self.client = OneDrive('token', 'r_token', 'id', 'secret',
+                               transport=Transport(session=self.session))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def sync(self, pages):
+        self.session.request.side_effect = [json_response(page)
+                                            for page in pages]
+        return self.store.sync(self.client, {'id': 'root'})
+
+    def test_sync(self):
+        self.assertEquals(self.sync(FIRST_SYNC), 4)
+        self.assertEquals(len(self.store), 4)
+        self.assertEquals(self.store.change_token, 't2')
+        self.assertEquals([child['id'] for child in
+                           self.store.children('root')], ['A', 'C'])
+        self.assertEquals(self.store.get('B')['size'], 3)
+        self.assertEquals(self.store.path('B'), '/Documents/b.txt')
+        self.assertIsNone(self.store.get('unknown'))
+
+    def test_resume_from_checkpoint(self):
+        self.session.request.side_effect = [
+            json_response(FIRST_SYNC[0]), json_response({}, 503)]
+        with self.assertRaises(requests.HTTPError):
+            self.store.sync(self.client, 'root')
+        self.store.close()
+
+        self.store = DeltaSyncStore(self.path)
+        self.assertEquals(self.store.change_token, 't1')
+        tokens = []
+
+        def request(method, url, params=None, **kwargs):
+            tokens.append(params.get('token'))
+            return json_response(FIRST_SYNC[1])
+        self.session.request.side_effect = request
+        self.store.sync(self.client, 'root')
+        self.assertEquals(tokens, ['t1'])
+        self.assertEquals(len(self.store), 4)
+
+    def test_delete(self):
+        self.sync(FIRST_SYNC)
+        self.sync([{'value': [item('A', 'Documents', 'root', deleted={})],
+                    '@changes.token': 't3'}])
+        self.assertEquals(len(self.store), 2)
+        self.assertIsNone(self.store.get('B'))
+        self.assertEquals(self.store.change_token, 't3')
+
+    def test_resync(self):
+        self.sync(FIRST_SYNC)
+        self.sync([{'@changes.resync': 'invalid token', 'value': []},
+                   {'value': [item('root', 'root', folder=True),
+                              item('D', 'd.txt', 'root')],
+                    '@changes.token': 't9'}])
+        self.assertEquals(len(self.store), 2)
+        self.assertEquals(self.store.change_token, 't9')
+        self.assertNotIn('token',
+                         self.session.request.call_args[1]['params'])
+        self.assertTrue(self.store.resynced)
+        self.store.close()
+        self.store = DeltaSyncStore(self.path)
+        self.assertTrue(self.store.resynced)
+        self.store.acknowledge_resync()
+        self.assertFalse(self.store.resynced)
+
+    def test_failed(self):
+        self.store.apply_page(FIRST_SYNC[0], failed=['B'])
+        self.store.apply_page(FIRST_SYNC[1], failed=['C'])
+        self.assertEquals(self.store.failed, ['B', 'C'])
+        self.store.close()
+        self.store = DeltaSyncStore(self.path)
+        self.assertEquals(self.store.failed, ['B', 'C'])
+
+        # applied again, deleted or resolved items are no longer failed
+        self.store.apply_page({'value': [item('C', 'c.txt', 'root')],
+                               '@changes.token': 't3'})
+        self.assertEquals(self.store.failed, ['B'])
+        self.store.apply_page({'value': [item('A', 'Documents', 'root',
+                                              deleted={})],
+                               '@changes.token': 't4'}, failed=['root'])
+        self.assertEquals(self.store.failed, ['root'])
+        self.store.resolve_failed(['root'])
+        self.assertEquals(self.store.failed, [])
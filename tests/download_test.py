@@ -0,0 +1,235 @@
+""" Testing ranged downloads
+
+"""
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from mock import Mock
+from pyonedrive import OneDrive, Transport
+from pyonedrive.download import ContentChanged, RangedDownload
+import requests
+from tests import json_response, raw_response
+
+CONTENT = bytes(bytearray(i % 256 for i in range(1000)))
+
+
+class FakeRanges(object):
+    """ Serve ranges of CONTENT, failing some of them
+
+    """
+    def __init__(self, failures=None):
+        self.failures = failures or {}
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, start, end):
+        with self.lock:
+            self.calls.append((start, end))
+            if self.failures.get(start, 0):
+                self.failures[start] -= 1
+                raise requests.ConnectionError('reset')
+        return raw_response(CONTENT[start:end + 1], 206)
+
+
+class SlowRange(object):
+    """ Range response sending its bytes by small chunks
+
+    """
+    status_code = 206
+
+    def __init__(self, start, end):
+        self.content = CONTENT[start:end + 1]
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for offset in range(0, len(self.content), 10):
+            time.sleep(0.01)
+            yield self.content[offset:offset + 10]
+
+    def close(self):
+        pass
+
+
+class Destination(io.BytesIO):
+    """ File object counting the writes made once the download returned
+
+    """
+    returned = False
+    late_writes = 0
+
+    def write(self, data):
+        if self.returned:
+            self.late_writes += 1
+        return io.BytesIO.write(self, data)
+
+
+class RangedDownloadTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'file')
+        self.state_path = self.path + '.state'
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self):
+        with open(self.path, 'rb') as downloaded:
+            return downloaded.read()
+
+    def test_download(self):
+        fetch = FakeRanges()
+        download = RangedDownload(fetch, len(CONTENT), self.path,
+                                  segment_size=100, max_in_flight=4,
+                                  state_path=self.state_path)
+        self.assertEquals(download.run(), len(CONTENT))
+        self.assertEquals(self.read(), CONTENT)
+        self.assertEquals(len(fetch.calls), 10)
+        self.assertIn((900, 999), fetch.calls)
+        self.assertFalse(os.path.exists(self.state_path))
+
+    def test_file_object(self):
+        destination = io.BytesIO()
+        RangedDownload(FakeRanges(), len(CONTENT), destination,
+                       segment_size=300).run()
+        self.assertEquals(destination.getvalue(), CONTENT)
+
+    def test_retry_segment(self):
+        fetch = FakeRanges({200: 2})
+        RangedDownload(fetch, len(CONTENT), self.path, segment_size=100,
+                       max_attempts=3).run()
+        self.assertEquals(self.read(), CONTENT)
+        self.assertEquals(fetch.calls.count((200, 299)), 3)
+
+    def test_retry_partial_segment(self):
+        fetch = FakeRanges()
+        truncated = {200: raw_response(CONTENT[200:250], 206)}
+
+        def partial(start, end):
+            return truncated.pop(start, None) or fetch(start, end)
+        download = RangedDownload(partial, len(CONTENT), self.path,
+                                  segment_size=100, max_attempts=2)
+        self.assertEquals(download.run(), len(CONTENT))
+        self.assertEquals(self.read(), CONTENT)
+
+    def test_stop_on_failure(self):
+        def fetch(start, end):
+            if start == 0:
+                time.sleep(0.02)
+                raise requests.ConnectionError('reset')
+            return SlowRange(start, end)
+        destination = Destination()
+        download = RangedDownload(fetch, len(CONTENT), destination,
+                                  segment_size=100, max_in_flight=4,
+                                  max_attempts=1)
+        with self.assertRaises(requests.ConnectionError):
+            download.run()
+        destination.returned = True
+        time.sleep(0.2)
+        self.assertEquals(destination.late_writes, 0)
+        self.assertLess(len(destination.getvalue().rstrip(b'\0')), 400)
+
+    def test_resume(self):
+        fetch = FakeRanges({500: 10})
+        download = RangedDownload(fetch, len(CONTENT), self.path,
+                                  segment_size=100, max_attempts=2,
+                                  max_in_flight=1,
+                                  state_path=self.state_path)
+        with self.assertRaises(requests.ConnectionError):
+            download.run()
+        with open(self.state_path) as state_file:
+            completed = json.load(state_file)['completed']
+        self.assertEquals(completed[:5], [0, 1, 2, 3, 4])
+        self.assertNotIn(5, completed)
+
+        fetch = FakeRanges()
+        download = RangedDownload(fetch, len(CONTENT), self.path,
+                                  segment_size=100,
+                                  state_path=self.state_path)
+        self.assertEquals(download.run(), 1000 - 100 * len(completed))
+        self.assertEquals(self.read(), CONTENT)
+        self.assertEquals(sorted(fetch.calls)[0], (500, 599))
+        self.assertFalse(os.path.exists(self.state_path))
+
+    def test_resume_other_version(self):
+        fetch = FakeRanges({500: 10})
+        download = RangedDownload(fetch, len(CONTENT), self.path,
+                                  segment_size=100, max_attempts=1,
+                                  max_in_flight=1, etag='"v1"',
+                                  state_path=self.state_path)
+        with self.assertRaises(requests.ConnectionError):
+            download.run()
+        with open(self.state_path) as state_file:
+            self.assertEquals(json.load(state_file)['etag'], '"v1"')
+
+        fetch = FakeRanges()
+        download = RangedDownload(fetch, len(CONTENT), self.path,
+                                  segment_size=100, etag='"v2"',
+                                  state_path=self.state_path)
+        self.assertEquals(download.run(), len(CONTENT))
+        self.assertEquals(len(fetch.calls), 10)
+
+    def test_content_changed(self):
+        fetch = FakeRanges()
+        responses = {500: raw_response(CONTENT)}
+
+        def changed(start, end):
+            return responses.pop(start, None) or fetch(start, end)
+        download = RangedDownload(changed, len(CONTENT), self.path,
+                                  segment_size=100, max_attempts=3,
+                                  max_in_flight=1, etag='"v1"',
+                                  state_path=self.state_path)
+        with self.assertRaises(ContentChanged):
+            download.run()
+        self.assertNotIn((500, 599), fetch.calls)
+        self.assertFalse(os.path.exists(self.state_path))
+
+    def test_range_ignored(self):
+        fetch = Mock(return_value=raw_response(CONTENT))
+        with self.assertRaises(IOError):
+            RangedDownload(fetch, len(CONTENT), self.path, segment_size=100,
+                           max_attempts=1).run()
+
+    def test_client(self):
+        session = Mock()
+        client = OneDrive('token', 'r_token', 'id', 'secret',
+                          transport=Transport(session=session))
+
+        def request(method, url, headers=None, **kwargs):
+            if headers is None:
+                return json_response({'size': len(CONTENT)})
+            start, end = headers['Range'][6:].split('-')
+            return raw_response(CONTENT[int(start):int(end) + 1], 206)
+        session.request.side_effect = request
+
+        client.download_file_to('file.1', self.path, segment_size=400)
+        self.assertEquals(self.read(), CONTENT)
+        session.request.assert_any_call(
+            'get',
+            'https://apis.live.net/v5.0/file.1/content',
+            params={'access_token': 'token'},
+            data=None,
+            headers={'Range': 'bytes=800-999',
+                     'Accept-Encoding': 'identity'},
+            stream=True
+        )
+
+        client.download_file_to('file.1', self.path, segment_size=400,
+                                etag='"v1"')
+        session.request.assert_called_with(
+            'get',
+            'https://apis.live.net/v5.0/file.1/content',
+            params={'access_token': 'token'},
+            data=None,
+            headers={'Range': 'bytes=800-999',
+                     'Accept-Encoding': 'identity',
+                     'If-Range': '"v1"'},
+            stream=True
+        )
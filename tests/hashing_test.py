@@ -0,0 +1,153 @@
+""" Testing local file hashing and conditional downloads
+
+"""
+
+import base64
+import binascii
+import hashlib
+import os
+import random
+import shutil
+import struct
+import tempfile
+import unittest
+import zlib
+from mock import Mock
+from pyonedrive import DriveItem, OneDrive, Transport
+from pyonedrive import hashing
+from pyonedrive.hashing import QuickXorHash, hash_file, is_unchanged
+from tests import json_response, raw_response
+
+
+def reference_quick_xor(data):
+    """ Byte by byte port of the published QuickXorHash algorithm
+
+    """
+    cells = [0, 0, 0]
+    vector_index, vector_offset = 0, 0
+    for byte in bytearray(data):
+        last = vector_index == len(cells) - 1
+        bits = 32 if last else 64
+        if vector_offset <= bits - 8:
+            cells[vector_index] ^= byte << vector_offset
+        else:
+            cells[vector_index] ^= byte << vector_offset
+            cells[0 if last else vector_index + 1] ^= \
+                byte >> (bits - vector_offset)
+        cells[vector_index] &= (1 << 64) - 1
+        vector_offset += 11
+        while vector_offset >= bits:
+            vector_index = 0 if last else vector_index + 1
+            vector_offset -= bits
+            last = vector_index == len(cells) - 1
+            bits = 32 if last else 64
+    digest = bytearray(b''.join(struct.pack('<Q', cell) for cell in cells)[:20])
+    for index, byte in enumerate(bytearray(struct.pack('<Q', len(data)))):
+        digest[12 + index] ^= byte
+    return base64.b64encode(bytes(digest)).decode('ascii')
+
+
+def random_bytes(size, seed=0):
+    generator = random.Random(seed)
+    return bytes(bytearray(generator.randint(0, 255) for _ in range(size)))
+
+
+class QuickXorHashTestCase(unittest.TestCase):
+    def test_empty(self):
+        self.assertEquals(QuickXorHash().b64digest(),
+                          'AAAAAAAAAAAAAAAAAAAAAAAAAAA=')
+
+    def test_reference(self):
+        for size in (1, 7, 159, 160, 161, 1000, 50000):
+            data = random_bytes(size, seed=size)
+            self.assertEquals(QuickXorHash(data).b64digest(),
+                              reference_quick_xor(data))
+
+    def test_incremental(self):
+        data = random_bytes(3000)
+        quick_xor = QuickXorHash()
+        for start, end in ((0, 1), (1, 170), (170, 171), (171, 3000)):
+            quick_xor.update(data[start:end])
+        self.assertEquals(quick_xor.b64digest(), reference_quick_xor(data))
+
+    def test_python_fold(self):
+        data = random_bytes(hashing._FOLD_BLOCK * 2 + 333)
+        expected = bytearray(160)
+        for index, byte in enumerate(bytearray(data)):
+            expected[index % 160] ^= byte
+        self.assertEquals(hashing._fold_python(data), expected)
+        if hashing._load_numpy() is not None:
+            self.assertEquals(hashing._fold_numpy(data), expected)
+
+
+class HashFileTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'file.bin')
+        self.content = random_bytes(20000)
+        with open(self.path, 'wb') as local:
+            local.write(self.content)
+        self.hashes = {
+            'sha1Hash': hashlib.sha1(self.content).hexdigest().upper(),
+            'crc32Hash': binascii.hexlify(struct.pack(
+                '<I', zlib.crc32(self.content) & 0xffffffff)).decode()
+            .upper(),
+            'quickXorHash': reference_quick_xor(self.content)
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_hash_file(self):
+        self.assertEquals(hash_file(self.path, chunk_size=160 * 7),
+                          self.hashes)
+        empty = os.path.join(self.directory, 'empty')
+        open(empty, 'wb').close()
+        self.assertEquals(hash_file(empty, ('quickXorHash',)),
+                          {'quickXorHash': 'AAAAAAAAAAAAAAAAAAAAAAAAAAA='})
+
+    def test_is_unchanged(self):
+        for name, value in self.hashes.items():
+            if name != 'quickXorHash':
+                value = value.lower()
+            item = {'size': 20000, 'file': {'hashes': {name: value}}}
+            self.assertTrue(is_unchanged(self.path, item))
+        item = {'size': 20000, 'file': {'hashes': self.hashes}}
+        self.assertTrue(is_unchanged(self.path, item))
+        self.assertTrue(is_unchanged(self.path, DriveItem.from_json(
+            dict(item, id='A'))))
+        self.assertFalse(is_unchanged(self.path, dict(item, size=20001)))
+        self.assertFalse(is_unchanged(self.path, {'size': 20000}))
+        self.assertFalse(is_unchanged(self.path + '.missing', item))
+        item['file']['hashes'] = {'quickXorHash': QuickXorHash(b'x')
+                                  .b64digest()}
+        self.assertFalse(is_unchanged(self.path, item))
+
+    def test_download_if_changed(self):
+        session = Mock()
+        client = OneDrive('token', 'r_token', 'id', 'secret',
+                          transport=Transport(session=session))
+        item = {'id': 'A', 'size': 20000, 'eTag': '"A,1"',
+                'file': {'hashes': {'sha1Hash': self.hashes['sha1Hash']}}}
+        session.request.return_value = json_response(item)
+        self.assertEquals(client.download_if_changed('A', self.path), None)
+        args, kwargs = session.request.call_args
+        self.assertEquals(args[1], 'https://api.onedrive.com/v1.0/drive/items/A')
+        self.assertEquals(kwargs['params']['select'], 'id,size,file,eTag')
+
+        session.request.reset_mock()
+        new_content = random_bytes(20000, seed=1)
+        session.request.return_value = raw_response(new_content, 206)
+        item['file']['hashes']['sha1Hash'] = \
+            hashlib.sha1(new_content).hexdigest()
+        self.assertEquals(client.download_if_changed('A', self.path,
+                                                     item=item), 20000)
+        with open(self.path, 'rb') as local:
+            self.assertEquals(local.read(), new_content)
+        args, kwargs = session.request.call_args
+        self.assertEquals(
+            args[1], 'https://api.onedrive.com/v1.0/drive/items/A/content')
+        self.assertEquals(kwargs['headers']['Range'], 'bytes=0-19999')
+        self.assertEquals(kwargs['headers']['If-Range'], '"A,1"')
+        self.assertEquals(client.download_if_changed('A', self.path,
+                                                     item=item), None)
@@ -0,0 +1,111 @@
+""" Testing the typed item representation
+
+"""
+
+import sys
+import unittest
+from mock import Mock
+from pyonedrive import DriveItem, OneDrive, Transport
+from tests import json_response
+
+
+V1_FILE = {
+    'id': 'A!2',
+    'name': 'photo.jpg',
+    'size': 1024,
+    'eTag': 'etag',
+    'createdDateTime': '2015-01-01T00:00:00Z',
+    'lastModifiedDateTime': '2015-01-02T00:00:00Z',
+    'parentReference': {'id': 'A!1', 'driveId': 'A'},
+    'file': {'mimeType': 'image/jpeg',
+             'hashes': {'sha1Hash': 'SHA', 'crc32Hash': 'CRC',
+                        'quickXorHash': 'QXH'}},
+    'image': {'width': 10, 'height': 20},
+    'photo': {'takenDateTime': '2014-12-31T00:00:00Z'},
+    'createdBy': {'user': {'displayName': 'someone'}}
+}
+
+V5_ALBUM = {
+    'id': 'folder.1',
+    'parent_id': 'folder.0',
+    'name': 'Holidays',
+    'type': 'album',
+    'count': 3,
+    'created_time': '2015-01-01T00:00:00+0000',
+    'updated_time': '2015-01-02T00:00:00+0000'
+}
+
+
+class DriveItemTestCase(unittest.TestCase):
+    def test_v1(self):
+        item = DriveItem.from_json(V1_FILE)
+        self.assertEquals((item.id, item.parent_id, item.name, item.size),
+                          ('A!2', 'A!1', 'photo.jpg', 1024))
+        self.assertEquals((item.created, item.modified, item.etag),
+                          ('2015-01-01T00:00:00Z', '2015-01-02T00:00:00Z',
+                           'etag'))
+        self.assertEquals((item.sha1, item.crc32, item.quick_xor),
+                          ('SHA', 'CRC', 'QXH'))
+        self.assertTrue(item.has_facet(OneDrive.IMAGE_FACET))
+        self.assertFalse(item.has_facet(OneDrive.FOLDER_FACET))
+        self.assertFalse(item.is_folder)
+        self.assertEquals(item.image, {'width': 10, 'height': 20})
+        self.assertEquals(item.file['mimeType'], 'image/jpeg')
+        self.assertEquals(item.folder, None)
+        self.assertEquals(item.deleted, None)
+
+    def test_lazy_facets(self):
+        item = DriveItem.from_json(V1_FILE)
+        self.assertTrue(item.has_facet('photo'))
+        self.assertEquals(item._decoded, None)
+        self.assertEquals(item.facet('photo'),
+                          {'takenDateTime': '2014-12-31T00:00:00Z'})
+        self.assertNotEqual(item._decoded, None)
+
+    def test_v5(self):
+        item = DriveItem.from_json(V5_ALBUM)
+        self.assertEquals((item.id, item.parent_id, item.name),
+                          ('folder.1', 'folder.0', 'Holidays'))
+        self.assertEquals(item.modified, '2015-01-02T00:00:00+0000')
+        self.assertTrue(item.is_folder)
+        self.assertEquals(item.folder, {})
+        self.assertFalse(item.has_facet(OneDrive.FILE_FACET))
+
+    def test_deleted(self):
+        item = DriveItem.from_json({'id': 'A!3', 'deleted': {}})
+        self.assertTrue(item.has_facet(OneDrive.DELETED_FACET))
+        self.assertEquals(item.name, None)
+
+    def test_compact(self):
+        item = DriveItem.from_json(V1_FILE)
+        self.assertFalse(hasattr(item, '__dict__'))
+        self.assertRaises(AttributeError, setattr, item, 'other', 1)
+        self.assertTrue(sys.getsizeof(item) < sys.getsizeof(V1_FILE))
+
+    def test_equality(self):
+        self.assertEquals(DriveItem.from_json(V1_FILE),
+                          DriveItem.from_json(dict(V1_FILE)))
+        self.assertNotEqual(DriveItem.from_json(V1_FILE),
+                            DriveItem.from_json(V5_ALBUM))
+
+
+class TypedGeneratorsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.session = Mock()
+        self.client = OneDrive('token', 'r_token', 'id', 'secret',
+                               transport=Transport(session=self.session))
+
+    def test_folder_content(self):
+        self.session.request.return_value = json_response(
+            {'data': [V5_ALBUM], 'paging': {}})
+        items = list(self.client.get_folder_content_generator(
+            'folder.0', typed=True))
+        self.assertEquals(items, [DriveItem.from_json(V5_ALBUM)])
+
+    def test_view_changes(self):
+        self.session.request.return_value = json_response(
+            {'value': [V1_FILE], '@changes.token': 'token'})
+        changes = list(self.client.get_view_changes_generator('A',
+                                                              typed=True))
+        self.assertEquals(changes, [DriveItem.from_json(V1_FILE),
+                                    {'change_token': 'token'}])
@@ -0,0 +1,56 @@
+""" Testing the package's deferred imports
+
+"""
+
+import subprocess
+import sys
+import unittest
+import pyonedrive
+from pyonedrive.lazy import LazyModule
+from benchmarks.startup import ROOT, measure
+
+
+def loaded_after(statement):
+    """ Heavy modules loaded by a statement run in a fresh interpreter
+
+    """
+    return measure(statement, repeat=1)['loaded']
+
+
+class LazyImportTestCase(unittest.TestCase):
+    def test_package_import(self):
+        self.assertEquals(loaded_after('import pyonedrive'), None)
+
+    def test_client_import(self):
+        self.assertEquals(loaded_after(
+            "from pyonedrive import OneDrive\n"
+            "OneDrive('t', 'r', 'id', 'secret')"), None)
+
+    def test_requests_loaded_on_first_session(self):
+        self.assertFalse('requests' in (loaded_after(
+            "from pyonedrive import OneDrive, DeltaSyncStore\n"
+            "OneDrive('t', 'r', 'id', 'secret')") or ''))
+        self.assertTrue('requests' in loaded_after(
+            "from pyonedrive import OneDrive\n"
+            "OneDrive('t', 'r', 'id', 'secret').transport.session"))
+
+    def test_exports(self):
+        from pyonedrive import OneDrive, MetricsCollector
+        self.assertEquals(OneDrive.__module__, 'pyonedrive.py_onedrive')
+        self.assertTrue(pyonedrive.MetricsCollector is MetricsCollector)
+        self.assertTrue('SQLiteTokenStore' in dir(pyonedrive))
+        self.assertTrue('version' in pyonedrive.__all__)
+        self.assertRaises(AttributeError, getattr, pyonedrive, 'Missing')
+
+    def test_lazy_module(self):
+        module = LazyModule('json')
+        self.assertTrue('not loaded' in repr(module))
+        self.assertEquals(module.dumps([1]), '[1]')
+        self.assertTrue('(loaded)' in repr(module))
+        self.assertRaises(AttributeError, getattr, module, 'missing')
+
+    def test_benchmark(self):
+        output = subprocess.check_output(
+            [sys.executable, '-m', 'benchmarks.startup', '--repeat', '1'],
+            cwd=ROOT)
+        self.assertTrue(b'import pyonedrive' in output)
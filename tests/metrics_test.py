@@ -0,0 +1,144 @@
+""" Testing instrumentation hooks and the metrics collector
+
+"""
+
+import io
+import unittest
+from mock import Mock
+from pyonedrive import MetricsCollector, OneDrive, RetryPolicy, Transport
+from pyonedrive.metrics import Histogram, endpoint_of
+import requests
+from tests import json_response
+
+
+UPLOAD_URL = ('https://api.onedrive.com/rup/4c4b1e0a8f3c2d1e/'
+              'eyJSZXNvdXJjZUlEIjoiNEM0QjFFMEEifQ/4mMdb5kSxH0Ra3bWwOGQ8v')
+
+
+class EndpointTestCase(unittest.TestCase):
+    def test_endpoint_of(self):
+        self.assertEquals(endpoint_of('https://apis.live.net/v5.0/me'),
+                          '/v5.0/me')
+        self.assertEquals(
+            endpoint_of('https://apis.live.net/v5.0/folder.a1.A1!103/files'
+                        '?limit=20'),
+            '/v5.0/{id}/files')
+        self.assertEquals(
+            endpoint_of('https://api.onedrive.com/v1.0/drive/items/'
+                        'A1!103/view.changes'),
+            '/v1.0/drive/items/{id}/view.changes')
+        self.assertEquals(
+            endpoint_of('https://api.onedrive.com/v1.0/drive/items/root:'
+                        '/a/b.txt:/upload.createSession'),
+            '/v1.0/drive/items/{id}/upload.createSession')
+        self.assertEquals(endpoint_of(UPLOAD_URL), '/rup/{id}/{id}/{id}')
+
+
+class HistogramTestCase(unittest.TestCase):
+    def test_percentiles(self):
+        histogram = Histogram(buckets=(0.1, 1, 10))
+        self.assertEquals(histogram.percentile(50), None)
+        for value in [0.05] * 90 + [0.5] * 9 + [20]:
+            histogram.observe(value)
+        self.assertEquals(histogram.percentile(50), 0.1)
+        self.assertEquals(histogram.percentile(95), 1)
+        self.assertEquals(histogram.percentile(100), 20)
+        snapshot = histogram.snapshot()
+        self.assertEquals(snapshot['buckets'],
+                          [(0.1, 90), (1, 99), (10, 99), ('+Inf', 100)])
+        self.assertEquals((snapshot['count'], snapshot['min'],
+                           snapshot['max']), (100, 0.05, 20))
+
+
+class HooksTestCase(unittest.TestCase):
+    def setUp(self):
+        self.session = Mock()
+        self.events = []
+        self.metrics = MetricsCollector()
+        hooks = self.metrics.hooks()
+        for event in ('request', 'response', 'token_refresh', 'page'):
+            hooks.setdefault(event, []).append(self.events.append)
+        self.client = OneDrive(
+            'token', 'r_token', 'id', 'secret',
+            transport=Transport(session=self.session), hooks=hooks,
+            retry_policy=RetryPolicy(sleep=lambda delay: None))
+
+    def test_request_events(self):
+        self.session.request.return_value = json_response({'id': 'me'})
+        self.client.get_user_metadata()
+        request, response = self.events
+        self.assertEquals(request, {
+            'event': 'request', 'method': 'get',
+            'url': 'https://apis.live.net/v5.0/me', 'endpoint': '/v5.0/me',
+            'attempt': 1})
+        self.assertEquals(response['event'], 'response')
+        self.assertEquals(response['status'], 200)
+        self.assertEquals(response['error'], None)
+        self.assertEquals(response['bytes_received'], len('{"id": "me"}'))
+        self.assertTrue(response['elapsed'] >= 0)
+
+    def test_metrics(self):
+        self.session.request.side_effect = [
+            json_response({}, 503),
+            json_response({'data': ['a', 'b'], 'paging': {}}),
+            json_response({}, 401),
+            json_response({'link': 'url'})
+        ]
+        self.session.post.return_value = json_response(
+            {'access_token': 'new', 'refresh_token': 'r_new'})
+        self.assertEquals(list(self.client.get_comments_generator('file.1')),
+                          ['a', 'b'])
+        self.client.get_shared_read_link('file.1')
+
+        snapshot = self.metrics.snapshot()
+        self.assertEquals((snapshot['token_refreshes'], snapshot['pages'],
+                           snapshot['items']), (1, 1, 2))
+        comments = snapshot['endpoints']['GET /v5.0/{id}/comments']
+        self.assertEquals(comments['requests'], 2)
+        self.assertEquals(comments['retries'], 1)
+        self.assertEquals(comments['errors'], 1)
+        self.assertEquals(comments['statuses'], {503: 1, 200: 1})
+        self.assertEquals(comments['latency']['count'], 2)
+        link = snapshot['endpoints']['GET /v5.0/{id}/shared_read_link']
+        self.assertEquals(link['statuses'], {401: 1, 200: 1})
+        self.assertEquals(len(self.metrics.slowest()), 2)
+
+        refresh = [event for event in self.events
+                   if event['event'] == 'token_refresh']
+        self.assertEquals(refresh[0]['source'], 'login')
+
+    def test_upload_bytes(self):
+        self.session.request.side_effect = [
+            json_response({'uploadUrl': UPLOAD_URL,
+                           'nextExpectedRanges': ['0-']}),
+            json_response({'nextExpectedRanges': ['327680-']}, 202),
+            json_response({'id': 'item'}, 201)]
+        self.client.upload_file(io.BytesIO(b'a' * 400000), 'a.bin',
+                                fragment_size=327680)
+        fragments = self.metrics.snapshot()['endpoints'][
+            'PUT /rup/{id}/{id}/{id}']
+        self.assertEquals(fragments['requests'], 2)
+        self.assertEquals(fragments['bytes_sent'], 400000)
+        sent = [event['bytes_sent'] for event in self.events
+                if event['event'] == 'response' and event['method'] == 'put']
+        self.assertEquals(sent, [327680, 400000 - 327680])
+
+    def test_connection_error(self):
+        self.session.request.side_effect = requests.ConnectionError()
+        self.client.retry_policy = None
+        self.assertRaises(requests.ConnectionError, self.client.get_albums)
+        response = self.events[-1]
+        self.assertEquals(response['status'], None)
+        self.assertTrue(isinstance(response['error'],
+                                   requests.ConnectionError))
+        self.assertEquals(
+            self.metrics.snapshot()['endpoints']['GET /v5.0/me/albums']
+            ['errors'], 1)
+
+    def test_failing_hook(self):
+        self.client.add_hook('request', Mock(side_effect=ValueError()))
+        self.session.request.return_value = json_response({})
+        self.assertEquals(self.client.get_albums().status_code, 200)
+
+    def test_unknown_event(self):
+        self.assertRaises(ValueError, self.client.add_hook, 'other', Mock())
@@ -0,0 +1,245 @@
+""" Testing the local mirror of a drive
+
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+from mock import Mock
+from pyonedrive import Mirror, OneDrive, RetryPolicy, Transport
+from benchmarks.server import SimulatedDrive, SimulatedServer
+from tests import json_response, raw_response
+
+
+def root():
+    return {'id': 'root', 'name': 'root', 'root': {}, 'folder': {}}
+
+
+def folder(item_id, name, parent_id='root'):
+    return {'id': item_id, 'name': name, 'folder': {},
+            'parentReference': {'id': parent_id}}
+
+
+def file_item(item_id, name, content, parent_id='root'):
+    return {'id': item_id, 'name': name, 'size': len(content),
+            'parentReference': {'id': parent_id},
+            'file': {'hashes': {
+                'sha1Hash': hashlib.sha1(content).hexdigest().upper()}}}
+
+
+def deleted(item_id):
+    return {'id': item_id, 'deleted': {}}
+
+
+class FakeClient(object):
+    """ Serve queued pages of changes and files' contents
+
+    """
+
+    def __init__(self):
+        self.pages = []
+        self.contents = {}
+        self.tokens = []
+        self.downloads = []
+
+    def get_view_changes_page_generator(self, drive, change_token=None,
+                                        fields=None):
+        self.tokens.append(change_token)
+        pages, self.pages = self.pages, []
+        return iter(pages)
+
+    def download_item_to(self, file_id, destination, size=None, **kwargs):
+        self.downloads.append(file_id)
+        content = self.contents[file_id]
+        if isinstance(content, Exception):
+            raise content
+        with open(destination, 'wb') as local:
+            local.write(content)
+        return len(content)
+
+    def add_page(self, token, *items):
+        self.pages.append({'value': list(items), '@changes.token': token})
+
+
+class MirrorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.client = FakeClient()
+        self.mirror = Mirror(self.client, 'drive', self.directory,
+                             max_in_flight=2)
+        self.client.contents = {'x': b'x content', 'y': b'y content'}
+        self.client.add_page('t1', root(), folder('A', 'A'))
+        self.client.add_page('t2', file_item('x', 'x.txt', b'x content', 'A'),
+                             file_item('y', 'y.txt', b'y content'))
+        self.stats = self.mirror.sync()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self, *path):
+        with open(os.path.join(self.directory, *path), 'rb') as local:
+            return local.read()
+
+    def listing(self):
+        return sorted(
+            os.path.relpath(os.path.join(folder_path, name), self.directory)
+            for folder_path, folders, files in os.walk(self.directory)
+            for name in folders + files if not name.startswith('.'))
+
+    def test_initial_sync(self):
+        self.assertEquals(self.listing(), ['A', os.path.join('A', 'x.txt'),
+                                           'y.txt'])
+        self.assertEquals(self.read('A', 'x.txt'), b'x content')
+        self.assertEquals((self.stats['downloaded'], self.stats['bytes']),
+                          (2, 18))
+        self.mirror.sync()
+        self.assertEquals(self.client.tokens, [None, 't2'])
+
+    def test_moves_and_deletes(self):
+        self.client.contents['z'] = b'z content'
+        self.client.add_page(
+            't3',
+            folder('A', 'B'),
+            folder('C', 'C', 'A'),
+            file_item('y', 'y2.txt', b'y content', 'C'),
+            file_item('x', 'x.txt', b'new x content', 'A'),
+            file_item('z', 'z.txt', b'z content', 'C'))
+        self.client.contents['x'] = b'new x content'
+        stats = self.mirror.sync()
+        self.assertEquals(self.listing(), [
+            'B', os.path.join('B', 'C'), os.path.join('B', 'C', 'y2.txt'),
+            os.path.join('B', 'C', 'z.txt'), os.path.join('B', 'x.txt')])
+        self.assertEquals(self.read('B', 'x.txt'), b'new x content')
+        self.assertEquals(self.read('B', 'C', 'y2.txt'), b'y content')
+        self.assertEquals(sorted(self.client.downloads[2:]), ['x', 'z'])
+        self.assertEquals((stats['moved'], stats['skipped']), (2, 1))
+
+        self.client.add_page('t4', deleted('C'), deleted('x'))
+        stats = self.mirror.sync()
+        self.assertEquals(self.listing(), ['B'])
+        self.assertEquals(stats['deleted'], 2)
+
+    def test_unchanged_file(self):
+        self.client.add_page('t3', file_item('y', 'y.txt', b'y content'))
+        stats = self.mirror.sync()
+        self.assertEquals((stats['downloaded'], stats['skipped']), (0, 1))
+
+    def test_failed_download(self):
+        self.client.contents['z'] = IOError('network down')
+        self.client.add_page('t3', file_item('z', 'z.txt', b'z content'))
+        self.assertRaises(IOError, self.mirror.sync)
+        self.assertEquals(self.listing(), ['A', os.path.join('A', 'x.txt'),
+                                           'y.txt'])
+        self.assertEquals(
+            [name for name in os.listdir(self.directory)
+             if name.endswith('-part')], [])
+
+        # the page is fetched again from the last applied token
+        on_error = Mock()
+        self.mirror.on_error = on_error
+        self.client.add_page('t3', file_item('z', 'z.txt', b'z content'))
+        self.assertEquals(self.mirror.sync()['failed'], 1)
+        self.assertEquals(self.client.tokens[-2:], ['t2', 't2'])
+        self.assertEquals(on_error.call_args[0][0]['id'], 'z')
+
+    def test_retry_failed_download(self):
+        self.client.contents['z'] = IOError('network down')
+        self.mirror.on_error = Mock()
+        self.client.add_page('t3', file_item('z', 'z.txt', b'z content'))
+        self.assertEquals(self.mirror.sync()['failed'], 1)
+
+        # the change token moved on, the next sync still fetches the file
+        self.client.contents['z'] = b'z content'
+        stats = self.mirror.sync()
+        self.assertEquals(self.client.tokens[-1], 't3')
+        self.assertEquals(self.read('z.txt'), b'z content')
+        self.assertEquals((stats['downloaded'], stats['failed']), (1, 0))
+        self.mirror.sync()
+        self.assertEquals(self.client.downloads.count('z'), 2)
+
+    def test_resync_prunes(self):
+        with open(os.path.join(self.directory, 'stray.txt'), 'wb') as stray:
+            stray.write(b'stray')
+        self.client.pages.append({'@changes.resync': 'reset'})
+        self.client.add_page('t9', root(), folder('A', 'A'),
+                             file_item('x', 'x.txt', b'x content', 'A'))
+        stats = self.mirror.sync()
+        self.assertEquals(self.listing(), ['A', os.path.join('A', 'x.txt')])
+        self.assertEquals((stats['skipped'], stats['deleted']), (1, 2))
+        self.assertTrue(os.path.exists(self.mirror.index))
+
+    def test_interrupted_resync_prunes(self):
+        with open(os.path.join(self.directory, 'stray.txt'), 'wb') as stray:
+            stray.write(b'stray')
+        self.client.contents['z'] = IOError('network down')
+        self.client.pages.append({'@changes.resync': 'reset'})
+        self.client.add_page('t9', root(), folder('A', 'A'),
+                             file_item('z', 'z.txt', b'z content', 'A'))
+        self.assertRaises(IOError, self.mirror.sync)
+        self.assertTrue(os.path.exists(os.path.join(self.directory,
+                                                    'stray.txt')))
+
+        self.client.contents['z'] = b'z content'
+        self.client.add_page('t9', root(), folder('A', 'A'),
+                             file_item('z', 'z.txt', b'z content', 'A'))
+        stats = self.mirror.sync()
+        self.assertEquals(self.client.tokens[-1], None)
+        self.assertEquals(self.listing(), ['A', os.path.join('A', 'z.txt')])
+        self.assertEquals(stats['deleted'], 3)
+        self.client.add_page('t10')
+        self.assertEquals(self.mirror.sync()['deleted'], 0)
+
+
+class ClientMirrorTestCase(unittest.TestCase):
+    def test_download_url(self):
+        session = Mock()
+        client = OneDrive('token', 'r_token', 'id', 'secret',
+                          transport=Transport(session=session))
+        content = b'x content'
+
+        def request(method, url, headers=None, **kwargs):
+            if url.endswith('/view.changes'):
+                return json_response({
+                    'value': [root(), dict(file_item('A!1', 'x.txt', content),
+                                           eTag='"A!1,1"')],
+                    '@changes.token': 't1'})
+            return raw_response(content, 206)
+        session.request.side_effect = request
+        directory = tempfile.mkdtemp()
+        try:
+            stats = client.mirror_drive('root', directory)
+            self.assertEquals(stats['downloaded'], 1)
+            args, kwargs = session.request.call_args
+            self.assertEquals(
+                args[1],
+                'https://api.onedrive.com/v1.0/drive/items/A!1/content')
+            self.assertEquals(kwargs['headers'], {
+                'Range': 'bytes=0-8', 'Accept-Encoding': 'identity',
+                'If-Range': '"A!1,1"'})
+        finally:
+            shutil.rmtree(directory)
+
+
+class SimulatedMirrorTestCase(unittest.TestCase):
+    def test_mirror_drive(self):
+        drive = SimulatedDrive(big_folder_items=5, tree_folders=2,
+                               tree_depth=2, tree_files=2,
+                               large_file_size=100000)
+        server = SimulatedServer(drive, throttle_every=7).start()
+        client = server.client(
+            retry_policy=RetryPolicy(sleep=lambda delay: None))
+        directory = tempfile.mkdtemp()
+        try:
+            stats = client.mirror_drive('root', directory, max_in_flight=4)
+            self.assertEquals(stats['downloaded'], 5 + 12 + 1)
+            with open(os.path.join(directory, 'large.bin'), 'rb') as large:
+                self.assertEquals(large.read(),
+                                  b''.join(drive.content(0, 99999)))
+            self.assertEquals(client.mirror_drive('root', directory)
+                              ['downloaded'], 0)
+        finally:
+            shutil.rmtree(directory)
+            client.transport.close()
+            server.stop()
@@ -3,6 +3,7 @@
 """
 
 import json
+import time
 import unittest
 from mock import Mock, patch, call
 from pyonedrive import OneDrive
@@ -14,7 +15,8 @@ class OneDriveTestCase(unittest.TestCase):
         self.client = OneDrive('token', 'r_token', 'id', 'secret')
 
     def test_refresh_token(self):
-        with patch('pyonedrive.py_onedrive.requests') as mock_requests:
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            session = mock_requests.Session.return_value
             self.client.refresh_callback = Mock()
 
             res1 = requests.Response()
@@ -31,10 +33,10 @@ class OneDriveTestCase(unittest.TestCase):
                     'refresh_token': 'refresh'
                 }
             )
-            mock_requests.request.side_effect = api_results
-            mock_requests.post.return_value = tokens
+            session.request.side_effect = api_results
+            session.post.return_value = tokens
             r = self.client.get_user_metadata()
-            mock_requests.post.assert_called_once_with(
+            session.post.assert_called_once_with(
                 'https://login.live.com/oauth20_token.srf',
                 data={
                     'client_secret': 'secret',
@@ -50,17 +52,18 @@ class OneDriveTestCase(unittest.TestCase):
             self.assertEquals(r.status_code, 200)
 
     def test_user_metadata(self):
-        with patch('pyonedrive.py_onedrive.requests') as mock_requests:
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            session = mock_requests.Session.return_value
             res = requests.Response()
             res.status_code = 200
             res._content = json.dumps(
                 {'metadata': 'OK'}
             )
 
-            mock_requests.request.return_value = res
+            session.request.return_value = res
 
             r = self.client.get_user_metadata()
-            mock_requests.request.assert_called_once_with(
+            session.request.assert_called_once_with(
                 'get',
                 'https://apis.live.net/v5.0/me',
                 params={'access_token': 'token'},
@@ -70,17 +73,18 @@ class OneDriveTestCase(unittest.TestCase):
             self.assertEquals(r.json(), {'metadata': 'OK'})
 
     def test_user_picture(self):
-        with patch('pyonedrive.py_onedrive.requests') as mock_requests:
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            session = mock_requests.Session.return_value
             res = requests.Response()
             res.status_code = 200
             res._content = json.dumps(
                 {'picture': 'OK'}
             )
 
-            mock_requests.request.return_value = res
+            session.request.return_value = res
 
             r = self.client.get_user_picture()
-            mock_requests.request.assert_called_once_with(
+            session.request.assert_called_once_with(
                 'get',
                 'https://apis.live.net/v5.0/me/picture',
                 params={'access_token': 'token'},
@@ -90,17 +94,18 @@ class OneDriveTestCase(unittest.TestCase):
             self.assertEquals(r.json(), {'picture': 'OK'})
 
     def test_user_root_folder(self):
-        with patch('pyonedrive.py_onedrive.requests') as mock_requests:
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            session = mock_requests.Session.return_value
             res = requests.Response()
             res.status_code = 200
             res._content = json.dumps(
                 {'root_folder': 'OK'}
             )
 
-            mock_requests.request.return_value = res
+            session.request.return_value = res
 
             r = self.client.get_root_folder()
-            mock_requests.request.assert_called_once_with(
+            session.request.assert_called_once_with(
                 'get',
                 'https://apis.live.net/v5.0/me/skydrive',
                 params={'access_token': 'token'},
@@ -110,17 +115,18 @@ class OneDriveTestCase(unittest.TestCase):
             self.assertEquals(r.json(), {'root_folder': 'OK'})
 
     def test_user_albums(self):
-        with patch('pyonedrive.py_onedrive.requests') as mock_requests:
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            session = mock_requests.Session.return_value
             res = requests.Response()
             res.status_code = 200
             res._content = json.dumps(
                 {'albums': 'OK'}
             )
 
-            mock_requests.request.return_value = res
+            session.request.return_value = res
 
             r = self.client.get_albums()
-            mock_requests.request.assert_called_once_with(
+            session.request.assert_called_once_with(
                 'get',
                 'https://apis.live.net/v5.0/me/albums',
                 params={'access_token': 'token'},
@@ -130,17 +136,18 @@ class OneDriveTestCase(unittest.TestCase):
             self.assertEquals(r.json(), {'albums': 'OK'})
 
     def test_user_shared_albums(self):
-        with patch('pyonedrive.py_onedrive.requests') as mock_requests:
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            session = mock_requests.Session.return_value
             res = requests.Response()
             res.status_code = 200
             res._content = json.dumps(
                 {'shared_albums': 'OK'}
             )
 
-            mock_requests.request.return_value = res
+            session.request.return_value = res
 
             r = self.client.get_shared_albums()
-            mock_requests.request.assert_called_once_with(
+            session.request.assert_called_once_with(
                 'get',
                 'https://apis.live.net/v5.0/me/skydrive/shared/albums',
                 params={'access_token': 'token'},
@@ -150,7 +157,8 @@ class OneDriveTestCase(unittest.TestCase):
             self.assertEquals(r.json(), {'shared_albums': 'OK'})
 
     def test_folder_content_generator(self):
-        with patch('pyonedrive.py_onedrive.requests') as mock_requests:
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            session = mock_requests.Session.return_value
             res1 = requests.Response()
             res1.status_code = 200
             res1._content = json.dumps(
@@ -164,12 +172,12 @@ class OneDriveTestCase(unittest.TestCase):
                  'paging': {}}
             )
 
-            mock_requests.request.side_effect = [res1, res2]
+            session.request.side_effect = [res1, res2]
 
             for data in self.client.get_folder_content_generator(1):
                 self.assertEquals(data, 'ok')
-            self.assertEquals(mock_requests.request.call_count, 2)
-            mock_requests.request.assert_has_calls(
+            self.assertEquals(session.request.call_count, 2)
+            session.request.assert_has_calls(
                 [
                     call(
                         'get',
@@ -189,8 +197,40 @@ class OneDriveTestCase(unittest.TestCase):
                     )
                 ])
 
+    def test_absolute_next_link(self):
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            session = mock_requests.Session.return_value
+            res1 = requests.Response()
+            res1.status_code = 200
+            res1._content = json.dumps(
+                {'data': ['ok'],
+                 'paging': {'next': 'https://apis.live.net/v5.0/1/files'
+                                    '?offset=20'}}
+            )
+            res2 = requests.Response()
+            res2.status_code = 200
+            res2._content = json.dumps(
+                {'data': ['ok'],
+                 'paging': {}}
+            )
+
+            session.request.side_effect = [res1, res2]
+
+            self.assertEquals(
+                list(self.client.get_folder_content_generator(1)),
+                ['ok', 'ok'])
+            session.request.assert_called_with(
+                'get',
+                'https://apis.live.net/v5.0/1/files?offset=20',
+                params={'access_token': 'token',
+                        'limit': 20},
+                data=None,
+                headers=None
+            )
+
     def test_filtered_folder_content_generator(self):
-        with patch('pyonedrive.py_onedrive.requests') as mock_requests:
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            session = mock_requests.Session.return_value
             res = requests.Response()
             res.status_code = 200
             res._content = json.dumps(
@@ -198,12 +238,12 @@ class OneDriveTestCase(unittest.TestCase):
                  'paging': {}}
             )
 
-            mock_requests.request.return_value = res
+            session.request.return_value = res
 
             for data in self.client.get_folder_content_generator(1,
                                                                  'audio'):
                 self.assertEquals(data, 'ok')
-            mock_requests.request.assert_called_once_with(
+            session.request.assert_called_once_with(
                 'get',
                 'https://apis.live.net/v5.0/1/files',
                 params={'access_token': 'token',
@@ -214,17 +254,18 @@ class OneDriveTestCase(unittest.TestCase):
             )
 
     def test_folder_content(self):
-        with patch('pyonedrive.py_onedrive.requests') as mock_requests:
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            session = mock_requests.Session.return_value
             res = requests.Response()
             res.status_code = 200
             res._content = json.dumps(
                 {'folder_content': 'ok'}
             )
 
-            mock_requests.request.return_value = res
+            session.request.return_value = res
 
             r = self.client.get_folder_content(1)
-            mock_requests.request.assert_called_once_with(
+            session.request.assert_called_once_with(
                 'get',
                 'https://apis.live.net/v5.0/1/files',
                 params={'access_token': 'token',
@@ -236,17 +277,18 @@ class OneDriveTestCase(unittest.TestCase):
             self.assertEquals(r.json(), {'folder_content': 'ok'})
 
     def test_filtered_folder_content(self):
-        with patch('pyonedrive.py_onedrive.requests') as mock_requests:
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            session = mock_requests.Session.return_value
             res = requests.Response()
             res.status_code = 200
             res._content = json.dumps(
                 {'filtered_content': 'ok'}
             )
 
-            mock_requests.request.return_value = res
+            session.request.return_value = res
 
             r = self.client.get_folder_content(1, content_filter='audio')
-            mock_requests.request.assert_called_once_with(
+            session.request.assert_called_once_with(
                 'get',
                 'https://apis.live.net/v5.0/1/files',
                 params={'access_token': 'token',
@@ -259,17 +301,18 @@ class OneDriveTestCase(unittest.TestCase):
             self.assertEquals(r.json(), {'filtered_content': 'ok'})
 
     def test_user_shared_objects(self):
-        with patch('pyonedrive.py_onedrive.requests') as mock_requests:
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            session = mock_requests.Session.return_value
             res = requests.Response()
             res.status_code = 200
             res._content = json.dumps(
                 {'shared_objects': 'ok'}
             )
 
-            mock_requests.request.return_value = res
+            session.request.return_value = res
 
             r = self.client.get_shared_objects()
-            mock_requests.request.assert_called_once_with(
+            session.request.assert_called_once_with(
                 'get',
                 'https://apis.live.net/v5.0/me/skydrive/shared',
                 params={'access_token': 'token',
@@ -281,17 +324,18 @@ class OneDriveTestCase(unittest.TestCase):
             self.assertEquals(r.json(), {'shared_objects': 'ok'})
 
     def test_user_filtered_shared_objects(self):
-        with patch('pyonedrive.py_onedrive.requests') as mock_requests:
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            session = mock_requests.Session.return_value
             res = requests.Response()
             res.status_code = 200
             res._content = json.dumps(
                 {'filtered_shared_objects': 'ok'}
             )
 
-            mock_requests.request.return_value = res
+            session.request.return_value = res
 
             r = self.client.get_shared_objects(content_filter='audio')
-            mock_requests.request.assert_called_once_with(
+            session.request.assert_called_once_with(
                 'get',
                 'https://apis.live.net/v5.0/me/skydrive/shared',
                 params={'access_token': 'token',
@@ -304,17 +348,18 @@ class OneDriveTestCase(unittest.TestCase):
             self.assertEquals(r.json(), {'filtered_shared_objects': 'ok'})
 
     def test_user_shared_folders(self):
-        with patch('pyonedrive.py_onedrive.requests') as mock_requests:
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            session = mock_requests.Session.return_value
             res = requests.Response()
             res.status_code = 200
             res._content = json.dumps(
                 {'shared_folders': 'ok'}
             )
 
-            mock_requests.request.return_value = res
+            session.request.return_value = res
 
             r = self.client.get_shared_folders()
-            mock_requests.request.assert_called_once_with(
+            session.request.assert_called_once_with(
                 'get',
                 'https://apis.live.net/v5.0/me/skydrive/shared',
                 params={'access_token': 'token',
@@ -327,17 +372,18 @@ class OneDriveTestCase(unittest.TestCase):
             self.assertEquals(r.json(), {'shared_folders': 'ok'})
 
     def test_user_most_recent(self):
-        with patch('pyonedrive.py_onedrive.requests') as mock_requests:
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            session = mock_requests.Session.return_value
             res = requests.Response()
             res.status_code = 200
             res._content = json.dumps(
                 {'most_recent': 'ok'}
             )
 
-            mock_requests.request.return_value = res
+            session.request.return_value = res
 
             r = self.client.get_most_recent()
-            mock_requests.request.assert_called_once_with(
+            session.request.assert_called_once_with(
                 'get',
                 'https://apis.live.net/v5.0/me/skydrive/recent_docs',
                 params={'access_token': 'token'},
@@ -347,17 +393,18 @@ class OneDriveTestCase(unittest.TestCase):
             self.assertEquals(r.json(), {'most_recent': 'ok'})
 
     def test_user_quota(self):
-        with patch('pyonedrive.py_onedrive.requests') as mock_requests:
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            session = mock_requests.Session.return_value
             res = requests.Response()
             res.status_code = 200
             res._content = json.dumps(
                 {'quota': 'ok'}
             )
 
-            mock_requests.request.return_value = res
+            session.request.return_value = res
 
             r = self.client.get_usage_quota()
-            mock_requests.request.assert_called_once_with(
+            session.request.assert_called_once_with(
                 'get',
                 'https://apis.live.net/v5.0/me/skydrive/quota',
                 params={'access_token': 'token'},
@@ -367,17 +414,18 @@ class OneDriveTestCase(unittest.TestCase):
             self.assertEquals(r.json(), {'quota': 'ok'})
 
     def test_shared_read_link(self):
-        with patch('pyonedrive.py_onedrive.requests') as mock_requests:
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            session = mock_requests.Session.return_value
             res = requests.Response()
             res.status_code = 200
             res._content = json.dumps(
                 {'read_link': 'ok'}
             )
 
-            mock_requests.request.return_value = res
+            session.request.return_value = res
 
             r = self.client.get_shared_read_link(1)
-            mock_requests.request.assert_called_once_with(
+            session.request.assert_called_once_with(
                 'get',
                 'https://apis.live.net/v5.0/1/shared_read_link',
                 params={'access_token': 'token'},
@@ -387,17 +435,18 @@ class OneDriveTestCase(unittest.TestCase):
             self.assertEquals(r.json(), {'read_link': 'ok'})
 
     def test_shared_edit_link(self):
-        with patch('pyonedrive.py_onedrive.requests') as mock_requests:
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            session = mock_requests.Session.return_value
             res = requests.Response()
             res.status_code = 200
             res._content = json.dumps(
                 {'edit_link': 'ok'}
             )
 
-            mock_requests.request.return_value = res
+            session.request.return_value = res
 
             r = self.client.get_shared_edit_link(1)
-            mock_requests.request.assert_called_once_with(
+            session.request.assert_called_once_with(
                 'get',
                 'https://apis.live.net/v5.0/1/shared_edit_link',
                 params={'access_token': 'token'},
@@ -407,17 +456,18 @@ class OneDriveTestCase(unittest.TestCase):
             self.assertEquals(r.json(), {'edit_link': 'ok'})
 
     def test_embed_link(self):
-        with patch('pyonedrive.py_onedrive.requests') as mock_requests:
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            session = mock_requests.Session.return_value
             res = requests.Response()
             res.status_code = 200
             res._content = json.dumps(
                 {'embed_link': 'ok'}
             )
 
-            mock_requests.request.return_value = res
+            session.request.return_value = res
 
             r = self.client.get_embed_link(1)
-            mock_requests.request.assert_called_once_with(
+            session.request.assert_called_once_with(
                 'get',
                 'https://apis.live.net/v5.0/1/embed',
                 params={'access_token': 'token'},
@@ -427,7 +477,8 @@ class OneDriveTestCase(unittest.TestCase):
             self.assertEquals(r.json(), {'embed_link': 'ok'})
 
     def test_preview(self):
-        with patch('pyonedrive.py_onedrive.requests') as mock_requests:
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            session = mock_requests.Session.return_value
             res1 = requests.Response()
             res1.status_code = 200
             res1._content = json.dumps(
@@ -439,11 +490,11 @@ class OneDriveTestCase(unittest.TestCase):
                 {'preview': 'ok'}
             )
 
-            mock_requests.request.side_effect = [res1, res2]
+            session.request.side_effect = [res1, res2]
 
             r = self.client.get_preview(1)
-            self.assertEquals(mock_requests.request.call_count, 2)
-            mock_requests.request.assert_has_calls(
+            self.assertEquals(session.request.call_count, 2)
+            session.request.assert_has_calls(
                 [
                     call(
                         'get',
@@ -456,23 +507,26 @@ class OneDriveTestCase(unittest.TestCase):
                         'get',
                         'https://apis.live.net/v5.0/skydrive/get_item_preview',
                         params={'type': 'thumbnail',
-                                'url': 'item_link'}
+                                'url': 'item_link'},
+                        data=None,
+                        headers=None
                     )
                 ])
             self.assertEquals(r.json(), {'preview': 'ok'})
 
     def test_comments(self):
-        with patch('pyonedrive.py_onedrive.requests') as mock_requests:
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            session = mock_requests.Session.return_value
             res = requests.Response()
             res.status_code = 200
             res._content = json.dumps(
                 {'comments': 'ok'}
             )
 
-            mock_requests.request.return_value = res
+            session.request.return_value = res
 
             r = self.client.get_comments(1)
-            mock_requests.request.assert_called_once_with(
+            session.request.assert_called_once_with(
                 'get',
                 'https://apis.live.net/v5.0/1/comments',
                 params={'access_token': 'token',
@@ -484,7 +538,8 @@ class OneDriveTestCase(unittest.TestCase):
             self.assertEquals(r.json(), {'comments': 'ok'})
 
     def test_comments_generator(self):
-        with patch('pyonedrive.py_onedrive.requests') as mock_requests:
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            session = mock_requests.Session.return_value
             res1 = requests.Response()
             res1.status_code = 200
             res1._content = json.dumps(
@@ -498,12 +553,12 @@ class OneDriveTestCase(unittest.TestCase):
                  'paging': {}}
             )
 
-            mock_requests.request.side_effect = [res1, res2]
+            session.request.side_effect = [res1, res2]
 
             for data in self.client.get_comments_generator(1):
                 self.assertEquals(data, 'ok')
-            self.assertEquals(mock_requests.request.call_count, 2)
-            mock_requests.request.assert_has_calls(
+            self.assertEquals(session.request.call_count, 2)
+            session.request.assert_has_calls(
                 [
                     call(
                         'get',
@@ -524,17 +579,18 @@ class OneDriveTestCase(unittest.TestCase):
                 ])
 
     def test_tags(self):
-        with patch('pyonedrive.py_onedrive.requests') as mock_requests:
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            session = mock_requests.Session.return_value
             res = requests.Response()
             res.status_code = 200
             res._content = json.dumps(
                 {'tags': 'ok'}
             )
 
-            mock_requests.request.return_value = res
+            session.request.return_value = res
 
             r = self.client.get_tags(1)
-            mock_requests.request.assert_called_once_with(
+            session.request.assert_called_once_with(
                 'get',
                 'https://apis.live.net/v5.0/1/tags',
                 params={'access_token': 'token',
@@ -546,7 +602,8 @@ class OneDriveTestCase(unittest.TestCase):
             self.assertEquals(r.json(), {'tags': 'ok'})
 
     def test_tags_generator(self):
-        with patch('pyonedrive.py_onedrive.requests') as mock_requests:
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            session = mock_requests.Session.return_value
             res1 = requests.Response()
             res1.status_code = 200
             res1._content = json.dumps(
@@ -560,12 +617,12 @@ class OneDriveTestCase(unittest.TestCase):
                  'paging': {}}
             )
 
-            mock_requests.request.side_effect = [res1, res2]
+            session.request.side_effect = [res1, res2]
 
             for data in self.client.get_tags_generator(1):
                 self.assertEquals(data, 'ok')
-            self.assertEquals(mock_requests.request.call_count, 2)
-            mock_requests.request.assert_has_calls(
+            self.assertEquals(session.request.call_count, 2)
+            session.request.assert_has_calls(
                 [
                     call(
                         'get',
@@ -586,17 +643,18 @@ class OneDriveTestCase(unittest.TestCase):
                 ])
 
     def test_delete(self):
-        with patch('pyonedrive.py_onedrive.requests') as mock_requests:
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            session = mock_requests.Session.return_value
             res = requests.Response()
             res.status_code = 200
             res._content = json.dumps(
                 {'delete': 'ok'}
             )
 
-            mock_requests.request.return_value = res
+            session.request.return_value = res
 
             r = self.client.delete_item(1)
-            mock_requests.request.assert_called_once_with(
+            session.request.assert_called_once_with(
                 'delete',
                 'https://apis.live.net/v5.0/1',
                 params={'access_token': 'token'},
@@ -606,22 +664,66 @@ class OneDriveTestCase(unittest.TestCase):
             self.assertEquals(r.json(), {'delete': 'ok'})
 
     def test_download(self):
-        with patch('pyonedrive.py_onedrive.requests') as mock_requests:
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            session = mock_requests.Session.return_value
             res = requests.Response()
             res.status_code = 200
             res._content = json.dumps(
                 {'download': 'ok'}
             )
 
-            mock_requests.request.return_value = res
+            session.request.return_value = res
 
             r = self.client.download_file(1)
-            mock_requests.request.assert_called_once_with(
+            session.request.assert_called_once_with(
                 'get',
                 'https://apis.live.net/v5.0/1/content',
                 params={'access_token': 'token'},
                 data=None,
-                headers=None,
+                headers={'Accept-Encoding': 'identity'},
                 stream=True
             )
             self.assertEquals(r.json(), {'download': 'ok'})
+
+    def test_prefetched_folder_content_generator(self):
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            session = mock_requests.Session.return_value
+            pages = []
+            for i in range(5):
+                res = requests.Response()
+                res.status_code = 200
+                res._content = json.dumps(
+                    {'data': [i],
+                     'paging': {'next': 'next_url'} if i < 4 else {}}
+                )
+                pages.append(res)
+
+            session.request.side_effect = pages
+
+            items = list(self.client.get_folder_content_generator(
+                1, prefetch=2))
+            self.assertEquals(items, [0, 1, 2, 3, 4])
+            self.assertEquals(session.request.call_count, 5)
+
+    def test_prefetched_generator_close(self):
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            session = mock_requests.Session.return_value
+
+            def request(*args, **kwargs):
+                res = requests.Response()
+                res.status_code = 200
+                res._content = json.dumps(
+                    {'data': ['ok'], 'paging': {'next': 'next_url'}}
+                )
+                return res
+
+            session.request.side_effect = request
+
+            tags = self.client.get_tags_generator(1, prefetch=1)
+            self.assertEquals(next(tags), 'ok')
+            tags.close()
+            time.sleep(0.3)
+            call_count = session.request.call_count
+            time.sleep(0.3)
+            self.assertEquals(session.request.call_count, call_count)
+            self.assertTrue(call_count <= 3)
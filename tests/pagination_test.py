@@ -0,0 +1,109 @@
+""" Testing the paging engine
+
+"""
+
+import threading
+import unittest
+from mock import Mock
+from pyonedrive import OneDrive, Transport
+from pyonedrive.pagination import Paginator
+import requests
+from tests import json_response
+
+
+class FakeResource(object):
+    """ Paginated resource answering offset windows and next links
+
+    """
+    def __init__(self, size):
+        self.items = list(range(size))
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def fetch(self, path, params):
+        with self.lock:
+            self.calls.append((path, dict(params)))
+        offset = params.get('offset', 0)
+        if path.startswith('next:'):
+            offset = int(path[5:])
+        limit = params['limit']
+        page = {'data': self.items[offset:offset + limit], 'paging': {}}
+        if offset + limit < len(self.items):
+            page['paging']['next'] = 'next:{0}'.format(offset + limit)
+        return page
+
+
+class PaginatorTestCase(unittest.TestCase):
+
+    def test_follow_next(self):
+        resource = FakeResource(45)
+        items = list(Paginator(resource.fetch, 'files', {'filter': 'audio'},
+                               count=20))
+        self.assertEquals(items, resource.items)
+        self.assertEquals(len(resource.calls), 3)
+        self.assertEquals(resource.calls[0],
+                          ('files', {'filter': 'audio', 'limit': 20}))
+
+    def test_unknown_total(self):
+        resource = FakeResource(45)
+        items = list(Paginator(resource.fetch, 'files', {}, count=20,
+                               max_in_flight=4, total=lambda: None))
+        self.assertEquals(items, resource.items)
+        self.assertEquals(resource.calls[1][0], 'next:20')
+
+    def test_windows(self):
+        resource = FakeResource(95)
+        items = list(Paginator(resource.fetch, 'files', {}, count=10,
+                               max_in_flight=4, total=95))
+        self.assertEquals(items, resource.items)
+        self.assertEquals(
+            sorted(params['offset'] for _, params in resource.calls),
+            list(range(0, 100, 10)))
+
+    def test_unordered_windows(self):
+        resource = FakeResource(95)
+        items = list(Paginator(resource.fetch, 'files', {}, count=10,
+                               max_in_flight=4, ordered=False,
+                               total=lambda: 95))
+        self.assertEquals(sorted(items), resource.items)
+
+    def test_stale_total(self):
+        resource = FakeResource(60)
+        items = list(Paginator(resource.fetch, 'files', {}, count=10,
+                               max_in_flight=4, total=35))
+        self.assertEquals(items, resource.items)
+        # last window is empty
+        self.assertEquals(len(resource.calls), 7)
+
+    def test_empty(self):
+        resource = FakeResource(0)
+        items = list(Paginator(resource.fetch, 'files', {}, count=10,
+                               max_in_flight=4, total=0))
+        self.assertEquals(items, [])
+        self.assertEquals(len(resource.calls), 1)
+
+    def test_window_error(self):
+        fetch = Mock(side_effect=requests.HTTPError())
+        with self.assertRaises(requests.HTTPError):
+            list(Paginator(fetch, 'files', {}, max_in_flight=2, total=100))
+
+    def test_client_probe(self):
+        session = Mock()
+        client = OneDrive('token', 'r_token', 'id', 'secret',
+                          transport=Transport(session=session))
+        resource = FakeResource(5)
+
+        def request(method, url, params=None, **kwargs):
+            if url.endswith('/files'):
+                return json_response(resource.fetch('files', params))
+            return json_response({'id': 'folder.1', 'count': 5})
+        session.request.side_effect = request
+
+        items = list(client.get_folder_content_generator(
+            'folder.1', count=2, max_in_flight=3))
+        self.assertEquals(items, resource.items)
+        self.assertEquals(session.request.call_args_list[0][0][1],
+                          'https://apis.live.net/v5.0/folder.1')
+        self.assertEquals(
+            sorted(params['offset'] for _, params in resource.calls),
+            [0, 2, 4])
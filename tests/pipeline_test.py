@@ -0,0 +1,136 @@
+""" Testing the concurrent change pipeline
+
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from mock import Mock
+from pyonedrive import ChangePipeline
+
+
+def touch(item):
+    """ Handler run in a child process
+
+    """
+    if item['id'] == 'bad':
+        raise ValueError('bad item')
+    open(os.path.join(item['directory'], item['id']), 'w').close()
+
+
+def change_feed(*pages):
+    client = Mock()
+    client.get_view_changes_page_generator.return_value = iter(pages)
+    return client
+
+
+def page(token, *ids, **extra):
+    content = {'value': [dict({'id': item_id}, **extra) for item_id in ids],
+               '@changes.token': token}
+    return content
+
+
+class ChangePipelineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.handled = []
+        self.checkpoints = []
+
+    def handler(self, item):
+        time.sleep(random.random() * 0.005)
+        with self.lock:
+            self.handled.append((item['id'], item.get('version')))
+
+    def test_run(self):
+        client = change_feed(page('t1', 'a', 'b', 'c'), page('t2'),
+                             page('t3', 'd', 'e'))
+        pipeline = ChangePipeline(client, 'drive', self.handler,
+                                  change_token='t0', max_workers=3,
+                                  on_checkpoint=self.checkpoints.append)
+        self.assertEquals(pipeline.run(), 't3')
+        client.get_view_changes_page_generator.assert_called_once_with(
+            'drive', 't0', fields=None)
+        self.assertEquals(sorted(item_id for item_id, _ in self.handled),
+                          ['a', 'b', 'c', 'd', 'e'])
+        self.assertEquals(self.checkpoints, ['t1', 't2', 't3'])
+        self.assertEquals(pipeline.handled, 5)
+
+    def test_item_order(self):
+        pages = [page('t{0}'.format(version), *'abcdefgh', version=version)
+                 for version in range(10)]
+        ChangePipeline(change_feed(*pages), 'drive', self.handler,
+                       max_workers=4).run()
+        for item_id in 'abcdefgh':
+            self.assertEquals([version for handled_id, version in self.handled
+                               if handled_id == item_id], list(range(10)))
+
+    def test_failure(self):
+        def handler(item):
+            if item['id'] == 'bad':
+                # let the other changes of the page be handled first
+                time.sleep(0.05)
+                raise ValueError('bad item')
+            self.handler(item)
+        client = change_feed(page('t1', 'a', 'b'), page('t2', 'c', 'bad'),
+                             page('t3', 'd'))
+        pipeline = ChangePipeline(client, 'drive', handler, max_workers=2,
+                                  prefetch=1,
+                                  on_checkpoint=self.checkpoints.append)
+        self.assertRaises(ValueError, pipeline.run)
+        self.assertEquals(self.checkpoints, ['t1'])
+        self.assertEquals(pipeline.change_token, 't1')
+
+    def test_on_error(self):
+        errors = []
+
+        def handler(item):
+            if item['id'] == 'bad':
+                raise ValueError('bad item')
+            self.handler(item)
+        client = change_feed(page('t1', 'a', 'bad'), page('t2', 'b'))
+        pipeline = ChangePipeline(
+            client, 'drive', handler, max_workers=2,
+            on_error=lambda item, exc: errors.append(item['id']))
+        self.assertEquals(pipeline.run(), 't2')
+        self.assertEquals(errors, ['bad'])
+        self.assertEquals(sorted(self.handled), [('a', None), ('b', None)])
+
+    def test_resync(self):
+        events = []
+
+        def handler(item):
+            time.sleep(0.02)
+            events.append(item['id'])
+        client = change_feed(page('t1', 'a'), {'@changes.resync': 'reset'},
+                             page('t2', 'b'))
+        pipeline = ChangePipeline(client, 'drive', handler,
+                                  on_resync=lambda: events.append('resync'))
+        self.assertEquals(pipeline.run(), 't2')
+        self.assertEquals(events, ['a', 'resync', 'b'])
+
+    def test_fetch_error(self):
+        def pages():
+            yield page('t1', 'a')
+            raise IOError('reset')
+        client = Mock()
+        client.get_view_changes_page_generator.return_value = pages()
+        pipeline = ChangePipeline(client, 'drive', self.handler,
+                                  on_checkpoint=self.checkpoints.append)
+        self.assertRaises(IOError, pipeline.run)
+        self.assertEquals(self.handled, [('a', None)])
+
+    def test_processes(self):
+        directory = tempfile.mkdtemp()
+        try:
+            client = change_feed(page('t1', 'a', 'b', directory=directory),
+                                 page('t2', 'c', directory=directory))
+            pipeline = ChangePipeline(client, 'drive', touch, max_workers=2,
+                                      processes=True)
+            self.assertEquals(pipeline.run(), 't2')
+            self.assertEquals(sorted(os.listdir(directory)), ['a', 'b', 'c'])
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,77 @@
+""" Testing share link caching and bulk previews
+
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from mock import Mock
+from pyonedrive import LRUCache, OneDrive, Transport
+import requests
+from tests import json_response, raw_response
+
+
+class PreviewTestCase(unittest.TestCase):
+    def setUp(self):
+        self.session = Mock()
+        self.clock = Mock(return_value=0)
+        self.client = OneDrive(
+            'token', 'r_token', 'id', 'secret',
+            transport=Transport(session=self.session),
+            link_cache=LRUCache(ttl=3600, clock=self.clock))
+        self.links = []
+        self.lock = threading.Lock()
+
+        def request(method, url, params=None, **kwargs):
+            if url.endswith('shared_read_link'):
+                item_id = url.split('/')[-2]
+                with self.lock:
+                    self.links.append(item_id)
+                if item_id == 'bad':
+                    return json_response({}, 404)
+                return json_response({'link': 'https://1drv.ms/' + item_id})
+            return raw_response(b'preview of ' + params['url'].encode('utf-8'),
+                                headers={'Content-Type': 'image/jpeg'})
+        self.session.request.side_effect = request
+
+    def test_link_cache(self):
+        self.assertEquals(self.client.get_preview('a').content,
+                          b'preview of https://1drv.ms/a')
+        self.client.get_preview('a', size='normal')
+        self.assertEquals(self.links, ['a'])
+        self.clock.return_value = 3601
+        self.client.get_preview('a')
+        self.assertEquals(self.links, ['a', 'a'])
+
+    def test_previews(self):
+        previews = self.client.get_previews(['a', 'b', 'c', 'a'],
+                                            max_in_flight=3)
+        self.assertEquals(list(previews.keys()), ['a', 'b', 'c'])
+        self.assertEquals(previews['b'].content,
+                          b'preview of https://1drv.ms/b')
+        self.assertEquals(sorted(self.links), ['a', 'b', 'c'])
+
+    def test_previews_to_disk(self):
+        directory = tempfile.mkdtemp()
+        errors = []
+        try:
+            previews = self.client.get_previews(
+                ['a', 'bad', 'c'], directory=directory,
+                on_error=lambda item_id, exc: errors.append(item_id))
+            self.assertEquals(previews, {
+                'a': os.path.join(directory, 'a.jpg'),
+                'c': os.path.join(directory, 'c.jpg')})
+            with open(previews['c'], 'rb') as preview:
+                self.assertEquals(preview.read(),
+                                  b'preview of https://1drv.ms/c')
+            self.assertEquals(sorted(os.listdir(directory)),
+                              ['a.jpg', 'c.jpg'])
+            self.assertEquals(errors, ['bad'])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_previews_error(self):
+        self.assertRaises(requests.HTTPError, self.client.get_previews,
+                          ['a', 'bad'])
@@ -0,0 +1,73 @@
+""" Testing field projection
+
+"""
+
+import unittest
+from mock import Mock
+from pyonedrive import DeltaSyncStore, OneDrive, Transport
+from tests import json_response
+
+
+FILE = {'id': 'file.1', 'name': 'a.txt', 'type': 'file', 'size': 3,
+        'description': 'a long description', 'from': {'name': 'someone'}}
+FOLDER = {'id': 'folder.1', 'name': 'sub', 'type': 'folder', 'count': 1,
+          'description': 'another description'}
+
+
+class ProjectionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.session = Mock()
+        self.client = OneDrive('token', 'r_token', 'id', 'secret',
+                               transport=Transport(session=self.session))
+        self.params = []
+
+    def serve(self, *responses):
+        responses = list(responses)
+
+        def request(method, url, params=None, **kwargs):
+            self.params.append(dict(params or {}))
+            return responses.pop(0)
+        self.session.request.side_effect = request
+
+    def test_folder_content(self):
+        for stream in (False, True):
+            self.serve(json_response({'data': [FILE], 'paging': {}}))
+            items = list(self.client.get_folder_content_generator(
+                'folder.0', stream=stream, fields=('id', 'size', 'parent')))
+            self.assertEquals(items, [{'id': 'file.1', 'size': 3}])
+
+    def test_tree(self):
+        self.serve(json_response({'data': [FILE, FOLDER], 'paging': {}}),
+                   json_response({'data': [], 'paging': {}}))
+        items = sorted(item['id'] for _, item in
+                       self.client.get_tree_generator('folder.0',
+                                                      fields=['size']))
+        self.assertEquals(items, ['file.1', 'folder.1'])
+
+    def test_drive_root(self):
+        self.serve(json_response({'id': 'root'}))
+        self.assertEquals(self.client.get_drive_root(fields=['id', 'name']),
+                          {'id': 'root'})
+        self.assertEquals(self.params[0]['select'], 'id,name')
+
+    def test_view_changes(self):
+        self.serve(json_response({'@changes.resync': 'reset'}),
+                   json_response({'value': [{'id': 'A'}],
+                                  '@changes.token': 't1'}))
+        changes = list(self.client.get_view_changes_generator(
+            'drive', change_token='t0', fields=['name', 'size']))
+        self.assertEquals(changes, [{'id': 'A'}, {'change_token': 't1'}])
+        self.assertEquals(self.params[0]['select'], 'name,size,id,deleted')
+        self.assertEquals(self.params[0]['token'], 't0')
+        self.assertEquals(self.params[1]['select'], 'name,size,id,deleted')
+        self.assertFalse('token' in self.params[1])
+
+    def test_delta_sync(self):
+        client = Mock()
+        client.get_view_changes_page_generator.return_value = iter([])
+        with DeltaSyncStore(':memory:') as store:
+            store.sync(client, 'drive', fields=['size'])
+        fields = client.get_view_changes_page_generator.call_args[1]['fields']
+        self.assertEquals(fields[0], 'size')
+        self.assertTrue('parentReference' in fields)
+        self.assertTrue('deleted' in fields)
@@ -0,0 +1,124 @@
+""" Testing the retry policy
+
+"""
+
+import io
+import unittest
+from mock import Mock
+from pyonedrive import OneDrive, RetryPolicy, Transport
+import requests
+from tests import json_response
+
+
+class RetryPolicyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.now = [0.0]
+        self.sleeps = []
+
+        def sleep(delay):
+            self.sleeps.append(delay)
+            self.now[0] += delay
+        self.policy = RetryPolicy(max_attempts=4, backoff_factor=1,
+                                  max_total_time=100, jitter=False,
+                                  sleep=sleep, clock=lambda: self.now[0])
+        self.session = Mock()
+        self.client = OneDrive('token', 'r_token', 'id', 'secret',
+                               transport=Transport(session=self.session),
+                               retry_policy=self.policy)
+
+    def test_retry_after(self):
+        self.session.request.side_effect = [
+            json_response({}, 429, headers={'Retry-After': '7'}),
+            json_response({})]
+        r = self.client.get_root_folder()
+        self.assertEquals(r.status_code, 200)
+        self.assertEquals(self.sleeps, [7.0])
+        stats = self.policy.stats()
+        self.assertEquals(stats['throttled'], 1)
+        self.assertEquals(stats['time_throttled'], 7.0)
+
+    def test_http_date(self):
+        res = json_response({}, 503, headers={
+            'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+        self.assertEquals(RetryPolicy.retry_after(res), 0.0)
+        self.assertIsNone(RetryPolicy.retry_after(json_response({}, 503)))
+
+    def test_backoff(self):
+        self.session.request.side_effect = [
+            json_response({}, 500), json_response({}, 502),
+            json_response({}, 504), json_response({})]
+        self.assertEquals(self.client.get_root_folder().status_code, 200)
+        self.assertEquals(self.sleeps, [1, 2, 4])
+
+    def test_jitter(self):
+        policy = RetryPolicy(backoff_factor=2)
+        for _ in range(20):
+            self.assertTrue(0 <= policy.backoff(3) <= 8)
+
+    def test_max_attempts(self):
+        self.session.request.return_value = json_response({}, 503)
+        self.assertEquals(self.client.get_root_folder().status_code, 503)
+        self.assertEquals(self.session.request.call_count, 4)
+        self.assertEquals(self.policy.stats()['given_up'], 1)
+
+    def test_max_total_time(self):
+        self.session.request.side_effect = [
+            json_response({}, 429, headers={'Retry-After': '60'}),
+            json_response({}, 429, headers={'Retry-After': '60'})]
+        self.assertEquals(self.client.get_root_folder().status_code, 429)
+        self.assertEquals(self.sleeps, [60.0])
+
+    def test_not_retried(self):
+        self.session.request.return_value = json_response({}, 404)
+        self.assertEquals(self.client.get_root_folder().status_code, 404)
+        self.assertEquals(self.sleeps, [])
+
+    def test_connection_error(self):
+        self.session.request.side_effect = [
+            requests.ConnectionError('reset'), json_response({})]
+        self.assertEquals(self.client.get_root_folder().status_code, 200)
+        self.assertEquals(self.policy.stats()['errors'], 1)
+
+    def test_connection_error_not_idempotent(self):
+        self.session.request.side_effect = [
+            requests.ConnectionError('reset'), json_response({})]
+        batch = self.client.batch()
+        batch.add_item('A')
+        result = batch.execute()['1']
+        self.assertRaises(requests.ConnectionError,
+                          result.raise_for_status)
+        self.assertEquals(self.session.request.call_count, 1)
+
+    def test_not_idempotent(self):
+        self.session.request.side_effect = [json_response({}, 500),
+                                            json_response({})]
+        self.assertRaises(requests.HTTPError,
+                          self.client.create_upload_session, 'a.txt')
+        self.assertEquals(self.session.request.call_count, 1)
+
+    def test_not_idempotent_throttled(self):
+        self.session.request.side_effect = [
+            json_response({}, 429, headers={'Retry-After': '2'}),
+            json_response({'uploadUrl': 'https://upload/session'})]
+        session = self.client.create_upload_session('a.txt')
+        self.assertEquals(session['uploadUrl'], 'https://upload/session')
+        self.assertEquals(self.sleeps, [2.0])
+
+    def test_upload_fragment(self):
+        self.session.request.side_effect = [
+            json_response({'uploadUrl': 'https://upload/session',
+                           'nextExpectedRanges': ['0-']}),
+            json_response({}, 503, headers={'Retry-After': '1'}),
+            json_response({'id': 'item'}, 201)]
+        item = self.client.upload_file(io.BytesIO(b'abc'), 'a.txt')
+        self.assertEquals(item, {'id': 'item'})
+        self.assertEquals(self.sleeps, [1.0])
+        _, kwargs = self.session.request.call_args
+        self.assertNotIn('Authorization', kwargs['headers'])
+
+    def test_preview(self):
+        self.session.request.side_effect = [
+            json_response({'link': 'https://link'}), json_response({}, 503),
+            json_response({})]
+        self.assertEquals(self.client.get_preview('A').status_code, 200)
+        self.assertEquals(self.policy.stats()['throttled'], 1)
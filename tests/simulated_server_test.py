@@ -0,0 +1,85 @@
+""" Testing the client end to end against the benchmarks' simulated server
+
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from pyonedrive import DeltaSyncStore, RetryPolicy
+from pyonedrive.download import ContentChanged
+from benchmarks.server import (BIG_FOLDER_ID, LARGE_FILE_ID, SimulatedDrive,
+                               SimulatedServer)
+from benchmarks.run import COLUMNS, format_row, work
+
+
+class SimulatedServerTestCase(unittest.TestCase):
+    def setUp(self):
+        drive = SimulatedDrive(big_folder_items=45, tree_folders=2,
+                               tree_depth=2, tree_files=3,
+                               large_file_size=300000)
+        self.server = SimulatedServer(drive, throttle_every=3).start()
+        self.client = self.server.client(
+            retry_policy=RetryPolicy(sleep=lambda delay: None))
+
+    def tearDown(self):
+        self.client.transport.close()
+        self.server.stop()
+
+    def test_listing(self):
+        items = list(self.client.get_folder_content_generator(BIG_FOLDER_ID,
+                                                              count=10))
+        self.assertEquals([item['name'] for item in items],
+                          ['file{0:06d}.txt'.format(i) for i in range(45)])
+        self.assertTrue(self.server.throttled)
+
+    def test_token_expiry(self):
+        self.server.expire_tokens()
+        self.assertEquals(len(list(self.client.get_tree_generator())), 71)
+        self.assertEquals(self.server.refreshes, 1)
+
+    def test_delta_sync(self):
+        with DeltaSyncStore(':memory:') as store:
+            self.assertEquals(store.sync(self.client, 'root'), 72)
+            self.assertEquals(store.path(LARGE_FILE_ID), '/large.bin')
+
+    def test_download(self):
+        directory = tempfile.mkdtemp()
+        try:
+            destination = os.path.join(directory, 'large.bin')
+            self.assertEquals(self.client.download_file_to(
+                LARGE_FILE_ID, destination, segment_size=65536,
+                max_in_flight=3), 300000)
+            with open(destination, 'rb') as content:
+                self.assertEquals(
+                    content.read(),
+                    b''.join(self.server.drive.content(0, 299999)))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_download_item(self):
+        directory = tempfile.mkdtemp()
+        try:
+            destination = os.path.join(directory, 'large.bin')
+            self.assertEquals(self.client.download_item_to(
+                LARGE_FILE_ID, destination, segment_size=65536,
+                max_in_flight=3), 300000)
+            with open(destination, 'rb') as content:
+                self.assertEquals(
+                    content.read(),
+                    b''.join(self.server.drive.content(0, 299999)))
+            self.assertRaises(ContentChanged, self.client.download_item_to,
+                              LARGE_FILE_ID, destination, size=300000,
+                              segment_size=65536, etag='"stale"')
+        finally:
+            shutil.rmtree(directory)
+
+    def test_benchmark(self):
+        result = work(self.server.url, 'list', {
+            'retry_policy': RetryPolicy(sleep=lambda delay: None)})
+        self.assertEquals(result['items'], 45)
+        self.assertTrue(result['peak MB'] > 0)
+        row = format_row(['list', result['elapsed'], 46, 1.5, None])
+        self.assertTrue(row.startswith('list' + ' ' * 16))
+        self.assertEquals(row.split()[2:], ['46', '1.50', '-'])
+        self.assertEquals(format_row(COLUMNS).split()[-2:], ['peak', 'MB'])
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+""" Testing the incremental decoding of pages
+
+"""
+
+import json
+import unittest
+from mock import Mock
+from pyonedrive import OneDrive, Transport
+from pyonedrive.streaming import StreamedPage
+from tests import json_response
+
+
+def chunked_response(content, chunk_size=7):
+    """ Mock a streamed response, recording how many chunks were read
+
+    """
+    body = json.dumps(content).encode('utf-8')
+    response = Mock()
+    response.read_chunks = 0
+
+    def iter_content(size):
+        for start in range(0, len(body), chunk_size):
+            response.read_chunks += 1
+            yield body[start:start + chunk_size]
+    response.iter_content.side_effect = iter_content
+    return response
+
+
+class StreamedPageTestCase(unittest.TestCase):
+    def test_items(self):
+        content = {
+            '@odata.context': 'ctx',
+            'value': [{'id': i, 'name': u'\xe9t\xe9 {0}'.format(i),
+                       'size': 12345.5e3, 'folder': None,
+                       'tags': [True, False, {}]} for i in range(20)],
+            '@changes.token': 'token',
+            '@changes.hasMoreChanges': False
+        }
+        response = chunked_response(content, chunk_size=3)
+        page = StreamedPage(response, 'value')
+        self.assertEquals(list(page['value']), content['value'])
+        self.assertEquals(page['@changes.token'], 'token')
+        self.assertEquals(page.get('@odata.context'), 'ctx')
+        self.assertFalse(page.get('@changes.hasMoreChanges'))
+        self.assertFalse('@changes.resync' in page)
+        self.assertTrue(response.close.called)
+
+    def test_first_item_latency(self):
+        content = {'data': [{'id': 'x' * 10} for _ in range(1000)],
+                   'paging': {}}
+        response = chunked_response(content, chunk_size=64)
+        page = StreamedPage(response, 'data')
+        self.assertEquals(next(iter(page)), {'id': 'x' * 10})
+        self.assertTrue(response.read_chunks <= 2)
+        self.assertEquals(page['paging'], {})
+        self.assertTrue(response.read_chunks > 200)
+
+    def test_empty(self):
+        page = StreamedPage(chunked_response({'value': [], 'n': 1}), 'value')
+        self.assertEquals(list(page), [])
+        self.assertEquals(page['n'], 1)
+        page = StreamedPage(chunked_response({}), 'value')
+        self.assertEquals(list(page), [])
+        self.assertRaises(KeyError, page.__getitem__, 'n')
+
+    def test_truncated(self):
+        response = Mock()
+        response.iter_content.return_value = iter([b'{"value": [1, 2'])
+        page = StreamedPage(response, 'value')
+        self.assertRaises(ValueError, list, page)
+
+
+class StreamingGeneratorsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.session = Mock()
+        self.client = OneDrive('token', 'r_token', 'id', 'secret',
+                               transport=Transport(session=self.session))
+
+    def test_folder_content(self):
+        self.session.request.side_effect = [
+            json_response({'data': ['a', 'b'],
+                               'paging': {'next': 'next_url'}}),
+            json_response({'data': ['c'], 'paging': {}})
+        ]
+        items = list(self.client.get_folder_content_generator(
+            1, stream=True, max_in_flight=4))
+        self.assertEquals(items, ['a', 'b', 'c'])
+        args, kwargs = self.session.request.call_args
+        self.assertEquals(args, ('get', 'https://apis.live.net/v5.0/next_url'))
+        self.assertTrue(kwargs['stream'])
+
+    def test_view_changes(self):
+        responses = [
+            json_response({'value': [{'id': 'A'}],
+                               '@changes.token': 't1',
+                               '@changes.hasMoreChanges': True}),
+            json_response({'value': [{'id': 'B'}, {'id': 'C'}],
+                               '@changes.token': 't2'})
+        ]
+        tokens = []
+
+        def request(method, url, params=None, **kwargs):
+            tokens.append(params.get('token'))
+            return responses.pop(0)
+        self.session.request.side_effect = request
+        changes = list(self.client.get_view_changes_generator(
+            'drive', stream=True))
+        self.assertEquals(changes, [{'id': 'A'}, {'id': 'B'}, {'id': 'C'},
+                                    {'change_token': 't2'}])
+        self.assertEquals(tokens, [None, 't1'])
+
+    def test_view_changes_pages_skipped(self):
+        self.session.request.side_effect = [
+            json_response({'value': [{'id': 'A'}],
+                               '@changes.token': 't1',
+                               '@changes.hasMoreChanges': True}),
+            json_response({'value': [], '@changes.token': 't2'})
+        ]
+        pages = self.client.get_view_changes_page_generator('drive',
+                                                             stream=True)
+        # pages are read even if their changes are not consumed
+        self.assertEquals([page['@changes.token'] for page in pages],
+                          ['t1', 't2'])
@@ -0,0 +1,68 @@
+""" Testing token refresh under concurrency and expiry tracking
+
+"""
+
+import threading
+import time
+import unittest
+from mock import Mock
+from pyonedrive import OneDrive, Transport
+from tests import json_response
+
+
+class TokenRefreshTestCase(unittest.TestCase):
+    def setUp(self):
+        self.session = Mock()
+        self.client = OneDrive('old', 'r_token', 'id', 'secret',
+                               transport=Transport(session=self.session))
+        self.refreshes = []
+        self.lock = threading.Lock()
+
+        def request(method, url, params=None, **kwargs):
+            if params['access_token'] != 'new':
+                return json_response({}, 401)
+            return json_response({'ok': True})
+
+        def post(url, data=None):
+            with self.lock:
+                self.refreshes.append(data['refresh_token'])
+            time.sleep(0.05)
+            return json_response({'access_token': 'new',
+                                  'refresh_token': 'r_new',
+                                  'expires_in': 3600})
+        self.session.request.side_effect = request
+        self.session.post.side_effect = post
+
+    def test_single_flight(self):
+        statuses = []
+
+        def work():
+            statuses.append(self.client.get_root_folder().status_code)
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEquals(statuses, [200] * 8)
+        self.assertEquals(self.refreshes, ['r_token'])
+        self.assertEquals(self.client.refresh_token, 'r_new')
+
+    def test_expiry_tracking(self):
+        before = time.time()
+        self.client.get_root_folder()
+        self.assertTrue(before + 3600 <= self.client.token_expires_at
+                        <= time.time() + 3600)
+
+    def test_proactive_refresh(self):
+        self.client.token_expires_at = time.time() + 30
+        r = self.client.get_root_folder()
+        self.assertEquals(r.status_code, 200)
+        # no 401 round trip
+        self.assertEquals(self.session.request.call_count, 1)
+        self.assertEquals(self.refreshes, ['r_token'])
+
+    def test_token_still_valid(self):
+        self.client.token = 'new'
+        self.client.token_expires_at = time.time() + 3600
+        self.client.get_root_folder()
+        self.assertEquals(self.refreshes, [])
@@ -0,0 +1,131 @@
+""" Testing token stores shared between processes
+
+"""
+
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from mock import Mock
+from pyonedrive import FileTokenStore, OneDrive, SQLiteTokenStore, Transport
+from tests import json_response
+
+
+class TokenStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_file_store(self):
+        path = os.path.join(self.directory, 'tokens.json')
+        store = FileTokenStore(path)
+        self.assertEquals(store.load(), None)
+        with store.lock():
+            store.save('token', 'r_token', 12.5)
+        self.assertEquals(store.load(), {'access_token': 'token',
+                                         'refresh_token': 'r_token',
+                                         'expires_at': 12.5})
+        self.assertEquals(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+
+    @unittest.skipIf(os.name == 'nt', 'fcntl is not available')
+    def test_file_store_lock(self):
+        store = FileTokenStore(os.path.join(self.directory, 'tokens.json'))
+        probe = ('import fcntl, os, sys\n'
+                 'fd = os.open(sys.argv[1], os.O_RDWR)\n'
+                 'try:\n'
+                 '    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)\n'
+                 'except IOError:\n'
+                 '    sys.exit(1)\n')
+        with store.lock():
+            locked = subprocess.call([sys.executable, '-c', probe,
+                                      store.path + '.lock'])
+        self.assertEquals(locked, 1)
+        self.assertEquals(subprocess.call([sys.executable, '-c', probe,
+                                           store.path + '.lock']), 0)
+
+    def test_sqlite_store(self):
+        path = os.path.join(self.directory, 'tokens.db')
+        first = SQLiteTokenStore(path, 'first')
+        second = SQLiteTokenStore(path, 'second')
+        with first.lock():
+            first.save('token', 'r_token')
+        second.save('other', 'r_other', 10)
+        self.assertEquals(first.load(), {'access_token': 'token',
+                                         'refresh_token': 'r_token',
+                                         'expires_at': None})
+        self.assertEquals(second.load()['access_token'], 'other')
+        self.assertEquals(SQLiteTokenStore(path, 'third').load(), None)
+
+    def test_sqlite_store_lock(self):
+        path = os.path.join(self.directory, 'tokens.db')
+        events = []
+
+        def contender():
+            with SQLiteTokenStore(path).lock():
+                events.append('contender')
+        store = SQLiteTokenStore(path)
+        with store.lock():
+            thread = threading.Thread(target=contender)
+            thread.start()
+            time.sleep(0.1)
+            events.append('holder')
+        thread.join()
+        self.assertEquals(events, ['holder', 'contender'])
+
+
+class SharedRefreshTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = FileTokenStore(os.path.join(self.directory, 'tokens'))
+        self.session = Mock()
+        self.callback = Mock()
+        self.client = OneDrive('old', 'r_old', 'id', 'secret',
+                               refresh_callback=self.callback,
+                               transport=Transport(session=self.session),
+                               token_store=self.store)
+
+        def request(method, url, params=None, **kwargs):
+            if params['access_token'] == 'old':
+                return json_response({}, 401)
+            return json_response({'token': params['access_token']})
+        self.session.request.side_effect = request
+        self.session.post.return_value = json_response(
+            {'access_token': 'new', 'refresh_token': 'r_new',
+             'expires_in': 3600})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_refresh_saved(self):
+        self.assertEquals(self.client.get_root_folder().json(),
+                          {'token': 'new'})
+        self.assertEquals(self.session.post.call_args[1]['data']
+                          ['refresh_token'], 'r_old')
+        stored = self.store.load()
+        self.assertEquals((stored['access_token'], stored['refresh_token']),
+                          ('new', 'r_new'))
+        self.assertEquals(stored['expires_at'], self.client.token_expires_at)
+
+    def test_stored_token_used(self):
+        self.store.save('shared', 'r_shared', time.time() + 3600)
+        self.assertEquals(self.client.get_root_folder().json(),
+                          {'token': 'shared'})
+        self.assertFalse(self.session.post.called)
+        self.assertEquals(self.client.refresh_token, 'r_shared')
+        self.callback.assert_called_once_with('shared', 'r_shared')
+
+    def test_stored_token_expired(self):
+        self.store.save('shared', 'r_shared', time.time() + 10)
+        self.assertEquals(self.client.get_root_folder().json(),
+                          {'token': 'new'})
+        # the latest refresh token is used
+        self.assertEquals(self.session.post.call_args[1]['data']
+                          ['refresh_token'], 'r_shared')
+        self.assertEquals(self.store.load()['access_token'], 'new')
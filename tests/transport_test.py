@@ -0,0 +1,58 @@
+""" Testing the pooled transport
+
+"""
+
+import unittest
+from mock import Mock, patch
+from pyonedrive import OneDrive, Transport
+
+
+class TransportTestCase(unittest.TestCase):
+
+    def test_session_created_once(self):
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            transport = Transport(pool_connections=2, pool_maxsize=20,
+                                  max_retries=3)
+            transport.request('get', 'https://host/a')
+            transport.post('https://host/b', data={})
+            self.assertEquals(mock_requests.Session.call_count, 1)
+            mock_requests.adapters.HTTPAdapter.assert_called_once_with(
+                pool_connections=2,
+                pool_maxsize=20,
+                max_retries=3,
+                pool_block=False
+            )
+            session = mock_requests.Session.return_value
+            session.mount.assert_any_call(
+                'https://', mock_requests.adapters.HTTPAdapter.return_value)
+            session.request.assert_called_once_with('get', 'https://host/a')
+            session.post.assert_called_once_with('https://host/b', data={})
+
+    def test_injected_session(self):
+        session = Mock()
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            transport = Transport(session=session)
+            transport.request('get', 'https://host/a', stream=True)
+            self.assertFalse(mock_requests.Session.called)
+            session.request.assert_called_once_with(
+                'get', 'https://host/a', stream=True)
+
+    def test_close(self):
+        session = Mock()
+        transport = Transport(session=session)
+        transport.close()
+        session.close.assert_called_once_with()
+        with patch('pyonedrive.transport.requests') as mock_requests:
+            transport.request('get', 'https://host/a')
+            self.assertEquals(mock_requests.Session.call_count, 1)
+
+    def test_shared_between_clients(self):
+        session = Mock()
+        transport = Transport(session=session)
+        client1 = OneDrive('token1', 'r_token', 'id', 'secret',
+                           transport=transport)
+        client2 = OneDrive('token2', 'r_token', 'id', 'secret',
+                           transport=transport)
+        client1.get_user_metadata()
+        client2.get_user_metadata()
+        self.assertEquals(session.request.call_count, 2)
@@ -0,0 +1,142 @@
+""" Testing upload sessions
+
+"""
+
+import io
+import json
+import threading
+import unittest
+from mock import Mock
+from pyonedrive import OneDrive, Transport
+from pyonedrive.upload import FRAGMENT_UNIT, parse_ranges
+import requests
+from tests import json_response
+
+CONTENT = bytes(bytearray(i % 251 for i in range(3 * FRAGMENT_UNIT + 1000)))
+UPLOAD_URL = 'https://upload/session'
+
+
+class FakeUploadServer(object):
+    """ Emulate an upload session accepting fragments in any order
+
+    """
+    def __init__(self, size, failures=0):
+        self.size = size
+        self.received = bytearray(size)
+        self.missing = set(range(size))
+        self.failures = failures
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def ranges(self):
+        ranges = []
+        for offset in sorted(self.missing):
+            if ranges and ranges[-1][1] == offset - 1:
+                ranges[-1][1] = offset
+            else:
+                ranges.append([offset, offset])
+        return ['{0}-{1}'.format(start, end) for start, end in ranges]
+
+    def __call__(self, method, url, data=None, headers=None, **kwargs):
+        with self.lock:
+            self.calls.append((method, url, headers))
+            if url.endswith('upload.createSession'):
+                return json_response({'uploadUrl': UPLOAD_URL,
+                                      'nextExpectedRanges': ['0-']})
+            if method == 'get':
+                return json_response({'nextExpectedRanges': self.ranges()})
+            if self.failures:
+                self.failures -= 1
+                raise requests.ConnectionError('reset')
+            content_range = headers['Content-Range'][6:]
+            start, end = content_range.split('/')[0].split('-')
+            start, end = int(start), int(end)
+            self.received[start:end + 1] = data
+            self.missing.difference_update(range(start, end + 1))
+            if self.missing:
+                return json_response(
+                    {'nextExpectedRanges': self.ranges()}, 202)
+            return json_response({'id': 'item', 'size': self.size}, 201)
+
+
+class UploadTestCase(unittest.TestCase):
+    def setUp(self):
+        self.session = Mock()
+        self.client = OneDrive('token', 'r_token', 'id', 'secret',
+                               transport=Transport(session=self.session))
+
+    def test_parse_ranges(self):
+        self.assertEquals(parse_ranges(['0-99', '200-'], 1000),
+                          [(0, 99), (200, 999)])
+
+    def test_upload(self):
+        server = FakeUploadServer(len(CONTENT))
+        self.session.request.side_effect = server
+        item = self.client.upload_file(io.BytesIO(CONTENT), 'dir/a b.bin',
+                                       parent_id='F!1',
+                                       fragment_size=FRAGMENT_UNIT)
+        self.assertEquals(item, {'id': 'item', 'size': len(CONTENT)})
+        self.assertEquals(bytes(server.received), CONTENT)
+        method, url, headers = server.calls[0]
+        self.assertEquals(method, 'post')
+        self.assertEquals(
+            url, 'https://api.onedrive.com/v1.0/drive/items/F!1:/dir/'
+                 'a%20b.bin:/upload.createSession')
+        self.assertEquals(headers['Authorization'], 'Bearer token')
+        self.assertEquals(
+            json.loads(self.session.request.call_args_list[0][1]['data']),
+            {'item': {'@name.conflictBehavior': 'rename'}})
+        # 4 fragments, no token sent to the upload URL
+        self.assertEquals(len(server.calls), 5)
+        self.assertEquals(server.calls[-1][2]['Content-Range'],
+                          'bytes 983040-984039/984040')
+        self.assertNotIn('Authorization', server.calls[-1][2])
+
+    def test_retry(self):
+        server = FakeUploadServer(len(CONTENT), failures=1)
+        self.session.request.side_effect = server
+        item = self.client.upload_file(io.BytesIO(CONTENT), 'a.bin',
+                                       fragment_size=FRAGMENT_UNIT)
+        self.assertEquals(item['id'], 'item')
+        self.assertEquals(bytes(server.received), CONTENT)
+        self.assertEquals([call[0] for call in server.calls].count('get'), 1)
+
+    def test_give_up(self):
+        server = FakeUploadServer(len(CONTENT), failures=10)
+        self.session.request.side_effect = server
+        with self.assertRaises(requests.ConnectionError):
+            self.client.upload_file(io.BytesIO(CONTENT), 'a.bin',
+                                    max_attempts=2)
+
+    def test_parallel_upload(self):
+        server = FakeUploadServer(len(CONTENT))
+        self.session.request.side_effect = server
+        item = self.client.upload_file(io.BytesIO(CONTENT), 'a.bin',
+                                       fragment_size=FRAGMENT_UNIT,
+                                       max_in_flight=3)
+        self.assertEquals(item['id'], 'item')
+        self.assertEquals(bytes(server.received), CONTENT)
+
+    def test_resume(self):
+        server = FakeUploadServer(len(CONTENT))
+        server.received[:FRAGMENT_UNIT] = CONTENT[:FRAGMENT_UNIT]
+        server.missing.difference_update(range(FRAGMENT_UNIT))
+        self.session.request.side_effect = server
+        item = self.client.resume_upload(UPLOAD_URL, io.BytesIO(CONTENT))
+        self.assertEquals(item['id'], 'item')
+        self.assertEquals(bytes(server.received), CONTENT)
+        self.assertEquals(server.calls[1][2]['Content-Range'],
+                          'bytes 327680-984039/984040')
+
+    def test_empty_file(self):
+        self.session.request.return_value = json_response({'id': 'empty'},
+                                                          201)
+        item = self.client.upload_file(io.BytesIO(), 'empty.txt')
+        self.assertEquals(item, {'id': 'empty'})
+        self.session.request.assert_called_once_with(
+            'put',
+            'https://api.onedrive.com/v1.0/drive/root:/empty.txt:/content',
+            params={'@name.conflictBehavior': 'rename'},
+            data=b'',
+            headers={'Authorization': 'Bearer token'}
+        )
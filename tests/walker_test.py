@@ -0,0 +1,100 @@
+""" Testing the drive tree walker
+
+"""
+
+import unittest
+from mock import Mock
+from pyonedrive import OneDrive, Transport
+from pyonedrive.walker import has_facet, walk_tree
+import requests
+from tests import json_response
+
+TREE = {
+    'root': [
+        {'id': 'folder.a', 'name': 'A', 'type': 'folder'},
+        {'id': 'file.1', 'name': '1.txt', 'type': 'file'},
+    ],
+    'folder.a': [
+        {'id': 'album.b', 'name': 'B', 'type': 'album'},
+        {'id': 'file.2', 'name': '2.jpg', 'type': 'photo'},
+    ],
+    'album.b': [
+        {'id': 'file.3', 'name': '3.mp3', 'type': 'audio'},
+    ],
+}
+
+
+def list_folder(folder_id, count=20):
+    if folder_id not in TREE:
+        raise requests.HTTPError(folder_id)
+    return iter(TREE[folder_id])
+
+
+class WalkerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = Mock()
+        self.client.get_folder_content_generator.side_effect = list_folder
+
+    def walk(self, **kwargs):
+        return sorted((path, item['id']) for path, item in
+                      walk_tree(self.client, 'root', **kwargs))
+
+    def test_walk(self):
+        self.assertEquals(self.walk(max_in_flight=2), [
+            ('/', 'file.1'),
+            ('/', 'folder.a'),
+            ('/A', 'album.b'),
+            ('/A', 'file.2'),
+            ('/A/B', 'file.3'),
+        ])
+        self.assertEquals(
+            self.client.get_folder_content_generator.call_count, 3)
+
+    def test_max_depth(self):
+        self.assertEquals(self.walk(max_depth=1), [
+            ('/', 'file.1'),
+            ('/', 'folder.a'),
+        ])
+
+    def test_facet(self):
+        self.assertEquals(self.walk(facet='file'), [
+            ('/', 'file.1'),
+            ('/A', 'file.2'),
+            ('/A/B', 'file.3'),
+        ])
+        self.assertEquals(self.walk(facet='image'), [('/A', 'file.2')])
+
+    def test_error(self):
+        TREE['root'].append({'id': 'folder.x', 'name': 'X',
+                             'type': 'folder'})
+        try:
+            with self.assertRaises(requests.HTTPError):
+                self.walk()
+            on_error = Mock()
+            self.assertEquals(len(self.walk(on_error=on_error)), 6)
+            self.assertEquals(on_error.call_args[0][0], 'folder.x')
+        finally:
+            TREE['root'].pop()
+
+    def test_has_facet(self):
+        self.assertTrue(has_facet({'folder': {}}, 'folder'))
+        self.assertTrue(has_facet({'type': 'album'}, 'folder'))
+        self.assertTrue(has_facet({'type': 'photo'}, 'photo'))
+        self.assertFalse(has_facet({'type': 'folder'}, 'file'))
+
+    def test_client_from_root(self):
+        session = Mock()
+        client = OneDrive('token', 'r_token', 'id', 'secret',
+                          transport=Transport(session=session))
+        responses = [
+            {'id': 'root'},
+            {'data': TREE['album.b'], 'paging': {}},
+        ]
+
+        def request(method, url, **kwargs):
+            return json_response(responses.pop(0))
+        session.request.side_effect = request
+        items = list(client.get_tree_generator())
+        self.assertEquals(items, [('/', TREE['album.b'][0])])
+        self.assertEquals(session.request.call_args_list[1][0][1],
+                          'https://apis.live.net/v5.0/root/files')